@@ -0,0 +1,5 @@
+""" Stone+Wire and Wiretap network configuration wizard and its tools.
+
+Importing the package loads nothing else; configwizard.cli.main() picks the
+command and imports only the module that runs it.
+"""
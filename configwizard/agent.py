@@ -0,0 +1,308 @@
+# Resident agent serving the host's interface and config state.
+#
+# Orchestration asks every workstation for its NICs, addresses, UUID and
+# framestore ID many times an hour.  Instead of enumerating and parsing for
+# each question, the agent keeps one snapshot: the interface facts (the
+# same ones fleet collects) and the parsed network.cfg, sw_storage.cfg and
+# sw_framestore_map.  Interfaces are refreshed from rtnetlink link/address
+# events, the config files when a background stat() sees them change.
+# Every answer is encoded once per refresh, so a query is a dict lookup and
+# a write: no forks and no filesystem access on the read path.
+#
+# Clients connect to a Unix socket and send one query per line, either a
+# bare name or {"query": name}; each gets one JSON line back:
+#     {"ok": true, "generation": 7, "data": ...}
+
+import asyncio
+import errno
+import json
+import os
+import signal
+import socket
+import time
+
+from . import run_trace
+from . import sw_config
+from .enumerate_interfaces import facts
+from .install_tree import InstallTree, AmbiguousInstallTree, find_root
+
+DEFAULT_POLL = 2.0
+DEBOUNCE = 0.2
+QUERIES = ('snapshot', 'interfaces', 'identity', 'uuid', 'fsid', 'network', 'storage', 'framestores',
+           'stats', 'ping')
+
+
+def default_socket():
+    if os.geteuid() == 0:
+        return '/run/configwizard.sock'
+    base = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(base, 'configwizard-{}.sock'.format(os.getuid()))
+
+
+def _encode(generation, data):
+    return (json.dumps({'ok': True, 'generation': generation, 'data': data}, sort_keys=True)
+            + '\n').encode()
+
+
+def _error(message):
+    return (json.dumps({'ok': False, 'error': message}) + '\n').encode()
+
+
+def _stamp(path):
+    """ What tells a rewritten file apart: inode (atomic renames), mtime, size """
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class Agent(object):
+    """ The snapshot and the pre-encoded answers to every query """
+
+    def __init__(self, root=None, poll=DEFAULT_POLL):
+        self.root = find_root(root)
+        self.poll = poll
+        self.host = socket.gethostname()
+        self.generation = 0
+        self.interfaces = []
+        self.configs = {}
+        self.stamps = {}
+        self.answers = {}
+        self.started = time.time()
+        self.updated = None
+        self.refreshes = 0
+        self.queries = 0
+        self.clients = 0
+        self.pending = None
+
+    def _paths(self):
+        # listed again on each poll so files created after start are picked up
+        tree = InstallTree(self.root)
+        return {'network': tree.network_cfg, 'storage': tree.storage_cfg,
+                'framestores': tree.framestore_map}
+
+    def refresh_interfaces(self):
+        self.pending = None
+        with run_trace.phase('enumeration') as span:
+            self.interfaces = facts()
+            span.set(count=len(self.interfaces))
+        self._publish()
+
+    def refresh_configs(self, force=False):
+        """ Re-reads the config files whose stamp changed; True if any did """
+        paths = self._paths()
+        stamps = dict((name, (path, _stamp(path))) for name, path in paths.items())
+        if not force and stamps == self.stamps:
+            return False
+        self.stamps = stamps
+        with run_trace.phase('discovery', root=self.root):
+            self.configs = dict((name, self._read(name, path)) for name, path in paths.items())
+        self._publish()
+        return True
+
+    @staticmethod
+    def _read(name, path):
+        if path is None:
+            return {'path': None, 'error': 'not found'}
+        try:
+            cfg = sw_config.load(path)
+        except (IOError, OSError) as e:
+            return {'path': path, 'error': str(e)}
+        if name == 'network':
+            return {'path': path, 'uuid': cfg.get('UUID'), 'display_name': cfg.get('DisplayName'),
+                    'metadata': [d for d in (cfg.get('Metadata', 'Interfaces') or '').split(',') if d],
+                    'data': [d for d in (cfg.get('Data', 'Interfaces') or '').split(',') if d],
+                    'multicast': [d for d in (cfg.get('Multicast', 'Interfaces') or '').split(',') if d]}
+        if name == 'storage':
+            return {'path': path, 'id': cfg.get('ID')}
+        return {'path': path, 'framestores': cfg.framestores(), 'interfaces': cfg.interfaces()}
+
+    def _publish(self):
+        self.generation += 1
+        self.refreshes += 1
+        self.updated = time.time()
+        network = self.configs.get('network', {})
+        storage = self.configs.get('storage', {})
+        views = {
+            'interfaces': self.interfaces,
+            'identity': {'host': self.host, 'uuid': network.get('uuid'), 'fsid': storage.get('id'),
+                         'display_name': network.get('display_name')},
+            'uuid': network.get('uuid'),
+            'fsid': storage.get('id'),
+            'network': network,
+            'storage': storage,
+            'framestores': self.configs.get('framestores', {}),
+        }
+        views['snapshot'] = dict(views, root=self.root, updated=self.updated)
+        del views['snapshot']['uuid'], views['snapshot']['fsid']
+        self.answers = dict((name, _encode(self.generation, data)) for name, data in views.items())
+
+    def stats(self):
+        return {'generation': self.generation, 'uptime': round(time.time() - self.started, 3),
+                'updated': self.updated, 'refreshes': self.refreshes, 'queries': self.queries,
+                'clients': self.clients}
+
+    def answer(self, line):
+        """ Response bytes for one request line """
+        self.queries += 1
+        line = line.strip()
+        if line.startswith(b'{'):
+            try:
+                name = json.loads(line.decode()).get('query')
+            except (ValueError, AttributeError):
+                return _error('requests are a query name or {"query": name}')
+        else:
+            name = line.decode(errors='replace')
+        if not isinstance(name, str):
+            return _error('the query name must be a string, one of {}'.format(', '.join(QUERIES)))
+        found = self.answers.get(name)
+        if found is not None:
+            return found
+        if name == 'stats':
+            return _encode(self.generation, self.stats())
+        if name == 'ping':
+            return _encode(self.generation, 'pong')
+        return _error('unknown query {!r}; one of {}'.format(name, ', '.join(QUERIES)))
+
+    async def handle(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(_error('request too long'))
+                    break
+                if not line:
+                    break
+                writer.write(self.answer(line))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _link_events(self, sock):
+        """ Drains rtnetlink events and schedules one inventory refresh per burst """
+        from .watch import parse_events
+
+        changed = False
+        while True:
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                changed = True      # events were dropped, refresh anyway
+                continue
+            changed = changed or any(True for _ in parse_events(data))
+        if changed and self.pending is None:
+            self.pending = asyncio.get_running_loop().call_later(DEBOUNCE, self.refresh_interfaces)
+
+    async def _watch_configs(self, netlink):
+        while True:
+            await asyncio.sleep(self.poll)
+            self.refresh_configs()
+            if netlink is None:
+                # no rtnetlink events on this platform: poll the interfaces too
+                self.refresh_interfaces()
+
+    async def serve(self, path, ready=None):
+        from .watch import subscribe
+
+        loop = asyncio.get_running_loop()
+        self.refresh_configs(force=True)
+        self.refresh_interfaces()
+        try:
+            netlink = subscribe()
+            netlink.setblocking(False)
+            loop.add_reader(netlink.fileno(), self._link_events, netlink)
+        except (AttributeError, OSError):
+            netlink = None
+        _clear_stale(path)
+        server = await asyncio.start_unix_server(self.handle, path)
+        # stop through the finally below so the socket file goes away
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await asyncio.gather(server.serve_forever(), self._watch_configs(netlink))
+        finally:
+            if netlink is not None:
+                loop.remove_reader(netlink.fileno())
+                netlink.close()
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def _clear_stale(path):
+    """ Removes a socket left by an agent that died; refuses to steal a live one """
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(errno.EADDRINUSE, 'an agent is already listening on {}'.format(path))
+    finally:
+        probe.close()
+
+
+def query(name, path=None, timeout=2.0):
+    """ One query against a running agent; returns the decoded response """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path or default_socket())
+        sock.sendall(name.encode() + b'\n')
+        buf = b''
+        while not buf.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    finally:
+        sock.close()
+    return json.loads(buf.decode())
+
+
+def add_arguments(parser):
+    parser.add_argument('--socket', metavar='PATH', help='Unix socket (default {})'.format(default_socket()))
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL,
+                        help='seconds between config file checks (default {:g})'.format(DEFAULT_POLL))
+    parser.add_argument('--query', metavar='NAME',
+                        help='ask a running agent instead of starting one ({})'.format(', '.join(QUERIES)))
+
+
+def run(args):
+    path = args.socket or default_socket()
+    if args.query:
+        try:
+            response = query(args.query, path)
+        except (OSError, ValueError) as e:
+            print('No answer from the agent on {}: {}'.format(path, e))
+            return 2
+        print(json.dumps(response, indent=2, sort_keys=True))
+        return 0 if response.get('ok') else 1
+    try:
+        agent = Agent(args.root, args.poll)
+    except AmbiguousInstallTree as e:
+        print('{}; pick one with --root'.format(e))
+        return 2
+    print('Serving interface and config state on {}'.format(path))
+    try:
+        asyncio.run(agent.serve(path))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except OSError as e:
+        print('Unable to serve on {}: {}'.format(path, e.strerror or e))
+        return 2
+    return 0
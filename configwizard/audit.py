@@ -0,0 +1,218 @@
+# Fleet-wide audit of collected Stone+Wire / Wiretap configs.
+#
+# The templates warn that HOSTUUID must match network.cfg and that two
+# workstations with the same UUID fight over locks, but nothing checked it.
+# audit() reads sw_framestore_map, network.cfg and sw_storage.cfg for many
+# hosts laid out as <base>/<host>/ mirroring each host's filesystem (the
+# same layout fleet's LocalDirTransport writes), with a thread pool since
+# collected trees usually sit on NFS.  Every host's declarations go into
+# dicts keyed by UUID, framestore ID, address and name in one pass; anything
+# claimed by more than one host, and any per-host mismatch, is reported.
+# Lookups are dict hits, so thousands of hosts stay linear.
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import sw_config
+from .install_tree import InstallTree, DEFAULT_ROOT
+
+DEFAULT_WORKERS = 32
+
+
+class HostConfig(object):
+    """ What one host declares about itself; missing values are None """
+    __slots__ = ('host', 'uuid', 'fsid', 'name', 'haddr', 'hostuuid', 'map_id', 'iaddrs',
+                 'foreign', 'errors')
+
+    def __init__(self, host):
+        self.host = host
+        self.uuid = None        # network.cfg UUID
+        self.fsid = None        # sw_storage.cfg ID
+        self.name = None        # the map's FRAMESTORE entry for this host
+        self.haddr = None
+        self.hostuuid = None
+        self.map_id = None
+        self.iaddrs = []
+        self.foreign = []       # the map's other FRAMESTORES entries, as dicts
+        self.errors = []
+
+    def __repr__(self):
+        return 'HostConfig(%r, uuid=%r, fsid=%r)' % (self.host, self.uuid, self.fsid)
+
+
+class Finding(object):
+    """ A conflict between hosts or a mismatch within one """
+    __slots__ = ('kind', 'key', 'hosts', 'detail')
+
+    def __init__(self, kind, key, hosts, detail=''):
+        self.kind = kind
+        self.key = key
+        self.hosts = hosts
+        self.detail = detail
+
+    def as_dict(self):
+        return {'kind': self.kind, 'key': self.key, 'hosts': self.hosts, 'detail': self.detail}
+
+    def __repr__(self):
+        return 'Finding(%r, %r, %r)' % (self.kind, self.key, self.hosts)
+
+
+def _tree(base, host, root):
+    """ InstallTree of the host's mirrored root, or of its directory when the
+    files were collected flat into it """
+    tree = InstallTree(os.path.join(base, host, root.lstrip('/')))
+    if tree.framestore_map or tree.network_cfg or tree.storage_cfg:
+        return tree
+    flat = os.path.join(base, host)
+    tree.root = flat
+    for slot, name in (('framestore_map', 'sw_framestore_map'), ('network_cfg', 'network.cfg'),
+                       ('storage_cfg', 'sw_storage.cfg')):
+        path = os.path.join(flat, name)
+        setattr(tree, slot, path if os.path.isfile(path) else None)
+    return tree
+
+
+def _load(path, what, record):
+    if path is None:
+        record.errors.append('no {}'.format(what))
+        return None
+    try:
+        return sw_config.load(path)
+    except (IOError, OSError) as e:
+        record.errors.append('unable to read {}: {}'.format(path, e))
+        return None
+
+
+def read_host(base, host, root=DEFAULT_ROOT):
+    """ HostConfig of <base>/<host> """
+    record = HostConfig(host)
+    tree = _tree(base, host, root)
+    network = _load(tree.network_cfg, 'network.cfg', record)
+    storage = _load(tree.storage_cfg, 'sw_storage.cfg', record)
+    fs_map = _load(tree.framestore_map, 'sw_framestore_map', record)
+    if network is not None:
+        record.uuid = network.get('UUID')
+    if storage is not None:
+        record.fsid = storage.get('ID')
+    if fs_map is None:
+        return record
+    entries = fs_map.framestores()
+    # the local entry is the one carrying our UUID, else the one named after the host
+    local = None
+    for entry in entries:
+        if record.uuid and entry.get('HOSTUUID') == record.uuid:
+            local = entry
+            break
+    if local is None:
+        short = host.split('.')[0]
+        for entry in entries:
+            if entry.get('FRAMESTORE') in (host, short):
+                local = entry
+                break
+    if local is None:
+        record.errors.append('no FRAMESTORES entry for this host')
+    else:
+        record.name = local.get('FRAMESTORE')
+        record.haddr = local.get('HADDR')
+        record.hostuuid = local.get('HOSTUUID')
+        record.map_id = local.get('ID')
+        record.iaddrs = [i['IADDR'] for i in fs_map.interfaces().get(record.name, ()) if i.get('IADDR')]
+    record.foreign = [entry for entry in entries if entry is not local]
+    return record
+
+
+def read_hosts(base, hosts=None, root=DEFAULT_ROOT, workers=DEFAULT_WORKERS):
+    """ [HostConfig] for every host directory under base, read by a pool of workers """
+    if hosts is None:
+        hosts = sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda host: read_host(base, host, root), hosts))
+
+
+def audit(records):
+    """ [Finding] for a list of HostConfigs """
+    findings = []
+    by_uuid = {}
+    by_fsid = {}
+    by_addr = {}
+    by_name = {}
+    for r in records:
+        for error in r.errors:
+            findings.append(Finding('unreadable', r.host, [r.host], error))
+        if r.uuid:
+            by_uuid.setdefault(r.uuid, []).append(r.host)
+        if r.fsid:
+            by_fsid.setdefault(r.fsid, []).append(r.host)
+        if r.name:
+            by_name.setdefault(r.name, []).append(r)
+        for addr in set([r.haddr] + r.iaddrs):
+            if addr:
+                by_addr.setdefault(addr, []).append(r.host)
+        if r.name is None:
+            continue
+        if r.uuid and r.hostuuid != r.uuid:
+            findings.append(Finding('uuid-mismatch', r.host, [r.host],
+                                    'HOSTUUID={} but network.cfg UUID={}'.format(r.hostuuid, r.uuid)))
+        if r.fsid and r.map_id != r.fsid:
+            findings.append(Finding('id-mismatch', r.host, [r.host],
+                                    'map ID={} but sw_storage.cfg ID={}'.format(r.map_id, r.fsid)))
+
+    for kind, index in (('duplicate-uuid', by_uuid), ('duplicate-id', by_fsid), ('duplicate-address', by_addr)):
+        for key, hosts in index.items():
+            if len(hosts) > 1:
+                findings.append(Finding(kind, key, sorted(hosts)))
+    for name, owners in by_name.items():
+        if len(owners) > 1:
+            findings.append(Finding('duplicate-name', name, sorted(o.host for o in owners)))
+
+    # entries for other framestores have to agree with what those hosts declare
+    for r in records:
+        for entry in r.foreign:
+            owners = by_name.get(entry.get('FRAMESTORE'))
+            if not owners or len(owners) > 1:
+                continue
+            owner = owners[0]
+            stale = ['{}={} (declared {})'.format(key, entry.get(key), value)
+                     for key, value in (('HADDR', owner.haddr), ('HOSTUUID', owner.uuid),
+                                        ('ID', owner.fsid))
+                     if value and entry.get(key) and entry.get(key) != value]
+            if stale:
+                findings.append(Finding('stale-entry', entry.get('FRAMESTORE'), [r.host, owner.host],
+                                        ', '.join(stale)))
+    return findings
+
+
+def print_findings(findings):
+    for f in sorted(findings, key=lambda f: (f.kind, str(f.key))):
+        print('{:<18} {:<38} {}{}'.format(f.kind, f.key, ','.join(f.hosts),
+                                          '  ' + f.detail if f.detail else ''))
+
+
+def add_arguments(parser):
+    parser.add_argument('base', help='directory holding one subdirectory per host')
+    parser.add_argument('hosts', nargs='*', help='hosts to audit (default: every subdirectory)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='hosts read at once (default {})'.format(DEFAULT_WORKERS))
+    parser.add_argument('--fleet-root', default=DEFAULT_ROOT,
+                        help='install root inside each host directory (default {})'.format(DEFAULT_ROOT))
+    parser.add_argument('--json', metavar='FILE', help='also write the findings here')
+
+
+def run(args):
+    start = time.time()
+    try:
+        records = read_hosts(args.base, args.hosts or None, args.fleet_root, args.workers)
+    except OSError as e:
+        print('Unable to read {}: {}'.format(args.base, e))
+        return 2
+    findings = audit(records)
+    elapsed = time.time() - start
+    print_findings(findings)
+    print('{} hosts, {} findings, {:.2f}s'.format(len(records), len(findings), elapsed))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'base': args.base, 'hosts': len(records), 'seconds': round(elapsed, 3),
+                       'findings': [finding.as_dict() for finding in findings]}, f, indent=2)
+    return 1 if findings else 0
@@ -0,0 +1,128 @@
+# In-process config backups with de-duplication and retention.
+#
+# Backups sit next to the file as <file>.orig.<backup_time>, the name the
+# wizard has always used.  A copy is skipped when the file matches the newest
+# backup byte for byte, and old copies are pruned by count and age so
+# sw/cfg does not fill up with one copy per run.
+
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+from glob import glob, escape
+from time import gmtime, strftime, strptime, time
+from calendar import timegm
+
+BACKUP_TIME_FORMAT = "%Y_%b_%d_time_%H%M%S"
+DEFAULT_KEEP = 10
+FICLONE = 0x40049409    # linux/fs.h, reflink on btrfs/xfs
+
+
+def backup_name(path, stamp):
+    return '%s.orig.%s' % (path, stamp)
+
+
+def _stamp_key(name, path):
+    """ (seconds since the epoch, sequence) encoded in a backup name, None if
+    not ours; the sequence is the .1, .2 ... added when one second saw two """
+    stamp, _, seq = name[len(path) + len('.orig.'):].partition('.')
+    try:
+        return timegm(strptime(stamp, BACKUP_TIME_FORMAT)), int(seq) if seq else 0
+    except ValueError:
+        return None
+
+
+def list_backups(path):
+    """ [(time, backup path)] for path, newest first """
+    found = []
+    for name in glob(escape(path) + '.orig.*'):
+        key = _stamp_key(name, path)
+        if key is not None:
+            found.append((key, name))
+    found.sort(reverse=True)
+    return [(when, name) for (when, _), name in found]
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy_data(src, dst):
+    """ Copies file contents with a reflink, copy_file_range or read/write,
+    whichever the platform and filesystem support first """
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return
+    except (IOError, OSError):
+        pass
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+    shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def copy_file(path, dstcopy):
+    """ Copies path to dstcopy keeping mode, timestamps and, when allowed, owner.
+    The copy is written under a temp name and renamed, so it is never partial. """
+    tmp = os.path.join(os.path.dirname(dstcopy), '.%s.tmp%d' % (os.path.basename(dstcopy), os.getpid()))
+    try:
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            _copy_data(src, dst)
+        shutil.copystat(path, tmp)
+        st = os.stat(path)
+        try:
+            os.chown(tmp, st.st_uid, st.st_gid)
+        except OSError:
+            pass
+        os.rename(tmp, dstcopy)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def prune(path, keep=DEFAULT_KEEP, max_age=None, now=None):
+    """ Removes backups of path beyond the newest keep, and any older than
+    max_age seconds.  The newest backup is always kept.  Returns the removed paths """
+    now = time() if now is None else now
+    removed = []
+    for num, (when, name) in enumerate(list_backups(path)):
+        if num == 0:
+            continue
+        if (keep is not None and num >= keep) or (max_age is not None and now - when > max_age):
+            os.unlink(name)
+            removed.append(name)
+    return removed
+
+
+def backup(path, stamp=None, keep=DEFAULT_KEEP, max_age=None):
+    """ Backs path up unless it matches its newest backup, then prunes.
+
+    Returns the new backup's path, or None when the copy was skipped.
+    """
+    if stamp is None:
+        stamp = strftime(BACKUP_TIME_FORMAT, gmtime())
+    existing = list_backups(path)
+    dstcopy = None
+    if not existing or file_digest(existing[0][1]) != file_digest(path):
+        dstcopy = backup_name(path, stamp)
+        num = 0
+        while os.path.exists(dstcopy):
+            num += 1
+            dstcopy = '%s.%d' % (backup_name(path, stamp), num)
+        copy_file(path, dstcopy)
+    prune(path, keep, max_age)
+    return dstcopy
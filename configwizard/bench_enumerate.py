@@ -0,0 +1,98 @@
+# Scaling benchmark for interface enumeration against a synthetic source.
+#
+# Builds hosts with a few physical NICs and N veth devices (10, 1k and 10k
+# by default) without touching the real network: a packed SIOCGIFCONF buffer
+# for parse_ifconf() and an inventory of Interface records for
+# InterfaceIndex and wizard.active_int_list().
+
+import json
+import socket
+import struct
+import time
+
+from .enumerate_interfaces import (Interface, InterfaceIndex, parse_ifconf, IFREQ_SIZE, IFNAMSIZ,
+                                  IFF_UP, IFF_RUNNING, IFF_MULTICAST, IFF_LOOPBACK)
+
+SIZES = (10, 1000, 10000)
+PHYSICAL = ('eth0', 'eth1', 'eth2', 'eth3')
+
+
+def synthetic_names(count, physical=PHYSICAL):
+    names = ['lo'] + list(physical)
+    names += ['veth{:05d}'.format(n) for n in range(max(0, count - len(names)))]
+    return names[:max(count, 1)]
+
+
+def synthetic_ifconf(names):
+    """ (buffer, length) laid out the way SIOCGIFCONF fills it """
+    buf = bytearray(IFREQ_SIZE * len(names))
+    for num, name in enumerate(names):
+        offset = num * IFREQ_SIZE
+        buf[offset:offset + IFNAMSIZ] = name.encode().ljust(IFNAMSIZ, b'\0')
+        struct.pack_into('H', buf, offset + IFNAMSIZ, socket.AF_INET)
+        buf[offset + IFNAMSIZ + 4:offset + IFNAMSIZ + 8] = struct.pack('!I', 0x0a000000 + num)
+    return buf, len(buf)
+
+
+def synthetic_inventory(names):
+    flags = IFF_UP | IFF_RUNNING | IFF_MULTICAST
+    ifaces = {}
+    for num, name in enumerate(names, 1):
+        iface = Interface(num, name, flags | (IFF_LOOPBACK if name == 'lo' else 0), 1500,
+                          '02:00:00:00:{:02x}:{:02x}'.format(num >> 8 & 0xff, num & 0xff), 1)
+        iface.ipv4.append(socket.inet_ntoa(struct.pack('!I', 0x0a000000 + num)))
+        ifaces[name] = iface
+    return ifaces
+
+
+def _best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000.0
+
+
+def run_sizes(sizes=SIZES, repeat=5):
+    """ {size: {case: best ms}} """
+    from .wizard import active_int_list
+
+    results = {}
+    for size in sizes:
+        names = synthetic_names(size)
+        buf, length = synthetic_ifconf(names)
+        ifaces = synthetic_inventory(names)
+        index = InterfaceIndex(ifaces)
+        results[size] = {
+            'parse_ifconf': _best(lambda: sum(1 for _ in parse_ifconf(buf, length)), repeat),
+            'index_build': _best(lambda: InterfaceIndex(ifaces), repeat),
+            'select_physical': _best(lambda: list(index.select(
+                prefix='e', flags=IFF_UP | IFF_RUNNING, exclude_flags=IFF_LOOPBACK)), repeat),
+            'active_int_list': _best(lambda: active_int_list(ifaces), repeat),
+        }
+    return results
+
+
+def print_results(results):
+    cases = sorted(next(iter(results.values())))
+    print('{:>8}  '.format('ifaces') + ''.join('{:>18}'.format(c) for c in cases))
+    for size in sorted(results):
+        print('{:>8}  '.format(size) + ''.join('{:>15.3f} ms'.format(results[size][c]) for c in cases))
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', default=','.join(str(s) for s in SIZES),
+                        help='interface counts to try (default {})'.format(','.join(str(s) for s in SIZES)))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', metavar='FILE', help='also write the results here')
+
+
+def run(args):
+    results = run_sizes([int(s) for s in args.sizes.split(',')], args.repeat)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
@@ -0,0 +1,267 @@
+# Reproducible wizard benchmark against a synthetic host.
+#
+# Builds, in a temp directory, a fake Autodesk install tree whose
+# sw_framestore_map holds N framestores, and a fake interface source of N
+# interfaces (one in ten a physical ethNNNNN with sysfs speed/duplex/mtu
+# files, the rest veth) using bench_enumerate's synthetic inventory.  The
+# wizard's inventory(), link_info() and probe_all() are pointed at those
+# stand-ins while the cases run, so nothing touches the real network and no
+# Flame box is needed.
+#
+# Cases time active_int_list, the probe menu, get_uuid/get_fsid, loading
+# the map, map_gen/net_gen (each forced to rewrite) and an end-to-end
+# main(auto=True).  Results are written as JSON; given a baseline from an
+# earlier run, any case slower than threshold times its baseline is
+# reported and the exit status is 1.
+
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+from . import bench_enumerate
+from . import sw_config
+from .probe_interfaces import ProbeResult
+
+SIZES = (1, 100, 1000, 10000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.5
+UUID = '00000000-0000-4000-8000-00000000b0b0'
+FSID = '7'
+
+
+def physical_names(count):
+    return ['eth{:05d}'.format(n) for n in range(max(1, count // 10))]
+
+
+def fake_tree(base, framestores, host):
+    """ <base>/cfg/network.cfg, <base>/sw/cfg/sw_framestore_map with
+    framestores entries (this host's last) and sw_storage.cfg """
+    from .wizard import net_template
+
+    os.makedirs(os.path.join(base, 'cfg'))
+    os.makedirs(os.path.join(base, 'sw', 'cfg'))
+    with open(os.path.join(base, 'cfg', 'network.cfg'), 'w') as f:
+        f.write(net_template.format(UUID, 'eth00000', 'eth00000', 'eth00000'))
+    with open(os.path.join(base, 'sw', 'cfg', 'sw_storage.cfg'), 'w') as f:
+        f.write('ID={}\n'.format(FSID))
+    names = ['fs{:05d}'.format(n) for n in range(max(0, framestores - 1))] + [host]
+    lines = ['[FRAMESTORES]\n']
+    for num, name in enumerate(names, 1):
+        uuid = UUID if name == host else '00000000-0000-4000-8000-{:012x}'.format(num)
+        lines.append('FRAMESTORE={}  HADDR=10.{}.{}.{}  HOSTUUID={}  ID={}\n'.format(
+            name, num >> 16 & 0xff, num >> 8 & 0xff, num & 0xff, uuid, FSID if name == host else num + 100))
+    lines.append('\n[INTERFACES]\n')
+    for num, name in enumerate(names, 1):
+        lines.append('FRAMESTORE={}\nPROT=TCP     IADDR=10.{}.{}.{}    DEV=1\n\n'.format(
+            name, 128 + (num >> 16 & 0x7f), num >> 8 & 0xff, num & 0xff))
+    map_path = os.path.join(base, 'sw', 'cfg', 'sw_framestore_map')
+    with open(map_path, 'w') as f:
+        f.writelines(lines)
+    return map_path
+
+
+def fake_sysfs(base, names, speed=10000):
+    """ /sys/class/net stand-in with link state for names """
+    for name in names:
+        path = os.path.join(base, name)
+        os.makedirs(path)
+        for attr, value in (('speed', speed), ('duplex', 'full'), ('mtu', 9000), ('carrier', 1),
+                            ('type', 1)):
+            with open(os.path.join(path, attr), 'w') as f:
+                f.write('{}\n'.format(value))
+
+
+def fake_probe_all(targets, timeout=1.0, budget=None, on_result=None):
+    """ probe_interfaces.probe_all() that answers at once """
+    results = {}
+    for dev, ip in targets:
+        results[dev] = ProbeResult(dev, ip, reachable=True, latency=0.05)
+        if on_result is not None:
+            on_result(results[dev])
+    return results
+
+
+@contextlib.contextmanager
+def synthetic_host(ifaces, sysfs):
+    """ Points the wizard at the synthetic interface sources while active;
+    the NUMA and readiness checks see empty /sys and /proc stand-ins """
+    from . import wizard
+    from . import enumerate_interfaces
+
+    names = ('inventory', 'link_info', 'is_infiniband', 'probe_all', 'tune_check', 'readiness_check')
+    saved = dict((name, getattr(wizard, name)) for name in names)
+    empty = os.path.join(sysfs, 'no-root')
+    wizard.inventory = lambda: ifaces
+    wizard.link_info = functools.partial(enumerate_interfaces.link_info, sysfs=sysfs,
+                                         ib_sysfs=os.path.join(sysfs, 'no-ib'))
+    wizard.is_infiniband = functools.partial(enumerate_interfaces.is_infiniband, sysfs=sysfs)
+    wizard.probe_all = fake_probe_all
+    wizard.tune_check = functools.partial(saved['tune_check'], sys_root=empty, proc_root=empty)
+    wizard.readiness_check = functools.partial(saved['readiness_check'], proc_root=empty)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(wizard, name, value)
+
+
+def _best(func, repeat, setup=None):
+    """ Fastest of repeat runs in ms; setup runs untimed before each """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000.0
+
+
+@contextlib.contextmanager
+def _quiet():
+    saved = sys.stdout
+    sys.stdout = captured = io.StringIO()
+    try:
+        yield
+    except BaseException:
+        # the wizard exits on bad input; show why
+        sys.stderr.write(captured.getvalue())
+        raise
+    finally:
+        sys.stdout = saved
+
+
+def run_size(size, repeat, workdir):
+    """ {case: best ms} for a host with size interfaces and size framestores """
+    from . import wizard
+    from .install_tree import install_tree
+
+    host = socket.gethostname()
+    root = os.path.join(workdir, 'Autodesk-{}'.format(size))
+    sysfs = os.path.join(workdir, 'sys-{}'.format(size))
+    map_path = fake_tree(root, size, host)
+    physical = physical_names(size)
+    # size interfaces besides lo
+    ifaces = bench_enumerate.synthetic_inventory(bench_enumerate.synthetic_names(size + 1, physical))
+    fake_sysfs(sysfs, physical)
+    tree = install_tree(root)
+    originals = [(path, sw_config.read(path)) for path in (map_path, tree.network_cfg)]
+    turn = [0]
+
+    def flip():
+        # alternate the address so every map_gen/net_gen really writes
+        turn[0] += 1
+        return turn[0] % 2
+
+    def reset():
+        # main() starts from the original files each time, backups included
+        for path, text in originals:
+            sw_config.atomic_write(path, text)
+            directory = os.path.dirname(path)
+            for name in os.listdir(directory):
+                if '.orig.' in name:
+                    os.unlink(os.path.join(directory, name))
+
+    results = {}
+    with synthetic_host(ifaces, sysfs), _quiet():
+        interfaces = wizard.active_int_list(ifaces)
+        results['active_int_list'] = _best(lambda: wizard.active_int_list(ifaces), repeat)
+        # the interactive menu: rendered, then probed to its last row behind the prompt
+        results['probe_menu'] = _best(
+            lambda: wizard.display_options(interfaces, ifaces).wait(), repeat)
+        results['get_uuid'] = _best(lambda: wizard.get_uuid(tree), repeat)
+        results['get_fsid'] = _best(lambda: wizard.get_fsid(tree), repeat)
+        results['load_map'] = _best(lambda: sw_config.load(map_path), repeat)
+        results['map_gen'] = _best(
+            lambda: wizard.map_gen(map_path, host, '192.0.2.{}'.format(flip() + 1),
+                                   ['198.51.100.1'], UUID, FSID), repeat)
+        results['net_gen'] = _best(
+            lambda: wizard.net_gen(tree.network_cfg, UUID, [interfaces[0]],
+                                   interfaces[:1 + flip()]), repeat)
+        results['main_auto'] = _best(lambda: wizard.main(auto=True, root=root), repeat, reset)
+    return results
+
+
+def run_sizes(sizes=SIZES, repeat=DEFAULT_REPEAT):
+    """ {case: {size: best ms}} """
+    workdir = tempfile.mkdtemp(prefix='wizard-bench.')
+    try:
+        results = {}
+        for size in sizes:
+            for case, ms in run_size(size, repeat, workdir).items():
+                results.setdefault(case, {})[str(size)] = round(ms, 3)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """ [(case, size, ms, baseline ms)] for cases slower than threshold times the baseline """
+    slower = []
+    for case, sizes in sorted(results.items()):
+        for size, ms in sorted(sizes.items(), key=lambda item: int(item[0])):
+            before = baseline.get(case, {}).get(size)
+            # sub-millisecond cases are noise at any ratio
+            if before and ms > 1.0 and ms > before * threshold:
+                slower.append((case, size, ms, before))
+    return slower
+
+
+def print_results(results, baseline=None):
+    sizes = sorted(set(size for found in results.values() for size in found), key=int)
+    print('{:<16}'.format('case') + ''.join('{:>14}'.format(size) for size in sizes))
+    for case in sorted(results):
+        row = '{:<16}'.format(case)
+        for size in sizes:
+            ms = results[case].get(size)
+            before = (baseline or {}).get(case, {}).get(size)
+            if ms is None:
+                row += '{:>14}'.format('-')
+            elif before:
+                row += '{:>14}'.format('{:.2f} {:+.0f}%'.format(ms, 100.0 * (ms - before) / before))
+            else:
+                row += '{:>11.2f} ms'.format(ms)
+        print(row)
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', default=','.join(str(s) for s in SIZES),
+                        help='interfaces and framestores per host (default {})'.format(
+                            ','.join(str(s) for s in SIZES)))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--json', metavar='FILE', help='write the results here')
+    parser.add_argument('--baseline', metavar='FILE', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown over the baseline that fails the run (default {:g}x)'.format(
+                            DEFAULT_THRESHOLD))
+
+
+def run(args):
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        except (IOError, OSError, ValueError, KeyError) as e:
+            print('Unable to read baseline {}: {}'.format(args.baseline, e))
+            return 2
+    results = run_sizes([int(s) for s in args.sizes.split(',')], args.repeat)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'repeat': args.repeat, 'time': int(time.time()), 'results': results},
+                      f, indent=2, sort_keys=True)
+    slower = compare(results, baseline, args.threshold) if baseline else []
+    for case, size, ms, before in slower:
+        print('REGRESSION {} at {}: {:.2f} ms, baseline {:.2f} ms'.format(case, size, ms, before))
+    return 1 if slower else 0
@@ -0,0 +1,309 @@
+# TCP throughput/latency benchmark for ranking Data= candidates.
+#
+# Advertised link speed is not enough: ports negotiate down and bonds lose
+# slaves.  This measures what each local interface actually moves to a peer
+# running the bundled receiver (configWizard.py benchmark --serve).  The
+# sender uses sendfile(2) from a page-cached buffer file so the Python side
+# is not the bottleneck.
+
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+
+from . import run_trace
+
+DEFAULT_PORT = 7600
+MODE_THROUGHPUT = b'T'
+MODE_LATENCY = b'L'
+ACK = struct.Struct('!Q')
+RANK_TOLERANCE = 0.1  # throughput closer than this does not override link speed
+
+
+class BenchResult(object):
+    """ Measured throughput/latency from one local interface to the peer """
+    __slots__ = ('dev', 'ip', 'mbps', 'latency', 'error')
+
+    def __init__(self, dev, ip, mbps=0.0, latency=None, error=None):
+        self.dev = dev
+        self.ip = ip
+        self.mbps = mbps
+        self.latency = latency  # median round trip in ms
+        self.error = error
+
+    def __repr__(self):
+        return 'BenchResult(%r, %r, mbps=%.1f, latency=%r, error=%r)' % (
+            self.dev, self.ip, self.mbps, self.latency, self.error)
+
+
+class _ReceiverHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sock = self.request
+        mode = sock.recv(1)
+        if mode == MODE_LATENCY:
+            while True:
+                data = sock.recv(64)
+                if not data:
+                    break
+                sock.sendall(data)
+        elif mode == MODE_THROUGHPUT:
+            view = memoryview(bytearray(self.server.bufsize))
+            total = 0
+            while True:
+                n = sock.recv_into(view)
+                if not n:
+                    break
+                total += n
+            # the sender stops its clock on this ack, not on its last send()
+            sock.sendall(ACK.pack(total))
+
+
+class Receiver(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ Bundled benchmark receiver; port 0 picks a free port """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='0.0.0.0', port=DEFAULT_PORT, bufsize=1 << 20):
+        self.bufsize = bufsize
+        socketserver.TCPServer.__init__(self, (host, port), _ReceiverHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+def start_receiver(host='127.0.0.1', port=0, bufsize=1 << 20):
+    """ Runs a Receiver in a background thread, e.g. on loopback or a veth peer """
+    server = Receiver(host, port, bufsize)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def _connect(src_ip, dev, peer, port, timeout):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    if dev and hasattr(socket, 'SO_BINDTODEVICE'):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, dev.encode())
+        except OSError:
+            # needs CAP_NET_RAW; binding the source address still picks the
+            # interface whenever the peer is on its subnet
+            pass
+    try:
+        sock.bind((src_ip, 0))
+        sock.connect((peer, port))
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def _buffer_file(bufsize):
+    f = tempfile.TemporaryFile()
+    f.write(b'\0' * bufsize)
+    f.flush()
+    return f
+
+
+def _stream(sock, duration, bufsize, src, out, slot):
+    """ Sends for duration seconds and stores (bytes acked, elapsed) in out[slot] """
+    start = time.time()
+    deadline = start + duration
+    try:
+        if hasattr(src, 'fileno'):
+            while time.time() < deadline:
+                sock.sendfile(src, 0, bufsize)
+        else:
+            view = memoryview(src)
+            while time.time() < deadline:
+                sock.sendall(view)
+        sock.shutdown(socket.SHUT_WR)
+        acked = ACK.unpack(_recv_exact(sock, ACK.size))[0]
+    except (IOError, OSError) as e:
+        out[slot] = e
+        return
+    out[slot] = (acked, time.time() - start)
+
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise IOError('receiver closed the connection')
+        data += chunk
+    return data
+
+
+def measure_latency(src_ip, dev, peer, port=DEFAULT_PORT, count=20, timeout=2.0):
+    """ Median round trip in ms of a one byte echo through the receiver """
+    sock = _connect(src_ip, dev, peer, port, timeout)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(MODE_LATENCY)
+        samples = []
+        for _ in range(count):
+            start = time.time()
+            sock.sendall(b'x')
+            _recv_exact(sock, 1)
+            samples.append((time.time() - start) * 1000.0)
+    finally:
+        sock.close()
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def measure_throughput(src_ip, dev, peer, port=DEFAULT_PORT, streams=1,
+                       duration=3.0, bufsize=1 << 20, zerocopy=True, timeout=5.0):
+    """ Aggregate Mb/s over streams parallel connections from src_ip """
+    src = _buffer_file(bufsize) if zerocopy else bytearray(bufsize)
+    socks = []
+    try:
+        for _ in range(streams):
+            sock = _connect(src_ip, dev, peer, port, timeout)
+            sock.sendall(MODE_THROUGHPUT)
+            socks.append(sock)
+        out = [None] * streams
+        threads = [threading.Thread(target=_stream, args=(sock, duration, bufsize, src, out, i))
+                   for i, sock in enumerate(socks)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        for sock in socks:
+            sock.close()
+        if zerocopy:
+            src.close()
+    for stream in out:
+        if not isinstance(stream, tuple):
+            raise stream or IOError('a stream failed before the receiver acknowledged it')
+    total = sum(acked for acked, _ in out)
+    elapsed = max(elapsed for _, elapsed in out)
+    return total * 8 / elapsed / 1e6
+
+
+def benchmark_interfaces(targets, peer, port=DEFAULT_PORT, streams=1, duration=3.0,
+                         bufsize=1 << 20, zerocopy=True):
+    """ Benchmarks each (dev, ip) in targets in turn; returns [BenchResult]
+
+    Interfaces run one after another so they do not compete for the peer.
+    With peer None every interface sends to a receiver on its own address,
+    which exercises the code path without a lab (loopback or veth pairs).
+    """
+    results = []
+    for dev, ip in targets:
+        result = BenchResult(dev, ip)
+        with run_trace.phase('probing', step='bench', dev=dev) as span:
+            if not ip:
+                result.error = 'no IPv4 address'
+            else:
+                try:
+                    result.latency = measure_latency(ip, dev, peer or ip, port)
+                    result.mbps = measure_throughput(ip, dev, peer or ip, port, streams,
+                                                     duration, bufsize, zerocopy)
+                except (IOError, OSError) as e:
+                    result.error = str(e)
+            span.set(mbps=result.mbps, error=result.error)
+        results.append(result)
+    return results
+
+
+def order_by_throughput(results):
+    """ Device names fastest first; interfaces that failed go last """
+    ranked = sorted(results, key=lambda r: (r.error is None, r.mbps), reverse=True)
+    return [r.dev for r in ranked]
+
+
+def rank_by_throughput(results, order, tolerance=RANK_TOLERANCE):
+    """ Device names of order re-ranked by the measured results
+
+    order is the link-speed ranking and stays the tie-break: a device only
+    moves ahead of another when it measured more than tolerance (a fraction)
+    faster, or when the other one failed.  Devices without a result keep
+    their place relative to their neighbours.
+    """
+    by_dev = dict((r.dev, r) for r in results)
+    ranked = []
+    for dev in order:
+        pos = len(ranked)
+        while pos and _beats(by_dev.get(dev), by_dev.get(ranked[pos - 1]), tolerance):
+            pos -= 1
+        ranked.insert(pos, dev)
+    return ranked
+
+
+def _beats(result, other, tolerance):
+    if result is None or other is None or result.error is not None:
+        return False
+    return other.error is not None or result.mbps > other.mbps * (1 + tolerance)
+
+
+def print_results(results):
+    for r in results:
+        if r.error:
+            print('{:>12}  {:<15}  failed: {}'.format(r.dev, r.ip, r.error))
+        else:
+            print('{:>12}  {:<15}  {:>10.1f} Mb/s  {:>8.3f} ms'.format(r.dev, r.ip, r.mbps, r.latency))
+
+
+def parse_peer(value):
+    """ 'host' or 'host:port' -> (host, port) """
+    host, _, port = value.partition(':')
+    return host, int(port) if port else DEFAULT_PORT
+
+
+def add_arguments(parser):
+    parser.add_argument('--serve', action='store_true',
+                        help='run the benchmark receiver instead of the sender')
+    parser.add_argument('--bind', default='0.0.0.0', help='receiver listen address')
+    parser.add_argument('--peer', metavar='HOST[:PORT]',
+                        help='receiver to measure against (default: a local receiver on each interface address)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--streams', type=int, default=1, help='parallel TCP streams per interface')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per interface')
+    parser.add_argument('--buffer', type=int, default=1 << 20, help='send/receive buffer size in bytes')
+    parser.add_argument('--no-zerocopy', dest='zerocopy', action='store_false',
+                        help='send from a memoryview instead of sendfile(2)')
+    parser.add_argument('interfaces', nargs='*', help='interfaces to measure (default: all active)')
+
+
+def run(args):
+    from .enumerate_interfaces import inventory
+
+    if args.serve:
+        server = Receiver(args.bind, args.port, args.buffer)
+        print('Benchmark receiver listening on {}:{}'.format(args.bind, server.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    with run_trace.phase('enumeration') as span:
+        ifaces = inventory()
+        devs = args.interfaces or [i.name for i in ifaces.values() if i.up and i.running]
+        span.set(count=len(ifaces), active=len(devs))
+    targets = [(dev, ifaces[dev].ip if dev in ifaces else '') for dev in devs]
+    server = None
+    if args.peer:
+        peer, port = parse_peer(args.peer)
+    else:
+        server = start_receiver('0.0.0.0', 0, args.buffer)
+        peer, port = None, server.port
+    try:
+        results = benchmark_interfaces(targets, peer, port, args.streams, args.duration,
+                                       args.buffer, args.zerocopy)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    print_results(results)
+    return 0 if any(r.error is None for r in results) else 1
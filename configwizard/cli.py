@@ -0,0 +1,94 @@
+# Single entry point for the wizard and its tools.
+#
+# The tool runs from login scripts and fleet automation hundreds of times,
+# so startup matters: only the module of the command being run is imported,
+# and only that command's options are built.  COMMANDS names each module
+# and its add_arguments/run pair; nothing in it is imported up front.
+#
+# Without a command the interactive wizard runs, so the old forms
+# (configWizard.py --auto, configWizard.py --manual, configWizard.py
+# --root DIR watch) keep working.
+
+import argparse
+import atexit
+import importlib
+import sys
+
+# name: (module, add_arguments, run, help)
+COMMANDS = (
+    ('wizard', 'wizard', 'add_arguments', 'run', 'pick the interfaces and write the configs (default)'),
+    ('manual', 'wizard', 'add_manual_arguments', 'run_manual', 'type the IP addresses in instead'),
+    ('probe', 'wizard', 'add_probe_arguments', 'run_probe', 'show reachability, speed and latency of each interface'),
+    ('interfaces', 'enumerate_interfaces', 'add_arguments', 'run', 'list every interface and its addresses'),
+    ('benchmark', 'benchmark', 'add_arguments', 'run', 'measure per-interface TCP throughput'),
+    ('fleet', 'fleet', 'add_arguments', 'run', 'configure many hosts from an inventory'),
+    ('audit', 'audit', 'add_arguments', 'run', 'check collected host configs for conflicts'),
+    ('discover', 'discovery', 'add_arguments', 'run', 'build sw_framestore_map from self-discovery'),
+    ('rtt', 'latency_matrix', 'add_arguments', 'run', 'latency from each interface to each framestore'),
+    ('tune-check', 'tuning', 'add_arguments', 'run', 'NUMA and IRQ-affinity audit of an interface'),
+    ('readiness', 'net_readiness', 'add_arguments', 'run', 'kernel buffer and NIC offload readiness'),
+    ('mtu', 'path_mtu', 'add_arguments', 'run', 'path-MTU discovery from each interface'),
+    ('watch', 'watch', 'add_arguments', 'run', 'rewrite sw_framestore_map when links change'),
+    ('agent', 'agent', 'add_arguments', 'run', 'serve cached interface and config state on a Unix socket'),
+    ('bench-suite', 'bench_suite', 'add_arguments', 'run', 'time the wizard against a synthetic host'),
+    ('bench-enumerate', 'bench_enumerate', 'add_arguments', 'run', 'time interface enumeration at 10 to 10k NICs'),
+)
+DEFAULT_COMMAND = 'wizard'
+
+# kept for 'configWizard.py --manual'
+ALIASES = {'--manual': 'manual'}
+
+
+def _common(prog):
+    """ Options every command takes, accepted before or after the command name """
+    from .install_tree import ROOT_ENV, DEFAULT_ROOT
+    from .backups import DEFAULT_KEEP
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--root', metavar='DIR',
+                        help='Autodesk install root (default: ${} or {})'.format(ROOT_ENV, DEFAULT_ROOT))
+    parser.add_argument('--keep-backups', type=int, default=DEFAULT_KEEP, metavar='N',
+                        help='backups to keep per config file (default {})'.format(DEFAULT_KEEP))
+    parser.add_argument('--backup-max-age', type=float, metavar='DAYS',
+                        help='also remove backups older than this')
+    parser.add_argument('--trace', metavar='FILE',
+                        help="append per-phase timings as JSON lines to FILE ('-' for stderr)")
+    return parser
+
+
+def _epilog():
+    width = max(len(name) for name, _, _, _, _ in COMMANDS)
+    return 'commands:\n' + '\n'.join('  {:<{}}  {}'.format(name, width, text)
+                                     for name, _, _, _, text in COMMANDS)
+
+
+def split_command(argv):
+    """ (command, the remaining arguments); the first argument naming a
+    command picks it, otherwise the wizard runs """
+    names = set(name for name, _, _, _, _ in COMMANDS)
+    for num, arg in enumerate(argv):
+        if arg in names:
+            return arg, argv[:num] + argv[num + 1:]
+        if arg in ALIASES:
+            return ALIASES[arg], argv[:num] + argv[num + 1:]
+    return DEFAULT_COMMAND, list(argv)
+
+
+def main(argv=None, prog=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command, rest = split_command(argv)
+    module_name, add_name, run_name, text = [entry[1:] for entry in COMMANDS if entry[0] == command][0]
+    module = importlib.import_module('.' + module_name, __package__)
+    prog = prog or 'configWizard.py'
+    parser = argparse.ArgumentParser(
+        prog=prog if command == DEFAULT_COMMAND else '{} {}'.format(prog, command),
+        description=text, parents=[_common(prog)],
+        epilog=_epilog() if command == DEFAULT_COMMAND else None,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    getattr(module, add_name)(parser)
+    args = parser.parse_args(rest)
+    if args.trace:
+        from . import run_trace
+        run_trace.start(args.trace)
+        atexit.register(run_trace.stop)
+    return getattr(module, run_name)(args)
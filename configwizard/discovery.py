@@ -0,0 +1,308 @@
+# Stone+Wire self-discovery: build a map of every framestore on the network.
+#
+# Each framestore announces itself on the [SelfDiscovery] scope of
+# network.cfg (Port=7555, Scope=224.0.0.1 by default) as a JSON datagram:
+#
+#   {"name": "flame", "haddr": "192.0.2.30", "uuid": "ABCD...", "id": "30",
+#    "interfaces": [["TCP", "10.0.0.30"], ["IB_SDP", "10.10.11.30"]]}
+#
+# The format is this tool's own; sw_probed does not send it.  Every host that
+# should appear in the map runs the announcer, 'discover --announce local
+# --interval 30', which re-reads the host's configs each round and sends the
+# FRAMESTORE and INTERFACES entries the wizard wrote for it.
+#
+# listen() collects announcements with asyncio for a fixed window and keeps
+# the latest one per HOSTUUID, so repeats and renamed hosts collapse into a
+# single entry.  merge_map() upserts them into the existing map, matching on
+# name or HOSTUUID, so framestores that were quiet during the window and the
+# map's comments survive; --prune drops the quiet ones.  Without a map yet,
+# render_map() writes the whole [FRAMESTORES] and [INTERFACES] map in one
+# pass.  The local entry is kept even when this host does not announce itself.
+
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import sys
+
+from . import sw_config
+from .install_tree import InstallTree, AmbiguousInstallTree, find_root
+
+DEFAULT_PORT = 7555
+DEFAULT_SCOPE = '224.0.0.1'
+DEFAULT_TTL = 1
+DEFAULT_WINDOW = 5.0
+DEFAULT_INTERVAL = 30.0
+
+
+class Announcement(object):
+    """ One framestore as it announced itself """
+    __slots__ = ('name', 'haddr', 'uuid', 'fsid', 'interfaces', 'source')
+
+    def __init__(self, name, haddr, uuid, fsid=None, interfaces=None, source=None):
+        self.name = name
+        self.haddr = haddr
+        self.uuid = uuid
+        self.fsid = fsid
+        self.interfaces = interfaces or []  # [(prot, addr)] in the order to try
+        self.source = source                # address the datagram came from
+
+    def encode(self):
+        return json.dumps({'name': self.name, 'haddr': self.haddr, 'uuid': self.uuid,
+                           'id': self.fsid, 'interfaces': self.interfaces}).encode()
+
+    @classmethod
+    def decode(cls, data, source=None):
+        """ Announcement from a datagram, None if it is not a valid one """
+        try:
+            msg = json.loads(data.decode())
+            name, haddr, uuid = msg['name'], msg['haddr'], msg['uuid']
+            interfaces = [(str(prot), str(addr)) for prot, addr in msg.get('interfaces') or ()]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if not (name and haddr and uuid):
+            return None
+        fsid = msg.get('id')
+        return cls(str(name), str(haddr), str(uuid), None if fsid is None else str(fsid),
+                   interfaces, source)
+
+    @classmethod
+    def from_map(cls, cfg, uuid, fsid=None):
+        """ The framestore with HOSTUUID uuid in a parsed map, None if it has none """
+        for entry in cfg.framestores():
+            if entry.get('HOSTUUID') == uuid and entry.get('FRAMESTORE') and entry.get('HADDR'):
+                name = entry['FRAMESTORE']
+                interfaces = [(i.get('PROT', 'TCP'), i['IADDR']) for i in cfg.interfaces().get(name, [])
+                              if i.get('IADDR')]
+                return cls(name, entry['HADDR'], uuid, fsid or entry.get('ID'), interfaces)
+        return None
+
+    def __repr__(self):
+        return 'Announcement(%r, %r, %r)' % (self.name, self.haddr, self.uuid)
+
+
+def local_announcement(root=None, map_path=None):
+    """ This host as its configs describe it: the UUID in network.cfg, the ID
+    in sw_storage.cfg and its entry in map_path (default the tree's
+    sw_framestore_map).  None when any of them is missing. """
+    tree = InstallTree(find_root(root))     # not cached: the files may come and go
+    map_path = map_path or tree.framestore_map
+    if tree.network_cfg is None or map_path is None:
+        return None
+    try:
+        uuid = sw_config.load(tree.network_cfg).get('UUID')
+        fsid = sw_config.load(tree.storage_cfg).get('ID') if tree.storage_cfg else None
+        return Announcement.from_map(sw_config.load(map_path), uuid, fsid) if uuid else None
+    except (IOError, OSError):
+        return None
+
+
+def _is_multicast(addr):
+    return 224 <= bytearray(socket.inet_aton(addr))[0] <= 239
+
+
+def _scope(value):
+    """ argparse type for --scope: a dotted IPv4 group or unicast address """
+    try:
+        socket.inet_aton(value)
+    except (socket.error, OSError):
+        value = None
+    if value is None or value.count('.') != 3:
+        raise argparse.ArgumentTypeError('needs an IPv4 address such as {}'.format(DEFAULT_SCOPE))
+    return value
+
+
+def _listen_socket(scope, port, iface_ip='0.0.0.0'):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        except OSError:
+            pass
+    if _is_multicast(scope):
+        sock.bind(('', port))
+        mreq = struct.pack('4s4s', socket.inet_aton(scope), socket.inet_aton(iface_ip))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    else:
+        # a unicast scope such as 127.0.0.1 stands in for the group in tests
+        sock.bind((scope, port))
+    sock.setblocking(False)
+    return sock
+
+
+class _Collector(asyncio.DatagramProtocol):
+
+    def __init__(self, index):
+        self.index = index
+        self.received = 0
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        found = Announcement.decode(data, addr[0])
+        if found is not None:
+            self.index[found.uuid] = found
+
+
+async def listen(window=DEFAULT_WINDOW, scope=DEFAULT_SCOPE, port=DEFAULT_PORT, iface_ip='0.0.0.0',
+                 ready=None):
+    """ {uuid: Announcement} heard on scope:port within window seconds
+
+    ready, if given, is an asyncio.Event set once the socket is listening.
+    """
+    index = {}
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _Collector(index),
+                                                       sock=_listen_socket(scope, port, iface_ip))
+    try:
+        if ready is not None:
+            ready.set()
+        await asyncio.sleep(window)
+    finally:
+        transport.close()
+    return index
+
+
+async def announce(announcement, scope=DEFAULT_SCOPE, port=DEFAULT_PORT, count=3, interval=0.5,
+                   ttl=DEFAULT_TTL, iface_ip=None):
+    """ Sends announcement count times, interval seconds apart, or until
+    cancelled when count is None.  announcement may also be a callable
+    returning the Announcement to send each round (None skips the round). """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    if _is_multicast(scope):
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if iface_ip:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(iface_ip))
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, sock=sock)
+    try:
+        num = 0
+        while count is None or num < count:
+            if num:
+                await asyncio.sleep(interval)
+            current = announcement() if callable(announcement) else announcement
+            if current is not None:
+                transport.sendto(current.encode(), (scope, port))
+            num += 1
+    finally:
+        transport.close()
+
+
+def discover(window=DEFAULT_WINDOW, scope=DEFAULT_SCOPE, port=DEFAULT_PORT, iface_ip='0.0.0.0'):
+    return asyncio.run(listen(window, scope, port, iface_ip))
+
+
+def render_map(index, header='Version=2.0\n'):
+    """ sw_framestore_map text with every framestore in index, sorted by name """
+    peers = sorted(index.values(), key=lambda a: (a.name, a.uuid))
+    out = [header, '\n[FRAMESTORES]\n']
+    for a in peers:
+        out.append(sw_config.framestore_line(a.name, a.haddr, a.uuid, a.fsid))
+    out.append('\n[INTERFACES]\n')
+    for a in peers:
+        out.extend(sw_config.interface_lines(a.name, a.interfaces or [('TCP', a.haddr)]))
+    return ''.join(out)
+
+
+def merge_map(current, index, prune=False):
+    """ current map text with every framestore in index upserted, or a fresh
+    render_map() when there is no map yet.  With prune, framestores whose
+    HOSTUUID is not in index are removed. """
+    if current is None:
+        return render_map(index)
+    text = current
+    for a in sorted(index.values(), key=lambda a: (a.name, a.uuid)):
+        text = sw_config.upsert_text(text, a.name, a.haddr, a.uuid, a.fsid, a.interfaces or [('TCP', a.haddr)])
+    if prune:
+        cfg = sw_config.parse(text)
+        for entry in cfg.framestores():
+            if entry.get('HOSTUUID') not in index:
+                cfg.remove_framestore(entry.get('FRAMESTORE'))
+        text = cfg.render()
+    return text
+
+
+def add_arguments(parser):
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW,
+                        help='seconds to listen for announcements (default {})'.format(DEFAULT_WINDOW))
+    parser.add_argument('--scope', default=DEFAULT_SCOPE, type=_scope,
+                        help='multicast group, or a unicast address to test over (default {})'.format(
+                            DEFAULT_SCOPE))
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--interface-ip', default='0.0.0.0', help='local address to join the group on')
+    parser.add_argument('--output', metavar='FILE',
+                        help='update the framestores that announced in this map instead of printing it')
+    parser.add_argument('--prune', action='store_true',
+                        help='with --output, remove framestores that did not announce in the window')
+    parser.add_argument('--announce', metavar='local|NAME,HADDR,UUID[,ID]',
+                        help="announce instead of listening; 'local' sends this host's entry "
+                             "from its own configs")
+    parser.add_argument('--iaddr', action='append', default=[], metavar='PROT:ADDR',
+                        help='interface to include with --announce NAME,..., in the order to try')
+    parser.add_argument('--interval', type=float, nargs='?', const=DEFAULT_INTERVAL, metavar='SECONDS',
+                        help='with --announce, keep announcing every SECONDS until stopped '
+                             '(default {:g})'.format(DEFAULT_INTERVAL))
+
+
+def run(args):
+    if args.announce:
+        return run_announce(args)
+
+    try:
+        index = discover(args.window, args.scope, args.port, args.interface_ip)
+    except (OSError, socket.error) as e:
+        print('Unable to listen on {}:{}: {}'.format(args.scope, args.port, e))
+        return 2
+    if args.output:
+        # this host only hears itself when it announces too; keep its entry
+        try:
+            local = local_announcement(args.root) or local_announcement(args.root, args.output)
+        except AmbiguousInstallTree as e:
+            print('{}; pick one with --root'.format(e))
+            return 2
+        if local is not None and local.uuid not in index:
+            index[local.uuid] = local
+        from .wizard import backup, _max_age
+        text = merge_map(sw_config.read(args.output), index, args.prune)
+        if sw_config.write_if_changed(args.output, text,
+                                      lambda: backup(args.output, args.keep_backups, _max_age(args))):
+            print('{} framestores written to {}'.format(len(index), args.output))
+        else:
+            print('{} is up to date with {} framestores'.format(args.output, len(index)))
+    else:
+        sys.stdout.write(render_map(index))
+    return 0 if index else 1
+
+
+def run_announce(args):
+    if args.announce == 'local':
+        try:
+            find_root(args.root)
+        except AmbiguousInstallTree as e:
+            print('{}; pick one with --root'.format(e))
+            return 2
+        if local_announcement(args.root) is None:
+            print('No entry for this host in its sw_framestore_map; run the wizard first')
+            return 2
+        found = lambda: local_announcement(args.root)
+    else:
+        fields = args.announce.split(',')
+        if len(fields) < 3:
+            print("--announce needs 'local' or NAME,HADDR,UUID[,ID]")
+            return 2
+        iaddrs = [tuple(value.split(':', 1)) if ':' in value else ('TCP', value) for value in args.iaddr]
+        found = Announcement(fields[0], fields[1], fields[2], fields[3] if len(fields) > 3 else None, iaddrs)
+    try:
+        if args.interval:
+            asyncio.run(announce(found, args.scope, args.port, None, args.interval,
+                                 iface_ip=args.interface_ip))
+        else:
+            asyncio.run(announce(found, args.scope, args.port, iface_ip=args.interface_ip))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print('Unable to announce on {}:{}: {}'.format(args.scope, args.port, e))
+        return 2
+    return 0
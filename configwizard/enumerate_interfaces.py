@@ -0,0 +1,442 @@
+# Use those functions to enumerate all interfaces available on the system using Python.
+# found on <http://code.activestate.com/recipes/439093/#c1>
+#
+# inventory() builds a full snapshot (flags, MTU, MAC, every IPv4/IPv6 address)
+# in-process from an rtnetlink dump, falling back to the ioctl calls below when
+# netlink is not available.  No ifconfig/awk processes are started.
+#
+# Hosts running containers or VMs can carry thousands of veth/tap devices:
+# all_interfaces() sizes its SIOCGIFCONF buffer from the kernel instead of
+# truncating at a fixed count, and InterfaceIndex lets callers pick the few
+# NICs they care about by name prefix, flags and address family.
+
+import os
+import socket
+import fcntl
+import struct
+import array
+from bisect import bisect_left
+
+SIOCGIFCONF = 0x8912
+SIOCGIFFLAGS = 0x8913
+SIOCGIFMTU = 0x8921
+SIOCGIFHWADDR = 0x8927
+
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+IFF_RUNNING = 0x40
+IFF_MULTICAST = 0x1000
+
+# struct ifreq: 16 byte name plus a union padded to the size of struct ifmap
+IFNAMSIZ = 16
+IFREQ_SIZE = 40 if struct.calcsize('P') == 8 else 32
+IFCONF = struct.Struct('iP')
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+SYSFS_NET = '/sys/class/net'
+SYSFS_IB = '/sys/class/infiniband'
+ARPHRD_INFINIBAND = 32      # /sys/class/net/<dev>/type of an IPoIB device
+
+NLMSG_HDR = struct.Struct('=IHHII')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTATTR = struct.Struct('=HH')
+
+
+class Interface(object):
+    """ One network interface as seen in a single inventory snapshot """
+    __slots__ = ('index', 'name', 'flags', 'mtu', 'mac', 'ipv4', 'ipv6', 'type')
+
+    def __init__(self, index, name, flags=0, mtu=0, mac='', type=0):
+        self.index = index
+        self.name = name
+        self.flags = flags
+        self.mtu = mtu
+        self.mac = mac
+        self.ipv4 = []
+        self.ipv6 = []
+        self.type = type        # ARPHRD_* link type, 1 for Ethernet
+
+    @property
+    def up(self):
+        return bool(self.flags & IFF_UP)
+
+    @property
+    def running(self):
+        return bool(self.flags & IFF_RUNNING)
+
+    @property
+    def multicast(self):
+        return bool(self.flags & IFF_MULTICAST)
+
+    @property
+    def loopback(self):
+        return bool(self.flags & IFF_LOOPBACK)
+
+    @property
+    def ip(self):
+        """ First IPv4 address, or '' when the interface has none """
+        return self.ipv4[0] if self.ipv4 else ''
+
+    def __repr__(self):
+        return 'Interface(%r, mtu=%d, mac=%r, ipv4=%r, ipv6=%r)' % (
+            self.name, self.mtu, self.mac, self.ipv4, self.ipv6)
+
+
+class LinkInfo(object):
+    """ Negotiated link state of one interface, read from sysfs """
+    __slots__ = ('name', 'speed', 'duplex', 'mtu', 'carrier', 'ib', 'hca')
+
+    def __init__(self, name, speed=0, duplex='unknown', mtu=0, carrier=False, ib=False, hca=None):
+        self.name = name
+        self.speed = speed      # Mb/s, 0 when the driver does not report it
+        self.duplex = duplex
+        self.mtu = mtu
+        self.carrier = carrier
+        self.ib = ib            # IPoIB netdev, Stone+Wire can use IB_SDP over it
+        self.hca = hca          # 'mlx5_0/1': RDMA device and port behind it
+
+    def __repr__(self):
+        return 'LinkInfo(%r, speed=%d, duplex=%r, mtu=%d, carrier=%r, ib=%r)' % (
+            self.name, self.speed, self.duplex, self.mtu, self.carrier, self.ib)
+
+
+def _read_sysfs(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        # speed/duplex/carrier raise EINVAL while the link is down
+        return None
+
+
+def is_infiniband(dev, sysfs=SYSFS_NET):
+    return _read_sysfs(os.path.join(sysfs, dev, 'type')) == str(ARPHRD_INFINIBAND)
+
+
+def _ib_rate(rate):
+    """ '100 Gb/sec (4X EDR)' -> 100000 Mb/s, 0 if unreadable """
+    try:
+        return int(float(rate.split()[0]) * 1000)
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def _ib_port(dev, sysfs, ib_sysfs):
+    """ (hca, port) of the RDMA port under an IPoIB netdev, None if not found """
+    try:
+        hcas = sorted(os.listdir(os.path.join(sysfs, dev, 'device', 'infiniband')))
+    except OSError:
+        return None
+    if not hcas:
+        return None
+    # dev_port is 0-based, IB port numbers start at 1
+    dev_port = _read_sysfs(os.path.join(sysfs, dev, 'dev_port'))
+    port = int(dev_port) + 1 if dev_port and dev_port.isdigit() else 1
+    if not os.path.isdir(os.path.join(ib_sysfs, hcas[0], 'ports', str(port))):
+        return None
+    return hcas[0], port
+
+
+def link_info(dev, sysfs=SYSFS_NET, ib_sysfs=SYSFS_IB):
+    """ Returns the LinkInfo for dev from sysfs (speed, duplex, mtu, carrier)
+
+    IPoIB devices rarely report speed/duplex; their rate and state come from
+    the InfiniBand port under ib_sysfs instead.
+    """
+    base = os.path.join(sysfs, dev)
+    info = LinkInfo(dev)
+    speed = _read_sysfs(os.path.join(base, 'speed'))
+    if speed and speed.lstrip('-').isdigit() and int(speed) > 0:
+        info.speed = int(speed)
+    info.duplex = _read_sysfs(os.path.join(base, 'duplex')) or 'unknown'
+    mtu = _read_sysfs(os.path.join(base, 'mtu'))
+    if mtu and mtu.isdigit():
+        info.mtu = int(mtu)
+    info.carrier = _read_sysfs(os.path.join(base, 'carrier')) == '1'
+    if is_infiniband(dev, sysfs):
+        info.ib = True
+        found = _ib_port(dev, sysfs, ib_sysfs)
+        if found is not None:
+            hca, port = found
+            info.hca = '{}/{}'.format(hca, port)
+            port_dir = os.path.join(ib_sysfs, hca, 'ports', str(port))
+            info.speed = _ib_rate(_read_sysfs(os.path.join(port_dir, 'rate'))) or info.speed
+            state = _read_sysfs(os.path.join(port_dir, 'state')) or ''
+            info.carrier = info.carrier or state.endswith('ACTIVE')
+        if info.duplex == 'unknown':
+            info.duplex = 'full'
+    return info
+
+
+class IfConf(object):
+    """ One SIOCGIFCONF record: an interface name and a packed IPv4 address """
+    __slots__ = ('name', 'addr')
+
+    def __init__(self, name, addr):
+        self.name = name
+        self.addr = addr
+
+    def __iter__(self):
+        # unpacks like the (name, addr) tuples this used to be
+        yield self.name
+        yield self.addr
+
+    def __repr__(self):
+        return 'IfConf(%r, %r)' % (self.name, format_ip(self.addr))
+
+
+def parse_ifconf(buf, length, stride=IFREQ_SIZE):
+    """ Yields an IfConf for each ifreq in the first length bytes of buf """
+    view = memoryview(buf)
+    for offset in range(0, length - stride + 1, stride):
+        name = bytes(view[offset:offset + IFNAMSIZ]).split(b'\0', 1)[0].decode()
+        # sockaddr_in after the name: family, port, then the address
+        yield IfConf(name, bytes(view[offset + IFNAMSIZ + 4:offset + IFNAMSIZ + 8]))
+
+
+def _ifconf(sock):
+    """ (buffer, used bytes) of a SIOCGIFCONF call sized to fit every record """
+    # a NULL buffer makes the kernel report the length it needs
+    size = IFCONF.unpack(fcntl.ioctl(sock.fileno(), SIOCGIFCONF, IFCONF.pack(0, 0)))[0]
+    while True:
+        size = max(size, IFREQ_SIZE) * 2    # headroom for interfaces added meanwhile
+        buf = array.array('B', bytes(size))
+        used = IFCONF.unpack(fcntl.ioctl(sock.fileno(), SIOCGIFCONF,
+                                         IFCONF.pack(size, buf.buffer_info()[0])))[0]
+        if used < size:
+            return buf, used
+
+
+def all_interfaces():
+    """ Lazily yields an IfConf for every IPv4 address the kernel reports """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        buf, used = _ifconf(s)
+    finally:
+        s.close()
+    return parse_ifconf(buf, used)
+
+
+class InterfaceIndex(object):
+    """ Interfaces of one inventory indexed by name, flag bits and address family
+
+    select() narrows with a sorted-name range for the prefix and set
+    intersections for the rest, so picking a few NICs out of thousands of
+    veth/tap devices does not walk every record.
+    """
+    FLAGS = (IFF_UP, IFF_LOOPBACK, IFF_RUNNING, IFF_MULTICAST)
+
+    def __init__(self, ifaces):
+        self.ifaces = ifaces if isinstance(ifaces, dict) else dict((i.name, i) for i in ifaces)
+        self.names = sorted(self.ifaces)
+        self.by_flag = dict((flag, set()) for flag in self.FLAGS)
+        self.by_family = {socket.AF_INET: set(), socket.AF_INET6: set()}
+        self.by_type = {}
+        for iface in self.ifaces.values():
+            self.by_type.setdefault(iface.type, set()).add(iface.name)
+            for flag in self.FLAGS:
+                if iface.flags & flag:
+                    self.by_flag[flag].add(iface.name)
+            if iface.ipv4:
+                self.by_family[socket.AF_INET].add(iface.name)
+            if iface.ipv6:
+                self.by_family[socket.AF_INET6].add(iface.name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefixed(self, prefix):
+        names = self.names
+        for pos in range(bisect_left(names, prefix), len(names)):
+            if not names[pos].startswith(prefix):
+                break
+            yield names[pos]
+
+    def select(self, prefix=None, flags=0, family=None, exclude_flags=0, link_type=None):
+        """ Yields the Interfaces whose name starts with prefix (a string or a
+        tuple of them), that have every bit of flags and none of exclude_flags
+        set, hold an address of family and are of link_type, in name order """
+        sets = [self.by_flag[flag] for flag in self.FLAGS if flags & flag]
+        if family is not None:
+            sets.append(self.by_family.get(family, set()))
+        if link_type is not None:
+            sets.append(self.by_type.get(link_type, set()))
+        unwanted = [self.by_flag[flag] for flag in self.FLAGS if exclude_flags & flag]
+        if prefix is not None:
+            # a prefix is usually the narrowest cut: test its few names against the sets
+            prefixes = (prefix,) if isinstance(prefix, str) else prefix
+            names = sorted(name for p in set(prefixes) for name in self._prefixed(p))
+            names = [name for name in names if all(name in found for found in sets)]
+        elif sets:
+            names = sorted(set.intersection(*sorted(sets, key=len)))
+        else:
+            names = self.names
+        for name in names:
+            if not any(name in found for found in unwanted):
+                yield self.ifaces[name]
+
+
+def format_ip(addr):
+    return socket.inet_ntoa(addr)
+
+def format_mac(raw):
+    return ':'.join('%02x' % b for b in bytearray(raw))
+
+
+def _rtattrs(data, offset):
+    """ Yields (type, payload) for the rtattr list starting at offset """
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        yield kind, data[offset + RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+def _netlink_dump(sock, msg_type, family, seq):
+    """ Sends one rtnetlink dump request and yields (type, body) replies """
+    if msg_type == RTM_GETLINK:
+        body = IFINFOMSG.pack(family, 0, 0, 0, 0)
+    else:
+        body = IFADDRMSG.pack(family, 0, 0, 0, 0)
+    sock.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(body), msg_type,
+                             NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body)
+    while True:
+        data = sock.recv(65536)
+        offset = 0
+        while offset + NLMSG_HDR.size <= len(data):
+            length, kind, _, reply_seq, _ = NLMSG_HDR.unpack_from(data, offset)
+            if length < NLMSG_HDR.size:
+                return
+            body = data[offset + NLMSG_HDR.size:offset + length]
+            offset += (length + 3) & ~3
+            if reply_seq != seq:
+                continue
+            if kind == NLMSG_DONE:
+                return
+            if kind == NLMSG_ERROR:
+                errno = -struct.unpack_from('=i', body)[0]
+                if errno:
+                    raise OSError(errno, 'rtnetlink dump failed')
+                continue
+            yield kind, body
+
+
+def _netlink_inventory():
+    ifaces = {}
+    by_index = {}
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        sock.bind((0, 0))
+        for kind, body in _netlink_dump(sock, RTM_GETLINK, socket.AF_UNSPEC, 1):
+            if kind != RTM_NEWLINK:
+                continue
+            _, link_type, index, flags, _ = IFINFOMSG.unpack_from(body)
+            iface = Interface(index, '', flags, type=link_type)
+            for attr, payload in _rtattrs(body, IFINFOMSG.size):
+                if attr == IFLA_IFNAME:
+                    iface.name = payload.split(b'\0', 1)[0].decode()
+                elif attr == IFLA_MTU:
+                    iface.mtu = struct.unpack('=I', payload[:4])[0]
+                elif attr == IFLA_ADDRESS:
+                    iface.mac = format_mac(payload)
+            by_index[index] = iface
+            ifaces[iface.name] = iface
+
+        for kind, body in _netlink_dump(sock, RTM_GETADDR, socket.AF_UNSPEC, 2):
+            if kind != RTM_NEWADDR:
+                continue
+            family, _, _, _, index = IFADDRMSG.unpack_from(body)
+            iface = by_index.get(index)
+            if iface is None:
+                continue
+            attrs = dict(_rtattrs(body, IFADDRMSG.size))
+            # IFA_LOCAL is the local address on point-to-point links,
+            # IFA_ADDRESS is the peer there and the local address elsewhere
+            raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+            if raw is None:
+                continue
+            if family == socket.AF_INET:
+                iface.ipv4.append(socket.inet_ntop(socket.AF_INET, raw))
+            elif family == socket.AF_INET6:
+                iface.ipv6.append(socket.inet_ntop(socket.AF_INET6, raw))
+    finally:
+        sock.close()
+    return ifaces
+
+
+def _ioctl_inventory():
+    """ IPv4-only fallback built on SIOCGIFCONF and per-name ioctls """
+    ifaces = {}
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for name, ip in all_interfaces():
+            iface = ifaces.get(name)
+            if iface is None:
+                index = socket.if_nametoindex(name)
+                req = struct.pack('256s', name.encode()[:15])
+                flags = struct.unpack_from('H', fcntl.ioctl(s.fileno(), SIOCGIFFLAGS, req), 16)[0]
+                mtu = struct.unpack_from('i', fcntl.ioctl(s.fileno(), SIOCGIFMTU, req), 16)[0]
+                hwaddr = fcntl.ioctl(s.fileno(), SIOCGIFHWADDR, req)
+                link_type = struct.unpack_from('H', hwaddr, 16)[0]
+                iface = ifaces[name] = Interface(index, name, flags, mtu, format_mac(hwaddr[18:24]),
+                                                 link_type)
+            iface.ipv4.append(format_ip(ip))
+    finally:
+        s.close()
+    return ifaces
+
+
+def inventory():
+    """ Returns a {name: Interface} snapshot of every interface on the host """
+    try:
+        return _netlink_inventory()
+    except (AttributeError, OSError):
+        # no AF_NETLINK on this platform, or rtnetlink refused the dump
+        return _ioctl_inventory()
+
+
+def facts(sysfs=SYSFS_NET, ib_sysfs=SYSFS_IB):
+    """ JSON-friendly summary of every interface (inventory plus link state),
+    used when another host's interfaces have to be described remotely """
+    result = []
+    for iface in inventory().values():
+        link = link_info(iface.name, sysfs, ib_sysfs)
+        result.append({'name': iface.name, 'index': iface.index, 'type': iface.type,
+                       'ipv4': iface.ipv4, 'ipv6': iface.ipv6,
+                       'mac': iface.mac, 'mtu': iface.mtu, 'up': iface.up,
+                       'running': iface.running, 'multicast': iface.multicast,
+                       'loopback': iface.loopback, 'speed': link.speed,
+                       'duplex': link.duplex, 'carrier': link.carrier, 'ib': link.ib})
+    return result
+
+
+def add_arguments(parser):
+    parser.add_argument('--json', action='store_true',
+                        help='print facts() as JSON, the way fleet collects them')
+
+
+def run(args):
+    if args.json:
+        import json
+        print(json.dumps(facts(), indent=2, sort_keys=True))
+        return 0
+    for iface in inventory().values():
+        print("%12s   %s" % (iface.name, ' '.join(iface.ipv4 + iface.ipv6)))
+    return 0
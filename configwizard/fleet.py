@@ -0,0 +1,332 @@
+# Non-interactive fleet mode: configure many workstations from an inventory.
+#
+# The inventory is a CSV or YAML list of hosts with the metadata and data
+# interface for each one, given as a NIC name, an IP address, or 'auto' to
+# rank the host's interfaces by link speed the way configWizard.py --auto
+# does.  Hosts are processed by a bounded worker pool; each one gets its
+# sw_framestore_map and network.cfg rendered from what is on the host now,
+# and the per-host outcome and timing go to a JSON report.
+#
+# How files and interface facts are reached is up to the transport:
+# SSHTransport talks to real hosts, LocalDirTransport works on a directory
+# per host and stands in for them in tests and dry runs.
+
+import csv
+import json
+import os
+import shlex
+import socket
+import subprocess as sb
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import backups
+from . import run_trace
+from . import sw_config
+from .enumerate_interfaces import (LinkInfo, Interface, ARPHRD_INFINIBAND,
+                                   IFF_UP, IFF_RUNNING, IFF_MULTICAST, IFF_LOOPBACK)
+from .install_tree import DEFAULT_ROOT
+
+DEFAULT_WORKERS = 16
+
+
+class FleetError(Exception):
+    """ A host could not be configured; the message goes into the report """
+
+
+class LocalDirTransport(object):
+    """ <base>/<host>/ mirrors the host's filesystem, and
+    <base>/<host>/interfaces.json holds its enumerate_interfaces.facts() """
+
+    def __init__(self, base):
+        self.base = base
+
+    def _path(self, host, path):
+        return os.path.join(self.base, host, path.lstrip('/'))
+
+    def facts(self, host):
+        path = os.path.join(self.base, host, 'interfaces.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            raise FleetError('unable to read {}: {}'.format(path, e))
+
+    def read(self, host, path):
+        return sw_config.read(self._path(host, path))
+
+    def write(self, host, path, text):
+        local = self._path(host, path)
+        if not os.path.isdir(os.path.dirname(local)):
+            os.makedirs(os.path.dirname(local))
+        sw_config.atomic_write(local, text)
+
+    def backup(self, host, path, stamp, keep=backups.DEFAULT_KEEP, max_age=None):
+        return backups.backup(self._path(host, path), stamp, keep, max_age)
+
+
+class SSHTransport(object):
+    """ Reaches hosts with ssh; interface facts come from running
+    enumerate_interfaces.py on the host through python3 on stdin """
+
+    def __init__(self, user=None, options=None, timeout=30):
+        self.user = user
+        self.options = options or ['-o', 'BatchMode=yes', '-o', 'ConnectTimeout=10']
+        self.timeout = timeout
+
+    def _run(self, host, command, stdin=None):
+        target = '{}@{}'.format(self.user, host) if self.user else host
+        cmd = ['ssh'] + self.options + [target, command]
+        try:
+            p = sb.run(cmd, input=stdin, stdout=sb.PIPE, stderr=sb.PIPE, timeout=self.timeout)
+        except (OSError, sb.TimeoutExpired) as e:
+            raise FleetError('ssh {}: {}'.format(host, e))
+        if p.returncode != 0:
+            raise FleetError('ssh {}: {}'.format(host, p.stderr.decode(errors='replace').strip()
+                                                 or 'exit status {}'.format(p.returncode)))
+        return p.stdout
+
+    def facts(self, host):
+        src = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'enumerate_interfaces.py')
+        with open(src, 'rb') as f:
+            script = f.read()
+        script += b'\nimport json\nprint(json.dumps(facts()))\n'
+        try:
+            return json.loads(self._run(host, 'python3 -', script).decode())
+        except ValueError as e:
+            raise FleetError('unexpected interface facts from {}: {}'.format(host, e))
+
+    def read(self, host, path):
+        q = shlex.quote(path)
+        out = self._run(host, 'if [ -e {0} ]; then cat {0}; else echo -n MISSING; fi'.format(q))
+        return None if out == b'MISSING' else out.decode('utf-8', 'surrogateescape')
+
+    def write(self, host, path, text):
+        q = shlex.quote(path)
+        tmp = shlex.quote(path + '.fleet.tmp')
+        # cp -p first so the new file keeps the mode/owner of the old one
+        self._run(host, '([ -e {0} ] && cp -p {0} {1}; cat > {1}) && mv {1} {0}'.format(q, tmp),
+                  text.encode('utf-8', 'surrogateescape'))
+
+    def backup(self, host, path, stamp, keep=backups.DEFAULT_KEEP, max_age=None):
+        """ backups.backup() run on the host, so the copies there are
+        de-duplicated and pruned the same way as local ones """
+        with open(backups.__file__, 'rb') as f:
+            script = f.read()
+        script += '\nprint(backup({!r}, {!r}, {!r}, {!r}) or \'\')\n'.format(
+            path, stamp, keep, max_age).encode()
+        return self._run(host, 'python3 -', script).decode().strip() or None
+
+
+def make_transport(spec, user=None):
+    """ 'ssh' or the path of a directory-per-host tree """
+    if spec == 'ssh':
+        return SSHTransport(user)
+    return LocalDirTransport(spec)
+
+
+def load_inventory(path):
+    """ Returns [{'host', 'metadata', 'data', ...}] from a CSV or YAML file """
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise FleetError('PyYAML is needed to read {}; use CSV or install pyyaml'.format(path))
+        with open(path) as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            data = data.get('hosts', [])
+        entries = [dict((str(k), '' if v is None else str(v)) for k, v in item.items())
+                   for item in data]
+    else:
+        with open(path) as f:
+            rows = (line for line in f if line.strip() and not line.lstrip().startswith('#'))
+            entries = [dict((k.strip(), (v or '').strip()) for k, v in row.items() if k)
+                       for row in csv.DictReader(rows)]
+    for num, entry in enumerate(entries, 1):
+        if not entry.get('host'):
+            raise FleetError('inventory entry {} has no host'.format(num))
+    return entries
+
+
+def _is_ip(value):
+    try:
+        socket.inet_aton(value)
+    except (socket.error, OSError):
+        return False
+    return value.count('.') == 3
+
+
+def _pick(value, names, ip_of, ranked, role):
+    """ NIC name for an inventory value: a NIC name, one of its IPs, or auto """
+    if value in ('', 'auto'):
+        if not ranked:
+            raise FleetError('no active interface to pick {} from'.format(role))
+        return None
+    if value in names:
+        return value
+    if _is_ip(value):
+        for name in names:
+            if ip_of(name) == value:
+                return name
+    raise FleetError('{} {} is not an active interface on the host'.format(role, value))
+
+
+def _interfaces(facts):
+    """ {name: Interface} rebuilt from a host's facts, so the wizard's own
+    selection can run on them """
+    ifaces = {}
+    for position, f in enumerate(facts):
+        flags = ((IFF_UP if f.get('up') else 0) | (IFF_RUNNING if f.get('running') else 0) |
+                 (IFF_MULTICAST if f.get('multicast') else 0) | (IFF_LOOPBACK if f.get('loopback') else 0))
+        iface = Interface(f.get('index', position + 1), f['name'], flags, f.get('mtu', 0), f.get('mac', ''),
+                          f.get('type', ARPHRD_INFINIBAND if f.get('ib') else 1))
+        iface.ipv4 = list(f.get('ipv4') or [])
+        iface.ipv6 = list(f.get('ipv6') or [])
+        ifaces[iface.name] = iface
+    return ifaces
+
+
+def configure_host(transport, entry, root=DEFAULT_ROOT, backup_stamp=None, keep=backups.DEFAULT_KEEP,
+                   max_age=None):
+    """ Renders and writes one host's configs; returns its report record
+
+    With backup_stamp, files about to change are backed up on the host as
+    <file>.orig.<backup_stamp>, keeping keep copies of at most max_age seconds.
+    """
+    # imported late: the wizard pulls in far more than a fleet run needs
+    from .wizard import rank_links, render_map, render_netcfg, interface_addresses, select_active
+
+    host = entry['host']
+    root = entry.get('root') or root
+    start = time.time()
+    record = {'host': host, 'status': 'ok', 'error': None}
+    try:
+        with run_trace.phase('enumeration', host=host) as span:
+            facts = transport.facts(host)
+            # ranked the way the wizard ranks its own host: docker0, wg0 and
+            # the like never reach Data= or the IADDR lines
+            active = select_active(_interfaces(facts))
+            span.set(count=len(facts), active=len(active))
+        by_name = dict((f['name'], f) for f in facts)
+
+        def ip_of(dev):
+            ipv4 = by_name.get(dev, {}).get('ipv4') or []
+            return ipv4[0] if ipv4 else ''
+
+        links = [LinkInfo(dev, by_name[dev].get('speed', 0), by_name[dev].get('duplex', 'unknown'),
+                          by_name[dev].get('mtu', 0), by_name[dev].get('carrier', True),
+                          by_name[dev].get('ib', False)) for dev in active]
+        meta_rank, data_rank = rank_links(links) if links else ([], [])
+        meta = _pick(entry.get('metadata', ''), active, ip_of, meta_rank, 'metadata')
+        data = _pick(entry.get('data', ''), active, ip_of, data_rank, 'data')
+        meta_list = [meta] if meta else meta_rank
+        data_list = [data] if data else data_rank
+        meta = meta_list[0]
+        record.update(metadata=meta_list, data=data_list)
+
+        netcfg_path = os.path.join(root, 'cfg', 'network.cfg')
+        map_path = os.path.join(root, 'sw', 'cfg', 'sw_framestore_map')
+        storage_path = os.path.join(root, 'sw', 'cfg', 'sw_storage.cfg')
+        with run_trace.phase('discovery', host=host):
+            netcfg = transport.read(host, netcfg_path)
+            storage = transport.read(host, storage_path)
+            current_map = transport.read(host, map_path)
+        if netcfg is None:
+            raise FleetError('{} not found'.format(netcfg_path))
+        if storage is None:
+            raise FleetError('{} not found'.format(storage_path))
+        uuid = sw_config.parse(netcfg).get('UUID')
+        fsid = sw_config.parse(storage).get('ID')
+        if not uuid or not fsid:
+            raise FleetError('no UUID= in network.cfg or no ID= in sw_storage.cfg')
+        record.update(uuid=uuid, fsid=fsid)
+
+        name = entry.get('name') or host.split('.')[0]
+        ib_devs = [dev for dev in active if by_name[dev].get('ib')]
+        iaddrs = interface_addresses(data_list + [meta], ip_of, ib_devs)
+        with run_trace.phase('rendering', host=host, count=2):
+            new_map = render_map(current_map, name, ip_of(meta), iaddrs, uuid, fsid)
+            new_netcfg = render_netcfg(netcfg, uuid, meta_list, data_list)
+
+        # only files whose content changes are backed up and rewritten
+        record['changed'] = []
+        record['backups'] = []
+        for path, current, new in ((map_path, current_map, new_map),
+                                   (netcfg_path, netcfg, new_netcfg)):
+            if new == current:
+                continue
+            if backup_stamp and current is not None:
+                with run_trace.phase('backup', host=host, file=path) as span:
+                    dstcopy = transport.backup(host, path, backup_stamp, keep, max_age)
+                    span.set(copied=dstcopy is not None)
+                if dstcopy is not None:
+                    record['backups'].append(dstcopy)
+            with run_trace.phase('write', host=host, file=path):
+                transport.write(host, path, new)
+            record['changed'].append(path)
+    except (FleetError, IOError, OSError) as e:
+        record.update(status='error', error=str(e))
+    record['seconds'] = round(time.time() - start, 3)
+    return record
+
+
+def run_fleet(entries, transport, workers=DEFAULT_WORKERS, root=DEFAULT_ROOT, backup_stamp=None,
+              keep=backups.DEFAULT_KEEP, max_age=None):
+    """ Configures every inventory entry with at most workers at once """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda e: configure_host(transport, e, root, backup_stamp, keep, max_age),
+                             entries))
+
+
+def add_arguments(parser):
+    parser.add_argument('inventory', help='CSV or YAML file with host, metadata, data columns')
+    parser.add_argument('--transport', default='ssh',
+                        help="'ssh' (default) or a directory holding one subdirectory per host")
+    parser.add_argument('--ssh-user', help='user for the ssh transport')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='hosts configured at once (default {})'.format(DEFAULT_WORKERS))
+    parser.add_argument('--fleet-root', default=DEFAULT_ROOT,
+                        help='install root on the hosts (default {})'.format(DEFAULT_ROOT))
+    parser.add_argument('--report', default='fleet_report.json', help='where to write the JSON report')
+    parser.add_argument('--no-backup', dest='backup', action='store_false',
+                        help='do not keep .orig.<date> copies on the hosts')
+
+
+def run(args):
+    from .wizard import backup_time, _max_age
+
+    try:
+        entries = load_inventory(args.inventory)
+    except (FleetError, IOError, OSError) as e:
+        print('Unable to read inventory: {}'.format(e))
+        return 2
+    transport = make_transport(args.transport, args.ssh_user)
+    phases = {}
+    # with --trace each host's report record carries its own phase records
+    collect = lambda r: phases.setdefault(r.get('host'), []).append(r)
+    run_trace.add_hook(collect)
+    start = time.time()
+    try:
+        results = run_fleet(entries, transport, args.workers, args.fleet_root,
+                            backup_time if args.backup else None, args.keep_backups, _max_age(args))
+    finally:
+        run_trace.remove_hook(collect)
+    elapsed = time.time() - start
+    if run_trace.enabled():
+        for r in results:
+            r['phases'] = phases.get(r['host'], [])
+    for r in results:
+        if r['status'] == 'ok':
+            print('{:<24} ok     {:>7.2f}s  Metadata={} Data={}'.format(
+                r['host'], r['seconds'], ','.join(r['metadata']), ','.join(r['data'])))
+        else:
+            print('{:<24} FAILED {:>7.2f}s  {}'.format(r['host'], r['seconds'], r['error']))
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    with open(args.report, 'w') as f:
+        json.dump({'inventory': args.inventory, 'workers': args.workers,
+                   'seconds': round(elapsed, 3), 'hosts': len(results), 'failed': failed,
+                   'results': results}, f, indent=2)
+    print('{} hosts, {} failed, {:.2f}s; report written to {}'.format(
+        len(results), failed, elapsed, args.report))
+    return 1 if failed else 0
@@ -0,0 +1,80 @@
+# Locates the Autodesk install tree once and indexes the config files the
+# wizard needs.
+#
+# The old lookups each ran their own root level glob('/*/*/...'), which walks
+# every automounted top level directory.  Here the tree is taken from an
+# explicit root or $AUTODESK_ROOT; otherwise a single root level glob looks
+# for trees besides /opt/Autodesk so a second install is reported instead
+# of silently losing to the default.  Results are cached per root for the
+# life of the process.
+
+import os
+from glob import glob
+
+ROOT_ENV = 'AUTODESK_ROOT'
+DEFAULT_ROOT = '/opt/Autodesk'
+SEARCH_GLOB = '/*/*/sw/cfg'
+
+_trees = {}
+
+
+class AmbiguousInstallTree(Exception):
+    """ More than one directory looks like an Autodesk install tree """
+
+    def __init__(self, candidates):
+        Exception.__init__(self, 'Found more than one install tree: {}'.format(', '.join(candidates)))
+        self.candidates = candidates
+
+
+class InstallTree(object):
+    """ Paths of the config files found under one install root, None if missing """
+    __slots__ = ('root', 'framestore_map', 'network_cfg', 'storage_cfg')
+
+    def __init__(self, root):
+        self.root = root
+        cfg = os.path.join(root, 'cfg')
+        sw_cfg = os.path.join(root, 'sw', 'cfg')
+        cfg_files = _listdir(cfg)
+        sw_files = _listdir(sw_cfg)
+        self.network_cfg = os.path.join(cfg, 'network.cfg') if 'network.cfg' in cfg_files else None
+        self.framestore_map = (os.path.join(sw_cfg, 'sw_framestore_map')
+                               if 'sw_framestore_map' in sw_files else None)
+        self.storage_cfg = os.path.join(sw_cfg, 'sw_storage.cfg') if 'sw_storage.cfg' in sw_files else None
+
+    def __repr__(self):
+        return 'InstallTree(%r)' % self.root
+
+
+def _listdir(path):
+    try:
+        return set(os.listdir(path))
+    except OSError:
+        return set()
+
+
+def _looks_installed(root):
+    return os.path.isdir(os.path.join(root, 'sw', 'cfg')) or os.path.isdir(os.path.join(root, 'cfg'))
+
+
+def find_root(root=None):
+    """ Returns the install root: root, $AUTODESK_ROOT, or the one tree among
+    /opt/Autodesk and the /*/* matches; raises AmbiguousInstallTree if there
+    are several """
+    root = root or os.environ.get(ROOT_ENV)
+    if root:
+        return root
+    candidates = set(os.path.dirname(os.path.dirname(p)) for p in glob(SEARCH_GLOB))
+    if _looks_installed(DEFAULT_ROOT):
+        candidates.add(DEFAULT_ROOT)
+    if len(candidates) > 1:
+        raise AmbiguousInstallTree(sorted(candidates))
+    return candidates.pop() if candidates else DEFAULT_ROOT
+
+
+def install_tree(root=None):
+    """ Returns the cached InstallTree, locating and scanning it on first use """
+    key = root or os.environ.get(ROOT_ENV)
+    tree = _trees.get(key)
+    if tree is None:
+        tree = _trees[key] = InstallTree(find_root(key))
+    return tree
@@ -0,0 +1,143 @@
+# TCP-connect latency from every local interface to every known framestore.
+#
+# network.cfg tries its Metadata=/Data=/Multicast= interfaces in list order,
+# so an interface that cannot reach the other framestores should not lead
+# it.  The matrix only demotes those: on a LAN the handshake differences
+# are noise, so the link-speed (or benchmark) order is kept otherwise.  The
+# peers come from the framestores already in sw_framestore_map; each local
+# interface connects to each peer address from its own source address, all
+# at once on one asyncio loop.  A refused connection still proves the path
+# (the peer's RST came back), so it counts as reachable with its round trip.
+
+import asyncio
+import json
+import socket
+import time
+
+from . import sw_config
+
+DEFAULT_PORT = 7549     # Wiretap server; any port answers with SYN-ACK or RST
+DEFAULT_TIMEOUT = 1.0
+
+
+def map_peers(path, local_uuid=None):
+    """ {framestore: [addresses]} from a sw_framestore_map, leaving out this host """
+    cfg = sw_config.load(path)
+    interfaces = cfg.interfaces()
+    peers = {}
+    for fs in cfg.framestores():
+        name = fs.get('FRAMESTORE')
+        if not name or (local_uuid and fs.get('HOSTUUID') == local_uuid):
+            continue
+        addrs = peers.setdefault(name, [])
+        for addr in [fs.get('HADDR')] + [i.get('IADDR') for i in interfaces.get(name, ())]:
+            if addr and addr not in addrs:
+                addrs.append(addr)
+    return peers
+
+
+async def _connect_rtt(src_ip, addr, port, timeout):
+    """ Round trip of a TCP handshake in ms, None when the peer did not answer """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        sock.bind((src_ip, 0))
+        start = time.time()
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (addr, port)), timeout)
+        except ConnectionRefusedError:
+            pass
+        return (time.time() - start) * 1000.0
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        sock.close()
+
+
+async def _measure(sources, addrs, port, timeout):
+    pairs = [(dev, addr) for dev in sources for addr in addrs]
+    rtts = await asyncio.gather(*[_connect_rtt(sources[dev], addr, port, timeout)
+                                  for dev, addr in pairs])
+    matrix = dict((dev, {}) for dev in sources)
+    for (dev, addr), rtt in zip(pairs, rtts):
+        matrix[dev][addr] = rtt
+    return matrix
+
+
+def measure_matrix(sources, peers, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+    """ {dev: {peer address: ms or None}} for sources {dev: ip} and peers {name: [addresses]} """
+    sources = dict((dev, ip) for dev, ip in sources.items() if ip)
+    addrs = []
+    for peer_addrs in peers.values():
+        addrs.extend(addr for addr in peer_addrs if addr not in addrs)
+    return asyncio.run(_measure(sources, addrs, port, timeout))
+
+
+def _reached(row):
+    return sum(1 for rtt in row.values() if rtt is not None)
+
+
+def order_by_rtt(devs, matrix):
+    """ devs with the most peers reached first; devices reaching as many keep
+    their order in devs, e.g. the link-speed ranking, whatever their round
+    trips.  Devices missing from the matrix keep their place behind the
+    measured ones. """
+    measured = [dev for dev in devs if dev in matrix]
+    ranked = sorted(measured, key=lambda dev: -_reached(matrix[dev]))
+    return ranked + [dev for dev in devs if dev not in matrix]
+
+
+def record(matrix, host=None, port=DEFAULT_PORT):
+    return {'time': int(time.time()), 'host': host or socket.gethostname(), 'port': port,
+            'matrix': dict((dev, dict((addr, None if rtt is None else round(rtt, 3))
+                                      for addr, rtt in row.items()))
+                           for dev, row in matrix.items())}
+
+
+def append_json(path, matrix, host=None, port=DEFAULT_PORT):
+    """ Appends the matrix as one JSON line, so runs can be compared over time """
+    with open(path, 'a') as f:
+        f.write(json.dumps(record(matrix, host, port), sort_keys=True) + '\n')
+
+
+def print_matrix(matrix):
+    addrs = sorted(set(addr for row in matrix.values() for addr in row))
+    print('{:>12}  '.format('') + ''.join('{:>16}'.format(addr) for addr in addrs))
+    for dev in sorted(matrix):
+        cells = [matrix[dev].get(addr) for addr in addrs]
+        print('{:>12}  '.format(dev) + ''.join('{:>13.3f} ms'.format(c) if c is not None
+                                               else '{:>16}'.format('-') for c in cells))
+
+
+def add_arguments(parser):
+    parser.add_argument('--map', metavar='FILE', help='sw_framestore_map to read peers from')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--json', metavar='FILE', help='append the matrix to this JSON-lines file')
+    parser.add_argument('interfaces', nargs='*', help='interfaces to measure from (default: all active)')
+
+
+def run(args):
+    from .enumerate_interfaces import inventory
+    from .wizard import get_tree
+
+    tree = get_tree(args.root)
+    path = args.map or tree.framestore_map
+    if not path:
+        print('Unable to locate sw_framestore_map, pass --map')
+        return 2
+    # this host's own entry is not a peer
+    uuid = sw_config.load(tree.network_cfg).get('UUID') if tree.network_cfg else None
+    peers = map_peers(path, uuid)
+    if not peers:
+        print('No other framestores in {}'.format(path))
+        return 1
+    ifaces = inventory()
+    devs = args.interfaces or [i.name for i in ifaces.values() if i.up and i.running and not i.loopback]
+    matrix = measure_matrix(dict((dev, ifaces[dev].ip if dev in ifaces else '') for dev in devs),
+                            peers, args.port, args.timeout)
+    print_matrix(matrix)
+    if args.json:
+        append_json(args.json, matrix, port=args.port)
+    return 0 if any(rtt is not None for row in matrix.values() for rtt in row.values()) else 1
@@ -0,0 +1,203 @@
+# Kernel buffer and NIC offload readiness of the high-speed data path.
+#
+# 40/100G links are held back by default socket buffer limits, small TCP
+# autotuning maxima, short rings and disabled offloads long before the
+# network is.  check() compares the sysctls under /proc/sys/net and the
+# NIC's ring sizes and offloads (ethtool ioctls) against a profile sized
+# for the link speed and scores the result; dropin() renders the sysctls
+# that fall short as a persistent /etc/sysctl.d file.
+#
+# proc_root can point at a fake tree and the NIC settings can be passed in
+# as a dict (e.g. loaded from JSON) when there is no real NIC to ask.
+
+import array
+import fcntl
+import json
+import os
+import socket
+import struct
+
+PROC_ROOT = '/proc'
+SYSCTL_DROPIN = '/etc/sysctl.d/90-stonewire-net.conf'
+
+SIOCETHTOOL = 0x8946
+ETHTOOL_GRINGPARAM = 0x10
+OFFLOADS = (('rx-checksum', 0x14), ('tx-checksum', 0x16), ('scatter-gather', 0x18),
+            ('tso', 0x1e), ('gso', 0x23), ('gro', 0x2b))
+RINGPARAM = struct.Struct('=9I')
+
+MB = 1 << 20
+# (up to Mb/s, socket buffer max, netdev_max_backlog); the last tier has no limit
+TIERS = ((1000, 16 * MB, 5000),
+         (10000, 64 * MB, 30000),
+         (40000, 128 * MB, 100000),
+         (None, 256 * MB, 250000))
+
+
+class Check(object):
+    """ One setting against the profile; ok is None when it could not be read """
+    __slots__ = ('name', 'current', 'wanted', 'ok', 'sysctl')
+
+    def __init__(self, name, current, wanted, ok, sysctl=False):
+        self.name = name
+        self.current = current
+        self.wanted = wanted
+        self.ok = ok
+        self.sysctl = sysctl    # fixable through sysctl.d
+
+    def __repr__(self):
+        return 'Check(%r, %r, %r, ok=%r)' % (self.name, self.current, self.wanted, self.ok)
+
+
+class Readiness(object):
+    __slots__ = ('dev', 'speed', 'checks')
+
+    def __init__(self, dev, speed, checks):
+        self.dev = dev
+        self.speed = speed
+        self.checks = checks
+
+    @property
+    def score(self):
+        """ Percentage of the readable settings that meet the profile """
+        rated = [c for c in self.checks if c.ok is not None]
+        return int(round(100.0 * sum(1 for c in rated if c.ok) / len(rated))) if rated else 100
+
+
+def profile(speed):
+    """ {sysctl: wanted} for a link of speed Mb/s; unknown speeds get the 10G tier """
+    speed = speed or 10000
+    for limit, buf, backlog in TIERS:
+        if limit is None or speed <= limit:
+            break
+    return {'net.core.rmem_max': buf,
+            'net.core.wmem_max': buf,
+            'net.core.netdev_max_backlog': backlog,
+            'net.ipv4.tcp_rmem': (4096, 87380, buf),
+            'net.ipv4.tcp_wmem': (4096, 65536, buf),
+            'net.ipv4.tcp_window_scaling': 1,
+            'net.ipv4.tcp_mtu_probing': 1}
+
+
+def read_sysctl(name, proc_root=PROC_ROOT):
+    """ Integer, or tuple for multi-value sysctls; None if missing """
+    try:
+        with open(os.path.join(proc_root, 'sys', *name.split('.'))) as f:
+            values = [int(v) for v in f.read().split()]
+    except (IOError, OSError, ValueError):
+        return None
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+def _ethtool(sock, dev, buf):
+    addr, _ = buf.buffer_info()
+    fcntl.ioctl(sock.fileno(), SIOCETHTOOL, struct.pack('16sP', dev.encode()[:15], addr))
+
+
+def ethtool_settings(dev):
+    """ {'rx', 'rx_max', 'tx', 'tx_max', <offload>: bool} from the driver;
+    settings the driver does not support are left out """
+    found = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ring = array.array('B', RINGPARAM.pack(ETHTOOL_GRINGPARAM, *[0] * 8))
+        try:
+            _ethtool(sock, dev, ring)
+            values = RINGPARAM.unpack(ring.tobytes())
+            found.update(rx_max=values[1], tx_max=values[4], rx=values[5], tx=values[8])
+        except (IOError, OSError):
+            pass
+        for name, cmd in OFFLOADS:
+            value = array.array('I', [cmd, 0])
+            try:
+                _ethtool(sock, dev, value)
+                found[name] = bool(value[1])
+            except (IOError, OSError):
+                pass
+    finally:
+        sock.close()
+    return found
+
+
+def check(dev, speed, proc_root=PROC_ROOT, nic=None):
+    """ Readiness of dev for a link of speed Mb/s; nic defaults to ethtool_settings(dev) """
+    checks = []
+    for name, wanted in sorted(profile(speed).items()):
+        current = read_sysctl(name, proc_root)
+        if current is None:
+            ok = None
+        elif isinstance(wanted, tuple):
+            # only the autotuning maximum matters
+            ok = isinstance(current, tuple) and current[-1] >= wanted[-1]
+        else:
+            ok = current >= wanted
+        checks.append(Check(name, current, wanted, ok, sysctl=True))
+    if nic is None:
+        nic = ethtool_settings(dev)
+    for side in ('rx', 'tx'):
+        if side in nic and nic.get(side + '_max'):
+            checks.append(Check('{} ring'.format(side), nic[side], nic[side + '_max'],
+                                nic[side] >= nic[side + '_max']))
+    for name, _ in OFFLOADS:
+        if name in nic:
+            checks.append(Check(name, 'on' if nic[name] else 'off', 'on', nic[name]))
+    return Readiness(dev, speed, checks)
+
+
+def _value(value):
+    return ' '.join(str(v) for v in value) if isinstance(value, tuple) else str(value)
+
+
+def print_readiness(report):
+    speed = '{:g}G'.format(report.speed / 1000.0) if report.speed else 'unknown speed'
+    print('{} ({}): readiness score {}/100'.format(report.dev, speed, report.score))
+    for c in report.checks:
+        mark = '  ok ' if c.ok else (' ?? ' if c.ok is None else ' LOW')
+        print('  {} {:<30} {:>22}  (want {})'.format(
+            mark, c.name, '-' if c.current is None else _value(c.current), _value(c.wanted)))
+    fixable = [c for c in report.checks if c.ok is False and not c.sysctl]
+    if fixable:
+        print('  ring/offload settings: raise with ethtool -G/-K {}'.format(report.dev))
+
+
+def dropin(report):
+    """ sysctl.d text for the sysctls that fall short, None if there are none """
+    low = [c for c in report.checks if c.sysctl and c.ok is False]
+    if not low:
+        return None
+    lines = ['# Stone+Wire high-speed data path ({}, {} Mb/s)\n'.format(report.dev, report.speed or 'unknown')]
+    for c in low:
+        wanted = c.wanted
+        if isinstance(wanted, tuple) and isinstance(c.current, tuple):
+            # keep the running min/default, raise only the maximum
+            wanted = c.current[:-1] + wanted[-1:]
+        lines.append('{} = {}\n'.format(c.name, _value(wanted)))
+    return ''.join(lines)
+
+
+def add_arguments(parser):
+    parser.add_argument('dev', help='data interface to check')
+    parser.add_argument('--speed', type=int, help='link speed in Mb/s (default: from sysfs)')
+    parser.add_argument('--proc-root', default=PROC_ROOT)
+    parser.add_argument('--nic-json', metavar='FILE',
+                        help='ring/offload settings as JSON instead of asking the driver')
+    parser.add_argument('--sysctl-dropin', nargs='?', const=SYSCTL_DROPIN, metavar='FILE',
+                        help='write the missing sysctls here (default {})'.format(SYSCTL_DROPIN))
+
+
+def run(args):
+    from . import sw_config
+    from .enumerate_interfaces import link_info
+
+    nic = None
+    if args.nic_json:
+        with open(args.nic_json) as f:
+            nic = json.load(f)
+    speed = args.speed if args.speed is not None else link_info(args.dev).speed
+    report = check(args.dev, speed, args.proc_root, nic)
+    print_readiness(report)
+    if args.sysctl_dropin:
+        text = dropin(report)
+        if text and sw_config.write_if_changed(args.sysctl_dropin, text):
+            print('Wrote {}; load it with sysctl --system'.format(args.sysctl_dropin))
+    return 0 if all(c.ok is not False for c in report.checks) else 1
@@ -0,0 +1,197 @@
+# Path-MTU discovery from each data interface to its peers.
+#
+# A NIC at MTU 9000 behind a switch port left at 1500 works for small I/O
+# and falls apart for frames.  Each probe is a UDP datagram with DF set,
+# sent from the interface's address to an unused port on the peer, the way
+# tracepath does it: the peer's ICMP port-unreachable proves the datagram got
+# through whole, while an ICMP fragmentation-needed from a hop lowers the
+# kernel's path MTU for the route (read back with IP_MTU) and fails the size.
+# Sizes are binary searched per target, and every interface/target pair runs
+# at the same time on one asyncio loop.  Peers rate-limit their
+# port-unreachables, so a silent probe is retried before it counts.  Once a
+# minimum sized probe has been answered, a size that stays silent through
+# the retries is being dropped without an ICMP (a black hole) and fails like
+# a size the kernel refused.  No ping, no raw sockets, no root.
+
+import asyncio
+import errno
+import socket
+
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+
+PROBE_PORT = 33434          # traceroute's, nothing listens there
+HEADERS = 28                # IPv4 + UDP
+MIN_MTU = 576
+MAX_MTU = 65535
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_TRIES = 3           # probes of one size before it counts as unanswered
+
+
+class MtuResult(object):
+    """ Local MTU of dev against the path MTU measured to target """
+    __slots__ = ('dev', 'src', 'target', 'local_mtu', 'path_mtu', 'blackhole', 'error')
+
+    def __init__(self, dev, src, target, local_mtu, path_mtu=None, error=None):
+        self.dev = dev
+        self.src = src
+        self.target = target
+        self.local_mtu = local_mtu
+        self.path_mtu = path_mtu    # None when the target never answered
+        self.blackhole = False      # larger frames vanished without an ICMP
+        self.error = error
+
+    @property
+    def fragments(self):
+        """ True when full sized frames from dev do not fit the path """
+        return self.path_mtu is not None and self.path_mtu < min(self.local_mtu, MAX_MTU)
+
+    def __repr__(self):
+        return 'MtuResult(%r, %r, local=%r, path=%r, error=%r)' % (
+            self.dev, self.target, self.local_mtu, self.path_mtu, self.error)
+
+
+def _socket(src, dev, target):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        if dev and hasattr(socket, 'SO_BINDTODEVICE'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, dev.encode())
+            except OSError:
+                pass    # needs CAP_NET_RAW; the source address still picks the route
+        sock.bind((src, 0))
+        sock.connect((target, PROBE_PORT))
+        sock.setblocking(False)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def _route_mtu(sock):
+    try:
+        return sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError:
+        return None
+
+
+async def _fits(src, dev, target, mtu, timeout, tries=DEFAULT_TRIES):
+    """ (fits, kernel path MTU for the route): fits is True when an mtu sized
+    packet got through, False when the kernel refused it (EMSGSIZE or an
+    IP_MTU below mtu after a fragmentation-needed) and None when nothing
+    answered in tries attempts.  Peers rate-limit port-unreachables, so
+    what silence means is left to the caller. """
+    loop = asyncio.get_running_loop()
+    sock = _socket(src, dev, target)
+    try:
+        for _ in range(tries):
+            try:
+                sock.send(b'\0' * (mtu - HEADERS))
+                await asyncio.wait_for(loop.sock_recv(sock, 1), timeout)
+                return True, None       # something answered on the port, it arrived
+            except ConnectionRefusedError:
+                return True, None
+            except asyncio.TimeoutError:
+                route = _route_mtu(sock)
+                if route and route < mtu:
+                    return False, route
+            except OSError as e:
+                if e.errno != errno.EMSGSIZE:
+                    raise
+                return False, _route_mtu(sock)
+        return None, _route_mtu(sock)
+    finally:
+        sock.close()
+
+
+async def _discover(dev, src, target, local_mtu, timeout):
+    result = MtuResult(dev, src, target, local_mtu)
+    hi = min(local_mtu, MAX_MTU)
+    try:
+        ok, route = await _fits(src, dev, target, hi, timeout)
+        if ok:
+            result.path_mtu = hi
+            return result
+        # an ICMP fragmentation-needed already told the kernel the answer
+        if ok is False and route and MIN_MTU <= route < hi:
+            fits, _ = await _fits(src, dev, target, route, timeout)
+            if fits:
+                result.path_mtu = route
+                return result
+            if not fits:
+                hi = route
+        lo = MIN_MTU
+        fits, _ = await _fits(src, dev, target, lo, timeout)
+        if not fits:
+            result.error = 'no answer from {} (ICMP filtered or host down)'.format(target)
+            return result
+        # small probes are answered, so from here on silence means dropped
+        result.blackhole = ok is None
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            fits, route = await _fits(src, dev, target, mid, timeout)
+            if fits:
+                lo = mid
+            else:
+                hi = route if fits is False and route and lo < route < mid else mid
+        result.path_mtu = lo
+    except OSError as e:
+        result.error = e.strerror or str(e)
+    return result
+
+
+async def _discover_all(targets, timeout):
+    return await asyncio.gather(*[_discover(dev, src, target, mtu, timeout)
+                                  for dev, src, mtu, target in targets])
+
+
+def discover(targets, timeout=DEFAULT_TIMEOUT):
+    """ [MtuResult] for every (dev, src ip, local mtu, target) in targets, probed at once """
+    return asyncio.run(_discover_all(list(targets), timeout))
+
+
+def print_results(results):
+    for r in results:
+        if r.error:
+            status = 'unknown: {}'.format(r.error)
+        elif r.fragments:
+            status = 'FRAGMENTS, path MTU {}{}'.format(
+                r.path_mtu, ' (larger frames are dropped without an ICMP)' if r.blackhole else '')
+        else:
+            status = 'ok, path MTU {}'.format(r.path_mtu)
+        print('{:>12}  {:<15} -> {:<15}  local MTU {:>5}  {}'.format(
+            r.dev, r.src, r.target, r.local_mtu, status))
+
+
+def add_arguments(parser):
+    parser.add_argument('--peers', metavar='HOST,...',
+                        help='targets to probe (default: the framestores in sw_framestore_map)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per probe')
+    parser.add_argument('interfaces', nargs='*', help='interfaces to probe from (default: all active)')
+
+
+def run(args):
+    from .enumerate_interfaces import inventory
+    from .wizard import get_tree
+    from . import latency_matrix, sw_config
+
+    if args.peers:
+        peers = [p for p in args.peers.split(',') if p]
+    else:
+        tree = get_tree(args.root)
+        path = tree.framestore_map
+        uuid = sw_config.load(tree.network_cfg).get('UUID') if tree.network_cfg else None
+        peers = [addr for addrs in (latency_matrix.map_peers(path, uuid).values() if path else ())
+                 for addr in addrs]
+    if not peers:
+        print('No peers to probe; pass --peers')
+        return 2
+    ifaces = inventory()
+    devs = args.interfaces or [i.name for i in ifaces.values() if i.up and i.running and not i.loopback]
+    targets = [(dev, ifaces[dev].ip, ifaces[dev].mtu, peer)
+               for dev in devs if dev in ifaces and ifaces[dev].ip for peer in peers]
+    results = discover(targets, args.timeout)
+    print_results(results)
+    return 1 if any(r.fragments for r in results) else 0
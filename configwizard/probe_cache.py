@@ -0,0 +1,95 @@
+# On-disk cache of per-interface probe results.
+#
+# Fleet rollouts rerun the wizard many times per host within minutes, and
+# each run used to ping, read link state and benchmark every interface from
+# scratch.  Results are kept here keyed by ifindex, MAC and the interface's
+# address set, so a renumbered, re-created or re-addressed interface misses
+# the cache by construction.  Entries expire after ttl seconds and the
+# file holds at most max_entries, oldest dropped first.
+
+import json
+import os
+import time
+
+from . import sw_config
+
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 256
+
+
+def default_path():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'configWizard', 'probes.json')
+
+
+def cache_key(iface):
+    """ ifindex|mac|sorted addresses of an enumerate_interfaces.Interface """
+    return '{}|{}|{}'.format(iface.index, iface.mac, ','.join(sorted(iface.ipv4 + iface.ipv6)))
+
+
+class ProbeCache(object):
+    """ {key: {'dev', 'time', <field>: value}}; fields are stamped individually
+    so a fresh ping does not make an old throughput score look fresh """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, now=None):
+        self.path = path or default_path()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.now = now or time.time
+        self.dirty = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+
+    def get(self, iface, *fields):
+        """ {field: value} for iface when every field is cached and fresh, else None """
+        entry = self.entries.get(cache_key(iface))
+        if entry is None:
+            return None
+        stamps = entry.get('time', {})
+        oldest = self.now() - self.ttl
+        if any(stamps.get(field, 0) < oldest for field in fields):
+            return None
+        return dict((field, entry.get(field)) for field in fields)
+
+    def put(self, iface, **fields):
+        key = cache_key(iface)
+        entry = self.entries.get(key)
+        if entry is None:
+            # whatever was cached under the device's old key is stale now
+            for old in [k for k, e in self.entries.items() if e.get('dev') == iface.name]:
+                del self.entries[old]
+            entry = self.entries[key] = {'dev': iface.name, 'time': {}}
+        now = self.now()
+        for field, value in fields.items():
+            entry[field] = value
+            entry['time'][field] = now
+        self.dirty = True
+
+    def evict(self):
+        """ Drops expired entries, then the oldest beyond max_entries """
+        oldest = self.now() - self.ttl
+        for key in [k for k, e in self.entries.items() if max(e['time'].values() or [0]) < oldest]:
+            del self.entries[key]
+            self.dirty = True
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: max(self.entries[k]['time'].values() or [0]))
+            for key in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        self.evict()
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            sw_config.atomic_write(self.path, json.dumps(self.entries, sort_keys=True))
+        except (IOError, OSError):
+            # a cache that cannot be written only costs the next run a probe
+            return
+        self.dirty = False
@@ -0,0 +1,111 @@
+# Concurrent reachability probing for the wizard's candidate interfaces.
+#
+# Every address is pinged at the same time from one asyncio loop, so the wall
+# clock cost of probing is about one probe timeout however many interfaces the
+# host has.  Failures are reported per interface instead of aborting the run.
+
+import asyncio
+import os
+import re
+import signal
+import time
+
+PING_TIME = re.compile(br'time[=<]\s*([\d.]+)\s*ms')
+
+
+class ProbeResult(object):
+    """ Outcome of probing one interface address """
+    __slots__ = ('dev', 'ip', 'reachable', 'latency', 'error')
+
+    def __init__(self, dev, ip, reachable=False, latency=None, error=None):
+        self.dev = dev
+        self.ip = ip
+        self.reachable = reachable
+        self.latency = latency  # round trip in ms, None when unreachable
+        self.error = error
+
+    def __repr__(self):
+        return 'ProbeResult(%r, %r, reachable=%r, latency=%r, error=%r)' % (
+            self.dev, self.ip, self.reachable, self.latency, self.error)
+
+
+async def _kill(proc):
+    # ping runs in its own session so anything it spawned goes with it
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    await proc.wait()
+
+
+async def _ping(dev, ip, timeout):
+    result = ProbeResult(dev, ip)
+    if not ip:
+        result.error = 'no IPv4 address'
+        return result
+    start = time.time()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ping', '-c1', '-W', str(max(1, int(round(timeout)))), ip,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            start_new_session=True)
+    except OSError as e:
+        result.error = 'unable to run ping: {}'.format(e.strerror)
+        return result
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        result.error = 'no reply within {:g}s'.format(timeout)
+        return result
+    except asyncio.CancelledError:
+        await _kill(proc)
+        raise
+    if proc.returncode != 0:
+        result.error = (err.strip().decode(errors='replace')
+                        or 'ping exited with status {}'.format(proc.returncode))
+        return result
+    match = PING_TIME.search(out)
+    result.reachable = True
+    result.latency = float(match.group(1)) if match else (time.time() - start) * 1000.0
+    return result
+
+
+async def _probe_all(targets, timeout, budget, on_result=None):
+    tasks = dict((asyncio.ensure_future(_ping(dev, ip, timeout)), (dev, ip))
+                 for dev, ip in targets)
+    if not tasks:
+        return {}
+    if on_result is not None:
+        for task in tasks:
+            task.add_done_callback(
+                lambda t: on_result(t.result()) if not t.cancelled() and t.exception() is None else None)
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+    results = {}
+    for task, (dev, ip) in tasks.items():
+        if task in done and task.exception() is None:
+            results[dev] = task.result()
+        elif task in done:
+            results[dev] = ProbeResult(dev, ip, error=str(task.exception()))
+        else:
+            results[dev] = ProbeResult(dev, ip, error='probe budget of {:g}s exceeded'.format(budget))
+        if on_result is not None and not (task in done and task.exception() is None):
+            on_result(results[dev])
+    return results
+
+
+def probe_all(targets, timeout=1.0, budget=None, on_result=None):
+    """ Pings every (dev, ip) in targets at once.
+
+    timeout is the deadline for each probe and budget the deadline for the
+    whole run (defaults to timeout plus one second).  on_result, if given,
+    is called with each ProbeResult as soon as it is known.  Returns
+    {dev: ProbeResult}.
+    """
+    if budget is None:
+        budget = timeout + 1.0
+    return asyncio.run(_probe_all(list(targets), timeout, budget, on_result))
@@ -0,0 +1,191 @@
+# Per-phase run trace.
+#
+# A run is split into phases (discovery, enumeration, probing, rendering,
+# backup, write); each phase() block records its wall time, the subprocesses
+# and file opens it caused, the fields the caller sets (counts, device, file)
+# and the error that ended it, if any.  Records go out as JSON lines and to
+# any hooks registered with add_hook(), which is how fleet and benchmark
+# collect the same numbers for their reports.
+#
+# Subprocesses and opens are counted with a sys.addaudithook() hook that is
+# only installed once tracing starts; counters are process wide, so a phase
+# running next to a background thread also sees that thread's activity.
+# When tracing is off phase() hands back one shared no-op object, so an
+# untraced run pays a global lookup per phase and nothing else.
+
+import json
+import sys
+import threading
+import time
+
+PHASES = ('discovery', 'enumeration', 'probing', 'rendering', 'backup', 'write')
+SPAWN_EVENTS = frozenset(('subprocess.Popen', 'os.posix_spawn', 'os.spawn', 'os.system', 'os.exec'))
+OPEN_EVENTS = frozenset(('open', 'os.open'))
+
+_tracer = None
+_audit_installed = False
+
+
+class _Off(object):
+    """ What phase() returns while tracing is off """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_OFF = _Off()
+
+
+class Span(object):
+    """ One phase() block in progress """
+    __slots__ = ('tracer', 'name', 'fields', 'start', 'spawns', 'opens')
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        """ Adds fields (counts, results) to the record """
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.spawns = self.tracer.spawns
+        self.opens = self.tracer.opens
+        self.start = time.time()
+        return self
+
+    def __exit__(self, kind, value, tb):
+        elapsed = time.time() - self.start
+        record = {'phase': self.name, 'start': round(self.start, 6), 'seconds': round(elapsed, 6),
+                  'subprocesses': self.tracer.spawns - self.spawns,
+                  'opens': self.tracer.opens - self.opens, 'error': None}
+        if kind is not None:
+            if issubclass(kind, SystemExit):
+                record['error'] = 'exit {}'.format(value.code)
+            else:
+                record['error'] = '{}: {}'.format(kind.__name__, value)
+        record.update(self.fields)
+        self.tracer.emit(record)
+        return False
+
+
+class Tracer(object):
+    """ Collects phase records; out is a file object for the JSON lines or None """
+
+    def __init__(self, out=None):
+        self.out = out
+        self.hooks = []
+        self.records = []
+        self.spawns = 0
+        self.opens = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def audit(self, event, args):
+        if event in OPEN_EVENTS:
+            self.opens += 1
+        elif event in SPAWN_EVENTS:
+            self.spawns += 1
+
+    def emit(self, record):
+        with self.lock:
+            self.records.append(record)
+            if self.out is not None:
+                self.out.write(json.dumps(record, sort_keys=True) + '\n')
+                self.out.flush()
+            hooks = list(self.hooks)
+        for hook in hooks:
+            hook(record)
+
+    def summary(self):
+        """ Totals per phase plus the whole run """
+        phases = {}
+        for r in self.records:
+            total = phases.setdefault(r['phase'], {'calls': 0, 'seconds': 0.0, 'subprocesses': 0,
+                                                   'opens': 0, 'errors': 0})
+            total['calls'] += 1
+            total['seconds'] = round(total['seconds'] + r['seconds'], 6)
+            total['subprocesses'] += r['subprocesses']
+            total['opens'] += r['opens']
+            total['errors'] += 1 if r['error'] else 0
+        return {'phase': 'total', 'seconds': round(time.time() - self.started, 6),
+                'subprocesses': self.spawns, 'opens': self.opens, 'phases': phases}
+
+
+def _audit(event, args):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.audit(event, args)
+
+
+def start(path=None, hooks=()):
+    """ Turns tracing on, appending JSON lines to path ('-' for stderr) if given """
+    global _tracer, _audit_installed
+    if path == '-':
+        out = sys.stderr
+    elif path:
+        out = open(path, 'a')
+    else:
+        out = None
+    tracer = Tracer(out)
+    tracer.hooks.extend(hooks)
+    if not _audit_installed and hasattr(sys, 'addaudithook'):
+        # audit hooks cannot be removed, _audit() goes quiet once tracing stops
+        sys.addaudithook(_audit)
+        _audit_installed = True
+    _tracer = tracer
+    return tracer
+
+
+def stop():
+    """ Writes the run totals, turns tracing off and returns the Tracer """
+    global _tracer
+    tracer = _tracer
+    if tracer is None:
+        return None
+    _tracer = None
+    summary = tracer.summary()
+    if tracer.out is not None:
+        tracer.out.write(json.dumps(summary, sort_keys=True) + '\n')
+        if tracer.out is not sys.stderr:
+            tracer.out.close()
+    for hook in tracer.hooks:
+        hook(summary)
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def phase(name, **fields):
+    """ Context manager timing one phase; the no-op object when tracing is off """
+    tracer = _tracer
+    if tracer is None:
+        return _OFF
+    return Span(tracer, name, fields)
+
+
+def add_hook(hook):
+    """ Calls hook(record) for every record of the active trace; False when off """
+    tracer = _tracer
+    if tracer is None:
+        return False
+    with tracer.lock:
+        tracer.hooks.append(hook)
+    return True
+
+
+def remove_hook(hook):
+    tracer = _tracer
+    if tracer is not None:
+        with tracer.lock:
+            if hook in tracer.hooks:
+                tracer.hooks.remove(hook)
@@ -0,0 +1,458 @@
+# Line-preserving model of the Stone+Wire / Wiretap config files
+# (sw_framestore_map, network.cfg, sw_storage.cfg).
+#
+# A file is read once, as a stream, into sections of lines.  Every line keeps
+# its original text, so render() gives back the file byte for byte; changing
+# a value only rewrites the token that holds it.  Comments, blank lines and
+# keys the wizard does not know about are carried through untouched.
+
+import filecmp
+import io
+import os
+import re
+import tempfile
+
+# sections whose lines hold several KEY=value tokens, e.g.
+#   FRAMESTORE=flame   HADDR=192.0.2.30  HOSTUUID=...  ID=30
+TOKEN_SECTIONS = ('FRAMESTORES', 'INTERFACES')
+
+SECTION = re.compile(r'^\s*\[([^\]]+)\]\s*$')
+TOKEN = re.compile(r'(\S+?)=(\S*)')
+
+
+def _open(path, mode='r'):
+    # newline='' keeps \r\n endings, surrogateescape keeps stray bytes
+    return io.open(path, mode, newline='', encoding='utf-8', errors='surrogateescape')
+
+
+def _terminate(lines, newline='\n'):
+    """ Makes sure the last of lines ends in a newline before adding after it """
+    if lines and not lines[-1].text.endswith('\n'):
+        lines[-1].text += newline
+
+
+def _newline(lines, default='\n'):
+    """ Line ending used by lines: CRLF for files written on Windows, else LF """
+    for line in lines:
+        if line.text.endswith('\n'):
+            return '\r\n' if line.text.endswith('\r\n') else '\n'
+    return default
+
+
+class Line(object):
+    """ One physical line; kind is 'blank', 'comment', 'section' or 'entry' """
+    __slots__ = ('text', 'kind', 'tokens')
+
+    def __init__(self, text, section):
+        self.text = text
+        stripped = text.strip()
+        self.tokens = None
+        if not stripped:
+            self.kind = 'blank'
+        elif stripped.startswith('#'):
+            self.kind = 'comment'
+        elif SECTION.match(text):
+            self.kind = 'section'
+        elif '=' in stripped:
+            self.kind = 'entry'
+            if section in TOKEN_SECTIONS:
+                self.tokens = TOKEN.findall(stripped)
+            else:
+                # Key=value with the rest of the line as the value
+                key, _, value = stripped.partition('=')
+                self.tokens = [(key.strip(), value.strip())]
+        else:
+            # anything else is kept verbatim and otherwise ignored
+            self.kind = 'comment'
+
+    def get(self, key, default=None):
+        for k, v in self.tokens or ():
+            if k == key:
+                return v
+        return default
+
+    def as_dict(self):
+        return dict(self.tokens or ())
+
+    def set(self, key, value):
+        """ Rewrites key's value in place, appending the token if missing """
+        if self.get(key) is not None:
+            pattern = re.compile(r'(?<!\S)(%s=)(\S*)' % re.escape(key)) if len(self.tokens) > 1 \
+                else re.compile(r'^([ \t]*%s[ \t]*=[ \t]*)(.*?)(?=\s*$)' % re.escape(key))
+            self.text = pattern.sub(lambda m: m.group(1) + value, self.text, count=1)
+            self.tokens = [(k, value if k == key else v) for k, v in self.tokens]
+        else:
+            body = self.text.rstrip('\r\n')
+            self.text = '{}  {}={}{}'.format(body, key, value, self.text[len(body):])
+            self.tokens.append((key, value))
+
+    def __repr__(self):
+        return 'Line(%r)' % self.text
+
+
+class Section(object):
+    """ Lines from a [name] header up to the next one; name None is the preamble """
+    __slots__ = ('name', 'lines')
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+
+    def entries(self):
+        return [line for line in self.lines if line.kind == 'entry']
+
+    def add(self, text, newline=None):
+        """ Adds an entry after the last entry (or the header) of the section,
+        ending it like the section's other lines unless newline is given """
+        newline = newline or _newline(self.lines)
+        line = Line(text.rstrip('\r\n') + newline, self.name)
+        index = 0
+        for i, existing in enumerate(self.lines):
+            if existing.kind in ('entry', 'section'):
+                index = i + 1
+        _terminate(self.lines[:index], newline)
+        self.lines.insert(index, line)
+        return line
+
+
+class ConfigFile(object):
+    """ Parsed config file: an ordered list of Sections """
+
+    def __init__(self, sections=None):
+        self.sections = sections or [Section(None)]
+
+    def section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def entries(self, section=None):
+        """ Entry lines of one section, or of the whole file when section is None """
+        if section is not None:
+            found = self.section(section)
+            return found.entries() if found else []
+        return [line for s in self.sections for line in s.entries()]
+
+    def get(self, key, section=None, default=None):
+        """ Value of the last key= entry, like the old readlines() scans """
+        value = default
+        for line in self.entries(section):
+            found = line.get(key)
+            if found is not None:
+                value = found
+        return value
+
+    def newline(self):
+        """ The line ending the file uses, LF when it has none yet """
+        return _newline(line for section in self.sections for line in section.lines)
+
+    def set(self, section, key, value):
+        """ Sets key in section, adding the entry (and section) when missing """
+        newline = self.newline()
+        found = self.section(section)
+        if found is None:
+            _terminate(self.sections[-1].lines, newline)
+            found = Section(section)
+            found.lines.append(Line('[{}]'.format(section) + newline, section))
+            self.sections.append(found)
+        for line in reversed(found.entries()):
+            if line.get(key) is not None:
+                line.set(key, value)
+                return line
+        return found.add('{}={}'.format(key, value), newline)
+
+    def framestores(self):
+        """ [FRAMESTORES] entries as dicts """
+        return [line.as_dict() for line in self.entries('FRAMESTORES')]
+
+    def interfaces(self):
+        """ [INTERFACES] as {framestore: [PROT/IADDR dicts]} in file order """
+        result = {}
+        current = None
+        for line in self.entries('INTERFACES'):
+            name = line.get('FRAMESTORE')
+            if name is not None:
+                current = result.setdefault(name, [])
+            elif current is not None:
+                current.append(line.as_dict())
+        return result
+
+    def remove_framestore(self, name):
+        """ Drops name's [FRAMESTORES] entry and its [INTERFACES] block;
+        comments around them stay.  Returns whether anything was removed """
+        removed = False
+        for section in (self.section('FRAMESTORES'), self.section('INTERFACES')):
+            if section is None:
+                continue
+            kept = []
+            skipping = False
+            for line in section.lines:
+                if line.kind == 'entry':
+                    framestore = line.get('FRAMESTORE')
+                    if framestore is not None:
+                        # an [INTERFACES] block runs up to the next FRAMESTORE=
+                        skipping = framestore == name
+                    if skipping:
+                        removed = True
+                        if section.name == 'FRAMESTORES':
+                            skipping = False
+                        continue
+                kept.append(line)
+            section.lines = kept
+        return removed
+
+    def render(self):
+        return ''.join(line.text for section in self.sections for line in section.lines)
+
+    def write(self, path):
+        atomic_write(path, self.render())
+
+
+def parse_lines(lines):
+    """ Builds a ConfigFile from an iterable of lines (newlines included) """
+    sections = [Section(None)]
+    for text in lines:
+        match = SECTION.match(text)
+        if match:
+            sections.append(Section(match.group(1).strip()))
+        current = sections[-1]
+        current.lines.append(Line(text, current.name))
+    return ConfigFile(sections)
+
+
+def parse(text):
+    return parse_lines(io.StringIO(text, newline=''))
+
+
+def load(path):
+    """ Parses path in one streaming pass """
+    with _open(path) as f:
+        return parse_lines(f)
+
+
+def read(path):
+    """ Text of path, or None when it does not exist """
+    try:
+        with _open(path) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _replace(tmp, path):
+    """ Gives tmp the mode/owner of path, if any, and renames it over path """
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    if st is not None:
+        os.chmod(tmp, st.st_mode & 0o7777)
+        try:
+            os.chown(tmp, st.st_uid, st.st_gid)
+        except OSError:
+            pass
+    os.replace(tmp, path)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _temp_for(path):
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.',
+                               dir=os.path.dirname(os.path.abspath(path)))
+    return io.open(fd, 'w', newline='', encoding='utf-8', errors='surrogateescape'), tmp
+
+
+def atomic_write(path, text):
+    """ Writes text to a temp file next to path and renames it into place,
+    so readers such as Stone+Wire never see a half written file """
+    f, tmp = _temp_for(path)
+    try:
+        with f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_if_changed(path, text, on_change=None):
+    """ atomic_write() only when text differs from what path holds now.
+
+    on_change() runs first if path exists.  Returns whether path was written.
+    """
+    current = read(path)
+    if current == text:
+        return False
+    if current is not None and on_change is not None:
+        on_change()
+    atomic_write(path, text)
+    return True
+
+
+def framestore_line(name, haddr, uuid, fsid):
+    """ [FRAMESTORES] entry; ID is left out when fsid is None """
+    if fsid is None:
+        return 'FRAMESTORE={0}  HADDR={1}   HOSTUUID={2}\n'.format(name, haddr, uuid)
+    return 'FRAMESTORE={0}  HADDR={1}   HOSTUUID={2}    ID={3}\n'.format(name, haddr, uuid, fsid)
+
+
+def interface_lines(name, iaddrs):
+    """ FRAMESTORE= block for [INTERFACES]; iaddrs is [(prot, addr)] in order """
+    lines = ['FRAMESTORE={}\n'.format(name)]
+    for prot, addr in iaddrs:
+        lines.append('PROT={:<7} IADDR={}    DEV=1\n'.format(prot, addr))
+    return lines
+
+
+def upsert_lines(src, out, name, haddr, uuid, fsid, iaddrs):
+    """ Streams the map lines in src to out with the local entries replaced
+
+    Entries are matched on the framestore name or on HOSTUUID, so a renamed
+    host still replaces its old entry.  Every other line (remote framestores,
+    comments, unknown keys) is copied through as it streams past, so memory
+    use does not grow with the size of the map.  Missing sections are added.
+    """
+    new_fs = framestore_line(name, haddr, uuid, fsid)
+    new_if = interface_lines(name, iaddrs)
+    owned = set([name])
+    section = None
+    seen = set()
+    fs_done = if_done = False
+    skipping = False
+    wrote = False
+    newline = '\n'
+    pending = []    # comments/blank lines after the last entry of a section
+
+    def flush():
+        out.writelines(pending)
+        del pending[:]
+
+    def close_section():
+        # runs at a section header or EOF: add what the section lacks
+        # after its last entry, ahead of any trailing comments
+        if section == 'FRAMESTORES' and not fs_done:
+            out.write(new_fs)
+        elif section == 'INTERFACES' and not if_done:
+            out.writelines(new_if)
+        flush()
+
+    for text in src:
+        if not wrote and text.endswith('\r\n'):
+            # added lines end like the file's own
+            newline = '\r\n'
+            new_fs = new_fs.replace('\n', newline)
+            new_if = [added.replace('\n', newline) for added in new_if]
+        wrote = True
+        if not text.endswith('\n'):
+            text += newline   # last line of the file, entries may follow
+        match = SECTION.match(text)
+        if match:
+            close_section()
+            fs_done |= section == 'FRAMESTORES'
+            if_done |= section == 'INTERFACES'
+            section = match.group(1).strip()
+            seen.add(section)
+            skipping = False
+            if section == 'INTERFACES' and 'FRAMESTORES' not in seen:
+                out.write('[FRAMESTORES]' + newline + new_fs + newline)
+                fs_done = True
+            out.write(text)
+            continue
+        if section not in TOKEN_SECTIONS:
+            out.write(text)
+            continue
+        line = Line(text, section)
+        if line.kind != 'entry':
+            pending.append(text)
+            continue
+        if section == 'FRAMESTORES':
+            if line.get('FRAMESTORE') in owned or (uuid and line.get('HOSTUUID') == uuid):
+                owned.add(line.get('FRAMESTORE'))
+                if fs_done:
+                    continue    # drop duplicates of the local entry
+                flush()
+                out.write(new_fs)
+                fs_done = True
+                continue
+        else:
+            framestore = line.get('FRAMESTORE')
+            if framestore is not None:
+                skipping = framestore in owned
+                if skipping:
+                    if if_done:
+                        continue
+                    flush()
+                    out.writelines(new_if)
+                    if_done = True
+                    continue
+            elif skipping:
+                continue
+        flush()
+        out.write(text)
+    close_section()
+    fs_done |= section == 'FRAMESTORES'
+    if_done |= section == 'INTERFACES'
+    if not fs_done or not if_done:
+        if wrote:
+            out.write(newline)
+        if not fs_done:
+            out.write('[FRAMESTORES]' + newline + new_fs + newline)
+        if not if_done:
+            out.write('[INTERFACES]' + newline)
+            out.writelines(new_if)
+
+
+def upsert_text(text, name, haddr, uuid, fsid, iaddrs):
+    """ upsert_lines() over a map held in memory, e.g. one read from another host """
+    out = io.StringIO(newline='')
+    upsert_lines(io.StringIO(text, newline=''), out, name, haddr, uuid, fsid, iaddrs)
+    return out.getvalue()
+
+
+def _same_map(tmp, path):
+    """ Whether the upserted tmp says what path does; upsert_lines() ends a
+    last line that has no newline, which on its own is not a change """
+    if filecmp.cmp(tmp, path, shallow=False):
+        return True
+    if os.path.getsize(tmp) - os.path.getsize(path) not in (1, 2):
+        return False
+    with _open(tmp) as new, _open(path) as old:
+        new_text, old_text = new.read(), old.read()
+    return not old_text.endswith('\n') and new_text in (old_text + '\n', old_text + '\r\n')
+
+
+def upsert_framestore(path, name, haddr, uuid, fsid, iaddrs, on_change=None):
+    """ upsert_lines() from path into a temp file that atomically replaces it
+
+    When the result is identical to path, or only adds the newline its last
+    line lacked, the temp file is dropped and False is returned; otherwise on_change() (e.g. a backup) runs before the swap.
+    """
+    out, tmp = _temp_for(path)
+    try:
+        with out, _open(path) as src:
+            upsert_lines(src, out, name, haddr, uuid, fsid, iaddrs)
+            out.flush()
+            os.fsync(out.fileno())
+        if _same_map(tmp, path):
+            os.unlink(tmp)
+            return False
+        if on_change is not None:
+            on_change()
+        _replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return True
@@ -0,0 +1,291 @@
+# NUMA / IRQ-affinity audit for the Data= interface.
+#
+# Frame throughput drops when the NIC's interrupts, its RPS/XPS steering and
+# the Stone+Wire processes run on a different NUMA node than the one the NIC
+# hangs off.  check() reads the NIC's numa_node, its IRQs (msi_irqs, or
+# /proc/interrupts by name), every IRQ's smp_affinity and the per-queue
+# rps_cpus/xps_cpus masks, and reports whatever falls outside the node.
+# apply() writes the node's CPU mask to all of them and keeps the old values
+# in a rollback record that rollback() restores.
+#
+# sys_root and proc_root default to /sys and /proc and can point at a fake
+# tree to run offline.
+
+import json
+import os
+import re
+import time
+
+SYS_ROOT = '/sys'
+PROC_ROOT = '/proc'
+ROLLBACK_DIR = '/var/tmp'
+SW_PROCESS = re.compile(r'^(sw_|stone|wiretap|ifffsWiretap)', re.I)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def parse_cpulist(text):
+    """ '0-3,8,10-11' -> {0, 1, 2, 3, 8, 10, 11} """
+    cpus = set()
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def format_cpulist(cpus):
+    """ {0, 1, 2, 3, 8} -> '0-3,8' """
+    parts = []
+    for cpu in sorted(cpus):
+        if parts and parts[-1][1] == cpu - 1:
+            parts[-1][1] = cpu
+        else:
+            parts.append([cpu, cpu])
+    return ','.join(str(a) if a == b else '{}-{}'.format(a, b) for a, b in parts)
+
+
+def parse_mask(text):
+    """ smp_affinity style hex mask ('ff,00000000') -> set of CPUs """
+    value = int((text or '0').replace(',', ''), 16)
+    return set(cpu for cpu in range(value.bit_length()) if value >> cpu & 1)
+
+
+def format_mask(cpus, like=None):
+    """ Set of CPUs as a hex mask in 32-bit comma groups, as wide as like """
+    value = sum(1 << cpu for cpu in cpus)
+    digits = '{:x}'.format(value)
+    width = len(like.replace(',', '')) if like else 8
+    digits = digits.rjust(max(width, (len(digits) + 7) // 8 * 8), '0')
+    return ','.join(digits[i:i + 8] for i in range(0, len(digits), 8))
+
+
+class Finding(object):
+    """ One mask or placement that does not line up with the NIC's node """
+    __slots__ = ('what', 'path', 'current', 'expected')
+
+    def __init__(self, what, path, current, expected):
+        self.what = what
+        self.path = path            # file apply() would write, None if report-only
+        self.current = current
+        self.expected = expected
+
+    def __repr__(self):
+        return 'Finding(%r, %r -> %r)' % (self.what, self.current, self.expected)
+
+
+class TuneReport(object):
+    __slots__ = ('dev', 'node', 'node_cpus', 'irqs', 'findings')
+
+    def __init__(self, dev, node=None, node_cpus=None):
+        self.dev = dev
+        self.node = node            # None when the NIC reports no NUMA node
+        self.node_cpus = node_cpus or set()
+        self.irqs = []
+        self.findings = []
+
+    @property
+    def aligned(self):
+        return not self.findings
+
+
+def numa_node(dev, sys_root=SYS_ROOT):
+    node = _read(os.path.join(sys_root, 'class', 'net', dev, 'device', 'numa_node'))
+    if node is None or not node.lstrip('-').isdigit() or int(node) < 0:
+        return None
+    return int(node)
+
+
+def node_cpus(node, sys_root=SYS_ROOT):
+    return parse_cpulist(_read(os.path.join(sys_root, 'devices', 'system', 'node',
+                                            'node{}'.format(node), 'cpulist')))
+
+
+def device_irqs(dev, sys_root=SYS_ROOT, proc_root=PROC_ROOT):
+    """ IRQ numbers of dev: its MSI vectors, else /proc/interrupts lines naming it """
+    try:
+        return sorted(int(irq) for irq in os.listdir(os.path.join(sys_root, 'class', 'net', dev,
+                                                                 'device', 'msi_irqs'))
+                      if irq.isdigit())
+    except OSError:
+        pass
+    irqs = []
+    try:
+        with open(os.path.join(proc_root, 'interrupts')) as f:
+            for line in f:
+                head, _, rest = line.partition(':')
+                if head.strip().isdigit() and re.search(r'(^|\s){}([-@\s]|$)'.format(re.escape(dev)), rest):
+                    irqs.append(int(head))
+    except (IOError, OSError):
+        pass
+    return irqs
+
+
+def _queue_masks(dev, kind, sys_root):
+    """ [(path, mask text)] of rps_cpus (kind 'rx') or xps_cpus (kind 'tx') """
+    base = os.path.join(sys_root, 'class', 'net', dev, 'queues')
+    name = 'rps_cpus' if kind == 'rx' else 'xps_cpus'
+    try:
+        queues = sorted(q for q in os.listdir(base) if q.startswith(kind + '-'))
+    except OSError:
+        return []
+    found = []
+    for queue in queues:
+        path = os.path.join(base, queue, name)
+        mask = _read(path)
+        if mask is not None:
+            found.append((path, mask))
+    return found
+
+
+def _sw_processes(proc_root):
+    """ [(pid, name, cpus allowed)] for running Stone+Wire/Wiretap processes """
+    found = []
+    try:
+        pids = [pid for pid in os.listdir(proc_root) if pid.isdigit()]
+    except OSError:
+        return found
+    for pid in pids:
+        name = _read(os.path.join(proc_root, pid, 'comm'))
+        if not name or not SW_PROCESS.match(name):
+            continue
+        status = _read(os.path.join(proc_root, pid, 'status')) or ''
+        match = re.search(r'^Cpus_allowed_list:\s*(\S+)', status, re.M)
+        if match:
+            found.append((int(pid), name, parse_cpulist(match.group(1))))
+    return found
+
+
+def check(dev, sys_root=SYS_ROOT, proc_root=PROC_ROOT):
+    """ TuneReport for dev; findings are empty when everything sits on its node """
+    node = numa_node(dev, sys_root)
+    report = TuneReport(dev, node)
+    if node is None:
+        return report
+    cpus = report.node_cpus = node_cpus(node, sys_root)
+    if not cpus:
+        return report
+    report.irqs = device_irqs(dev, sys_root, proc_root)
+    for irq in report.irqs:
+        path = os.path.join(proc_root, 'irq', str(irq), 'smp_affinity')
+        mask = _read(path)
+        if mask is not None and not parse_mask(mask) <= cpus:
+            report.findings.append(Finding('IRQ {}'.format(irq), path, mask, format_mask(cpus, mask)))
+    for kind, label in (('rx', 'RPS'), ('tx', 'XPS')):
+        for path, mask in _queue_masks(dev, kind, sys_root):
+            used = parse_mask(mask)
+            # an empty mask means steering is off, which is fine
+            if used and not used <= cpus:
+                queue = os.path.basename(os.path.dirname(path))
+                report.findings.append(Finding('{} {}'.format(label, queue), path, mask,
+                                               format_mask(cpus, mask)))
+    for pid, name, allowed in _sw_processes(proc_root):
+        if not allowed & cpus:
+            report.findings.append(Finding('{} ({})'.format(name, pid), None,
+                                           format_cpulist(allowed), format_cpulist(cpus)))
+    return report
+
+
+def print_report(report):
+    if report.node is None:
+        print('{}: no NUMA node reported, nothing to align'.format(report.dev))
+        return
+    cpus = format_cpulist(report.node_cpus)
+    print('{}: NUMA node {} (CPUs {}), {} IRQs'.format(report.dev, report.node, cpus, len(report.irqs)))
+    if report.aligned:
+        print('  IRQ affinity and RPS/XPS masks are on the NIC node')
+    for f in report.findings:
+        print('  {:<24} {} -> {}{}'.format(f.what, f.current, f.expected,
+                                          '' if f.path else '  (pin the process by hand)'))
+
+
+def _save(record, record_path):
+    with open(record_path, 'w') as out:
+        json.dump(record, out, indent=2)
+
+
+def apply(report, record_path):
+    """ Saves the old masks to record_path, then writes the expected ones.
+
+    Nothing is changed when the record cannot be written.  Returns the
+    rollback record; entries that could not be written carry an error.
+    """
+    record = {'dev': report.dev, 'node': report.node, 'time': int(time.time()),
+              'changes': [{'path': f.path, 'old': f.current, 'new': f.expected}
+                          for f in report.findings if f.path is not None]}
+    _save(record, record_path)
+    for change in record['changes']:
+        try:
+            with open(change['path'], 'w') as out:
+                out.write(change['new'] + '\n')
+        except (IOError, OSError) as e:
+            change['error'] = str(e)
+    if any('error' in change for change in record['changes']):
+        _save(record, record_path)
+    return record
+
+
+def rollback(record_path):
+    """ Restores the masks saved by apply(); returns the paths restored """
+    with open(record_path) as f:
+        record = json.load(f)
+    restored = []
+    for change in record['changes']:
+        if 'error' in change:
+            continue
+        with open(change['path'], 'w') as out:
+            out.write(change['old'] + '\n')
+        restored.append(change['path'])
+    return restored
+
+
+def rollback_path(dev, stamp=None):
+    return os.path.join(ROLLBACK_DIR, 'sw_tune.{}.{}.json'.format(dev, stamp or int(time.time())))
+
+
+def add_arguments(parser):
+    parser.add_argument('dev', nargs='?', help='interface to check (the Data= NIC)')
+    parser.add_argument('--apply', action='store_true',
+                        help='write the recommended IRQ affinity and RPS/XPS masks')
+    parser.add_argument('--record', metavar='FILE', help='rollback record to write with --apply')
+    parser.add_argument('--rollback', metavar='FILE', help='restore the masks saved in FILE')
+    parser.add_argument('--sys-root', default=SYS_ROOT)
+    parser.add_argument('--proc-root', default=PROC_ROOT)
+
+
+def run(args):
+    if args.rollback:
+        try:
+            restored = rollback(args.rollback)
+        except (IOError, OSError, ValueError) as e:
+            print('Rollback failed: {}'.format(e))
+            return 2
+        print('Restored {} masks from {}'.format(len(restored), args.rollback))
+        return 0
+    if not args.dev:
+        print('Give the interface to check, or --rollback FILE')
+        return 2
+    report = check(args.dev, args.sys_root, args.proc_root)
+    print_report(report)
+    if args.apply and report.findings:
+        record_path = args.record or rollback_path(args.dev)
+        try:
+            record = apply(report, record_path)
+        except (IOError, OSError) as e:
+            print('Unable to write the rollback record, nothing changed: {}'.format(e))
+            return 2
+        failed = [c for c in record['changes'] if 'error' in c]
+        print('Applied {} masks, rollback record in {}'.format(len(record['changes']) - len(failed),
+                                                               record_path))
+        for change in failed:
+            print('  unable to write {}: {}'.format(change['path'], change['error']))
+        return 1 if failed else 0
+    return 0 if report.aligned else 1
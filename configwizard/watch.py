@@ -0,0 +1,205 @@
+# Long running watch mode: keep sw_framestore_map in step with the links.
+#
+# The wizard is a one-shot, so a NIC flap, a new DHCP lease or a bond
+# failover leaves the map pointing at stale addresses.  watch() subscribes to
+# rtnetlink link and address events instead of polling, so it sleeps in
+# recv() and costs nothing while the network is quiet.  Bursts are debounced
+# into one batch; a batch that touches none of the devices named in
+# network.cfg is only counted, otherwise the local FRAMESTORE/INTERFACES
+# entries are recomputed from a fresh inventory and written atomically if
+# they changed.  Counters of events, batches and rewrites go to a JSON stats
+# file and to stdout on SIGUSR1.
+
+import errno
+import json
+import select
+import signal
+import socket
+import time
+
+from . import backups
+from . import sw_config
+from .enumerate_interfaces import (inventory, is_infiniband, NETLINK_ROUTE, NLMSG_HDR, IFINFOMSG,
+                                  IFADDRMSG, RTM_NEWLINK, RTM_NEWADDR)
+
+RTM_DELLINK = 17
+RTM_DELADDR = 21
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_MAX_WAIT = 10.0
+ALL = None      # batch marker: events were lost, treat every device as affected
+
+
+def subscribe(groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR):
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.bind((0, groups))
+    return sock
+
+
+def parse_events(data):
+    """ Yields the ifindex of every link/address event in one netlink read """
+    offset = 0
+    while offset + NLMSG_HDR.size <= len(data):
+        length, kind = NLMSG_HDR.unpack_from(data, offset)[:2]
+        if length < NLMSG_HDR.size:
+            return
+        body = offset + NLMSG_HDR.size
+        if kind in (RTM_NEWLINK, RTM_DELLINK) and length >= NLMSG_HDR.size + IFINFOMSG.size:
+            yield IFINFOMSG.unpack_from(data, body)[2]
+        elif kind in (RTM_NEWADDR, RTM_DELADDR) and length >= NLMSG_HDR.size + IFADDRMSG.size:
+            yield IFADDRMSG.unpack_from(data, body)[4]
+        offset += (length + 3) & ~3
+
+
+class Watcher(object):
+    """ Turns batches of rtnetlink events into map rewrites """
+
+    def __init__(self, tree, hostname, keep_backups=backups.DEFAULT_KEEP, stats_path=None,
+                 backup_max_age=None):
+        self.tree = tree
+        self.hostname = hostname
+        self.keep_backups = keep_backups
+        self.backup_max_age = backup_max_age    # seconds, None keeps backups of any age
+        self.stats_path = stats_path
+        self.names = {}         # ifindex -> name, remembered so deleted links still resolve
+        self.events = 0
+        self.batches = 0
+        self.rewrites = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def stats(self):
+        return {'events': self.events, 'batches': self.batches, 'rewrites': self.rewrites,
+                'skipped': self.skipped, 'errors': self.errors}
+
+    def _configured(self):
+        cfg = sw_config.load(self.tree.network_cfg)
+        meta = [dev for dev in (cfg.get('Metadata', 'Interfaces') or '').split(',') if dev]
+        data = [dev for dev in (cfg.get('Data', 'Interfaces') or '').split(',') if dev]
+        return meta, data
+
+    def refresh(self, indexes):
+        """ Recomputes the local map entries if indexes touch a configured device.
+        Returns whether the map was rewritten. """
+        # imported late: the wizard pulls in far more than watching needs
+        from .wizard import map_gen, interface_addresses
+
+        self.batches += 1
+        ifaces = inventory()
+        self.names.update((iface.index, iface.name) for iface in ifaces.values())
+        meta, data = self._configured()
+        if not meta or not data:
+            self.skipped += 1
+            return False
+        if ALL not in indexes and not set(self.names.get(i) for i in indexes) & set(meta + data):
+            self.skipped += 1
+            return False
+
+        def ip_of(dev):
+            return ifaces[dev].ip if dev in ifaces else ''
+
+        ib_devs = [dev for dev in data if dev in ifaces and is_infiniband(dev)]
+        iaddrs = interface_addresses(data + meta[:1], ip_of, ib_devs)
+        meta_ip = ip_of(meta[0])
+        if not iaddrs or not meta_ip:
+            print('{} has no address yet, leaving the map alone'.format(meta[0] if not meta_ip else data[0]))
+            self.skipped += 1
+            return False
+        path = self.tree.framestore_map
+        uuid = sw_config.load(self.tree.network_cfg).get('UUID')
+        fsid = sw_config.load(self.tree.storage_cfg).get('ID')
+        if map_gen(path, self.hostname, meta_ip, iaddrs, uuid, fsid,
+                   lambda: backups.backup(path, keep=self.keep_backups, max_age=self.backup_max_age)):
+            self.rewrites += 1
+            print('{} rewritten: HADDR={} IADDR={}'.format(path, meta_ip, ','.join(ip for _, ip in iaddrs)))
+            return True
+        return False
+
+    def write_stats(self):
+        if self.stats_path:
+            sw_config.atomic_write(self.stats_path, json.dumps(self.stats(), sort_keys=True) + '\n')
+
+
+def next_batch(sock, debounce=DEFAULT_DEBOUNCE, max_wait=DEFAULT_MAX_WAIT):
+    """ Blocks for the next event, then gathers events until debounce seconds
+    pass quietly or max_wait seconds in total.  Returns (event count, ifindexes) """
+    indexes = set()
+    count = 0
+    deadline = None
+    while True:
+        if deadline is not None:
+            remaining = min(debounce, deadline - time.time())
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                return count, indexes
+        try:
+            data = sock.recv(65536)
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                raise
+            # the kernel dropped events while we were busy
+            indexes.add(ALL)
+            count += 1
+        else:
+            found = list(parse_events(data))
+            count += len(found)
+            indexes.update(found)
+        if deadline is None:
+            deadline = time.time() + max_wait
+
+
+def _refresh(watcher, indexes):
+    """ watcher.refresh() that logs a failed batch instead of ending the watch;
+    the next batch reads the configs and the inventory again """
+    try:
+        watcher.refresh(indexes)
+    except (IOError, OSError, ValueError) as e:
+        watcher.errors += 1
+        print('Unable to refresh the map, trying again on the next change: {}'.format(e))
+    try:
+        watcher.write_stats()
+    except (IOError, OSError) as e:
+        print('Unable to write the counters: {}'.format(e))
+
+
+def watch(watcher, debounce=DEFAULT_DEBOUNCE, max_wait=DEFAULT_MAX_WAIT, sock=None):
+    sock = sock or subscribe()
+    signal.signal(signal.SIGUSR1, lambda *_: print(json.dumps(watcher.stats(), sort_keys=True)))
+    # catch up with whatever changed before the subscription
+    _refresh(watcher, set([ALL]))
+    try:
+        while True:
+            count, indexes = next_batch(sock, debounce, max_wait)
+            watcher.events += count
+            _refresh(watcher, indexes)
+    finally:
+        sock.close()
+
+
+def add_arguments(parser):
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help='quiet seconds that end a burst of events (default {:g})'.format(DEFAULT_DEBOUNCE))
+    parser.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT,
+                        help='longest a burst is held back (default {:g})'.format(DEFAULT_MAX_WAIT))
+    parser.add_argument('--stats', metavar='FILE', help='keep the event/rewrite counters in this JSON file')
+
+
+def run(args):
+    from .wizard import get_tree, get_fs, get_uuid, get_fsid, get_host, _max_age
+
+    tree = get_tree(args.root)
+    # every file refresh() reads must be there before the first event
+    get_fs(tree)
+    get_uuid(tree)
+    get_fsid(tree)
+    watcher = Watcher(tree, get_host(), args.keep_backups, args.stats, _max_age(args))
+    print('Watching link and address changes; SIGUSR1 prints the counters')
+    try:
+        watch(watcher, args.debounce, args.max_wait)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(watcher.stats(), sort_keys=True))
+    return 0
@@ -0,0 +1,968 @@
+
+# The interactive and --auto wizard: pick the metadata and data interfaces
+# and write sw_framestore_map and network.cfg.
+#
+# The probing, benchmark and tuning modules are imported by the functions
+# that use them, so running the wizard (or another command that borrows a
+# helper from here) loads only what the run actually does.
+
+import argparse
+import difflib
+import os
+import sys
+import socket
+import threading
+from time import gmtime, strftime
+from .install_tree import install_tree, AmbiguousInstallTree, ROOT_ENV
+from . import sw_config
+from . import backups
+from .enumerate_interfaces import (inventory, link_info, LinkInfo, is_infiniband, InterfaceIndex, ARPHRD_INFINIBAND,
+                                  IFF_UP, IFF_RUNNING, IFF_MULTICAST, IFF_LOOPBACK)
+from . import probe_cache
+from . import run_trace
+
+class bcolors:
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKGREEN = '\033[92m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+
+# exit status: failures are the small codes below, a successful run sets
+# the bits of the services that must be restarted to pick up the changes;
+# the two never share a bit, so status & RESTART_SW is only set on success
+EXIT_NO_INTERFACE = 1   # no active interface to pick from
+EXIT_CONFIG = 2         # install tree, config file or hostname missing
+EXIT_UNREACHABLE = 3    # no active interface answers pings
+EXIT_FRAGMENTS = 4      # --mtu-block and the data path would fragment
+RESTART_SW = 0x10       # sw_framestore_map changed
+RESTART_WIRETAP = 0x20  # network.cfg changed
+
+backup_time = strftime(backups.BACKUP_TIME_FORMAT, gmtime())
+
+
+sw_template = """
+# Stone+Wire network configuration file
+#
+# This file describes the framestores on a network, and how the local machine
+# communicates to other framestores on the network.
+#
+# Notes: If you are running sw_probed in Self-Discovery mode, there might not
+#        be a need to configure this file.  Check sw_framestore_dump output
+#        to verify if the default configuration fits your needs.
+#
+#        This configuration only applies to Stone+Wire processes.
+#        Wiretap processes use /opt/Autodesk/sw/cfg/network.cfg.
+#        In common scenarios, the information in both files should be
+#        consistent.
+
+Version=2.0
+
+[FRAMESTORES]
+# This section defines the remote framestores that are connected to your
+# network that you wish to have access to.  For each framestore, you must have
+# the following information:
+#
+# FRAMESTORE This specifies the name of the framestore.  Although the convention
+#            is to use the current host name, you can give framestores any
+#            arbitrary name that suits your workflow. 
+#
+# HADDR      This specifies the TCP/IP v4 Address of the machine that currently
+#            has access to this framestore.  This TCP/IP address should be
+#            available to all machines that you have on your network for
+#            services such as NFS.
+#
+# HOSTUUID   This is an optional token which uniquely identifies a host.
+#            The UUID must match the one in /opt/Autodesk/cfg/network.cfg.
+#            This token is required to correctly resolve locks.
+#
+# FS         This is an optional token which denotes whether or not this
+#            framestore has a local storage attached.  This is usually used to
+#            remove a Burn node from the framestore list.  Valid values for
+#            this token are Yes or No; Yes is the default.
+#
+# ID         This token is provided for legacy purposes.  The value in the 
+#            /opt/Autodesk/sw/cfg/sw_storage.cfg supersedes this one.
+#
+# Example:
+#
+# FRAMESTORE=flame   HADDR=192.0.2.30  HOSTUUID=ABCDABCD-1234-3456-5678-ABCDEFABCDEF          ID=30 
+# FRAMESTORE=smoke   HADDR=192.0.2.26  HOSTUUID=ABCDABCD-5678-7890-9012-ABCDEFABCDEF  FS=NO   ID=26
+# FRAMESTORE=smkmac  HADDR=192.0.2.38  HOSTUUID=ABCDABCD-0912-1234-3456-ABCDEFABCDEF  FS=YES  ID=38
+
+FRAMESTORE={0}  HADDR={1}   HOSTUUID={2}    ID={3}
+
+[INTERFACES]
+# This section defines how the local machine communicates to the other
+# framestores.  It should define the best possible or only communication method
+# between the local framestore and another framestore.  The local framestore
+# should define all possible interfaces, whereas the all foreign framestores
+# must only define the best or only method.
+#
+# This section is optional, when not specified the IP addresses specified
+# in the [FRAMESTORE] section will be used.
+#
+# FRAMESTORE This is the framestore name used in the FRAMESTORES section above.
+#
+# PROT       This specifies the protocol to use to communicate with the
+#            specified framestore.  You currently have two choices: TCP for
+#            framestores connected to TCP/IP hosts and IB_SDP for framestores
+#            connected to InfiniBand hosts.
+#
+# IADDR      The interface IP address matching the specified protocol
+#
+# DEV        DEV is a historical value.  It is currently always set to 1 and
+#            is ignored.
+#
+# Example:
+#
+# FRAMESTORE=flame
+# PROT=IB_SDP  IADDR=10.10.11.20  DEV=1
+
+FRAMESTORE={0}
+PROT={5:<7} IADDR={4}    DEV=1
+"""
+
+net_template = """
+[Local]
+# The workstation's Universally Unique Identifier (UUID) is automatically
+# generated by the application installer.  Once assigned, the UUID should
+# never be edited as it uniquely identifies the workstation and the resources
+# it controls. Having different workstations using the same UUID will result
+# in conflicts.
+#
+UUID={0}
+
+# The DisplayName is the human-readable equivalent of the UUID and is the name
+# displayed in the UI to identify the workstation. Does not have to be unique,
+# but it helps if all effects and finishing workstations on a network use a
+# different DisplayName so the users can know which is which.
+#
+# On Linux, this will usually map by default to the current hostname.
+#
+# On Mac, this will usually map by default to the computer in the
+# system preference.
+#
+#DisplayName=
+
+[Interfaces]
+
+# Comma separated list of the local network interfaces to be used for
+# metadata operations. Metadata operations are usually small IO operations that
+# may degrade performance when done on a high speed network adapter when a
+# lower speed adapter can be used instead.
+#
+# The order of the interfaces in the list is the order in which they
+# will be tried.
+#
+# If left empty, all active interfaces will be used.
+#
+# Example: Metadata=eth2,eth1   (on Linux)
+#          Metadata=en1,en0     (on Mac)
+#
+Metadata={1}
+
+# Comma separated list of the local network interfaces to be used for
+# large data operations.
+#
+# The order of the interfaces in the list is the order in which they
+# will be tried.
+#
+# If left empty, all active interfaces will be used.
+#
+# Example: Data=ib1,eth2    (on Linux)
+#          Data=en1,en2     (on Mac)
+#
+Data={2}
+
+# Comma separated list of the local network interfaces to be used to limit
+# multicast/discovery operations.
+# 
+# If left empty, all active interfaces that support multicast will be used.
+# 
+# In a facility where all machines are connected to the same networks
+# (a house network and a high speed network for example), multicasting could
+# only be done on one network to reduce traffic.
+#
+# Example: Multicast=eth2,eth1   (on Linux)
+#          Multicast=en1,en0     (on Mac)
+#
+Multicast={3}
+
+
+[SelfDiscovery]
+#Port=7555
+#Scope=224.0.0.1
+#TTL=1
+"""
+
+def get_tree(root=None):
+    try:
+        return install_tree(root)
+    except AmbiguousInstallTree as e:
+        print(bcolors.FAIL + 'Found more than one Autodesk install tree:')
+        for candidate in e.candidates:
+            print('    ' + candidate)
+        print('Pick the one to configure with --root or ${}'.format(ROOT_ENV))
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+
+
+def get_fs(tree=None):
+    sw_path = (tree or get_tree()).framestore_map
+    if sw_path is None:
+        print(bcolors.FAIL + 'Unable to locate sw_framestore_map')
+        print('Exiting')
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    else:
+        return sw_path
+
+def get_netcfg(tree=None):
+    net_path = (tree or get_tree()).network_cfg
+    if net_path is None:
+        print(bcolors.FAIL + 'Unable to locate network.cfg file')
+        print('Exiting')
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    else:
+        return net_path
+
+
+def get_uuid(tree=None):
+    cfg_path = (tree or get_tree()).network_cfg
+    if cfg_path is None:
+        print(bcolors.FAIL + 'Unable to locate network.cfg file')
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    uuid = sw_config.load(cfg_path).get('UUID')
+    if uuid is None:
+        print(bcolors.FAIL + 'No UUID= entry in {}'.format(cfg_path))
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    return uuid
+
+
+def get_fsid(tree=None):
+    cfg_path = (tree or get_tree()).storage_cfg
+    if cfg_path is None:
+        print(bcolors.FAIL + 'Unable to locate sw_storage.cfg file')
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    fsid = sw_config.load(cfg_path).get('ID')
+    if fsid is None:
+        print(bcolors.FAIL + 'No ID= entry in {}'.format(cfg_path))
+        print(bcolors.ENDC)
+        exit(EXIT_CONFIG)
+    return fsid
+
+
+def backup(path, keep=backups.DEFAULT_KEEP, max_age=None):
+    with run_trace.phase('backup', file=path) as span:
+        dstcopy = backups.backup(path, backup_time, keep, max_age)
+        span.set(copied=dstcopy is not None)
+    if dstcopy is None:
+        print(bcolors.OKBLUE + '{} is unchanged since its last backup'.format(path))
+    else:
+        print(bcolors.OKBLUE + 'Backing up {} to {}'.format(path, dstcopy))
+    print(bcolors.ENDC)
+
+
+def active_int_list(ifaces=None):
+    """ Retruns a list of active interfaces """
+    if ifaces is None:
+        ifaces = inventory()
+    interfaces = select_active(ifaces)
+    if len(interfaces) < 1:
+        print(bcolors.WARNING + 'No active interfaces found')
+        print('try running script manually:\n./{} --manual'.format(sys.argv[0]))
+        exit(EXIT_NO_INTERFACE)
+    return interfaces
+
+
+def select_active(ifaces):
+    """ Names of the interfaces the wizard offers, in ifindex order; also run
+    by fleet on the interfaces another host reports """
+    index = InterfaceIndex(ifaces)
+    active = dict(flags=IFF_UP | IFF_RUNNING | IFF_MULTICAST, exclude_flags=IFF_LOOPBACK)
+    # Ethernet by name, plus IPoIB devices (ib0...) for IB_SDP data paths;
+    # container veth/tap devices are never looked at
+    found = list(index.select(prefix=('e', 'E'), **active))
+    found += [iface for iface in index.select(link_type=ARPHRD_INFINIBAND, **active) if iface not in found]
+    return [iface.name for iface in sorted(found, key=lambda iface: iface.index)
+            if not iface.name.lower().startswith('lo')]
+
+
+def _iaddrs(highspeed):
+    if not isinstance(highspeed, list):
+        highspeed = [highspeed]
+    return [ip if isinstance(ip, tuple) else ('TCP', ip) for ip in highspeed]
+
+
+def render_map(current, host, house, highspeed, uuid, fsid):
+    """ sw_framestore_map text; current is the existing text or None
+
+    highspeed is an interface IP or a list of them in the order to try;
+    (prot, ip) pairs give a protocol other than TCP, e.g. IB_SDP.
+    An existing map keeps its remote framestores; only this host's
+    FRAMESTORE line and INTERFACES block are replaced.
+    """
+    iaddrs = _iaddrs(highspeed)
+    if current:
+        return sw_config.upsert_text(current, host, house, uuid, fsid, iaddrs)
+    framestore_contents = sw_template.format(host, house, uuid, fsid, iaddrs[0][1], iaddrs[0][0])
+    return framestore_contents + ''.join(sw_config.interface_lines(host, iaddrs)[2:])
+
+
+def map_gen(fs_file, host, house, highspeed, uuid, fsid, on_change=None):
+    """ Writes fs_file only if its content changes; returns whether it did """
+    if os.path.exists(fs_file) and os.path.getsize(fs_file) > 0:
+        # streamed, so large shared maps are never held in memory; rendering
+        # and writing are one pass and traced as the write
+        with run_trace.phase('write', file=fs_file, streamed=True) as span:
+            changed = sw_config.upsert_framestore(fs_file, host, house, uuid, fsid,
+                                                  _iaddrs(highspeed), on_change)
+            span.set(changed=changed)
+        return changed
+    with run_trace.phase('rendering', file=fs_file):
+        text = render_map(None, host, house, highspeed, uuid, fsid)
+    with run_trace.phase('write', file=fs_file) as span:
+        changed = sw_config.write_if_changed(fs_file, text, on_change)
+        span.set(changed=changed)
+    return changed
+
+def render_netcfg(current, uuid, meta, data):
+    """ network.cfg text for the given devices; current is the existing text or None
+
+    meta and data are a device name or a list of them in the order to try.
+    """
+    if not isinstance(meta, list):
+        meta = [meta]
+    if not isinstance(data, list):
+        data = [data]
+    # metadata devices stay on the Data= list as the last resort
+    data = data + [dev for dev in meta if dev not in data]
+    if current is not None:
+        # only the fields the wizard owns change, DisplayName etc. are kept
+        cfg = sw_config.parse(current)
+        if cfg.section('Interfaces') is not None:
+            cfg.set('Local', 'UUID', uuid)
+            cfg.set('Interfaces', 'Metadata', ','.join(meta))
+            cfg.set('Interfaces', 'Data', ','.join(data))
+            cfg.set('Interfaces', 'Multicast', meta[0])
+            return cfg.render()
+    return net_template.format(uuid, ','.join(meta), ','.join(data), meta[0])
+
+
+def net_gen(path, uuid, meta, data, on_change=None):
+    """ Writes path only if its content changes; returns whether it did """
+    with run_trace.phase('rendering', file=path):
+        text = render_netcfg(sw_config.read(path), uuid, meta, data)
+    with run_trace.phase('write', file=path) as span:
+        changed = sw_config.write_if_changed(path, text, on_change)
+        span.set(changed=changed)
+    return changed
+
+
+def plan_change(path, new_text):
+    """ Prints what writing new_text to path would change; True if anything """
+    current = sw_config.read(path) or ''
+    if current == new_text:
+        print(bcolors.OKGREEN + '{} is already up to date'.format(path) + bcolors.ENDC)
+        return False
+    diff = difflib.unified_diff(current.splitlines(True), new_text.splitlines(True),
+                                path, path + ' (planned)')
+    sys.stdout.writelines(line if line.endswith('\n') else line + '\n' for line in diff)
+    return True
+
+
+def restart_notice(status):
+    """ Tells the user which services need restarting and returns status,
+    which holds RESTART_SW and/or RESTART_WIRETAP; an exit status without
+    them (0, or an EXIT_* code below 0x10) means restart nothing """
+    services = []
+    if status & RESTART_SW:
+        services.append('Stone+Wire')
+    if status & RESTART_WIRETAP:
+        services.append('Wiretap')
+    if services:
+        print('Restart {} in order to apply changes'.format(' and '.join(services)))
+    else:
+        print('No configuration changes, no restart needed')
+    return status
+
+def _select(menu, prompt):
+    """ Asks for a row number until a valid one is given; returns its device """
+    while True:
+        selection = menu.ask(prompt).strip()
+        if selection.isdigit() and 1 <= int(selection) <= len(menu.interfaces):
+            return menu.interfaces[int(selection) - 1]
+        print('Selection was invalid, try again or exit with Ctrl+c')
+        menu.render()
+
+
+def _picked(menu, dev):
+    """ Waits for dev's row only and warns when it did not answer """
+    result = menu.result(dev)
+    if result is not None and not result.reachable:
+        print(bcolors.WARNING + '{} did not answer a ping ({})'.format(dev, result.error) + bcolors.ENDC)
+    return result
+
+
+def user_input(menu):
+    """ Asks for the metadata and data rows while the probe is still running;
+    exits when neither pick answers and the finished probe finds nothing
+    reachable """
+    meta = _select(menu, 'Select the row number for metadata interface: ')
+    picked = [_picked(menu, meta)]
+    menu.render()
+    data = _select(menu, 'Select the row number for data interface: ')
+    picked.append(_picked(menu, data))
+    if not any(r is not None and r.reachable for r in picked) and \
+            not any(r.reachable for r in menu.wait().values()):
+        print(bcolors.WARNING + 'Unable to ping any active dev - check your IP configs')
+        print('Try running the script using the --manual flag, e.g.  {} --manual'.format(sys.argv[0]))
+        print(bcolors.ENDC)
+        exit(EXIT_UNREACHABLE)
+    return meta, data
+
+
+class ProbeMenu(object):
+    """ Interface menu fed by one background probe
+
+    The rows print at once with names and addresses; link speed and ping
+    results are printed from a single probe thread as they arrive.  render()
+    only shows what is already known, so redrawing the menu never probes.
+    """
+
+    def __init__(self, interfaces, ifaces, timeout=1.0, cache=None, out=None, stream=True):
+        self.interfaces = list(interfaces)
+        self.ifaces = ifaces
+        self.out = out or sys.stdout
+        self.stream = stream
+        self.links = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.arrived = threading.Condition(self.lock)
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._probe, args=(timeout, cache))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _probe(self, timeout, cache):
+        try:
+            with run_trace.phase('probing', step='link', count=len(self.interfaces)):
+                for dev in self.interfaces:
+                    with self.lock:
+                        self.links[dev] = cached_link_info(dev, self.ifaces, cache)
+            cached_probe(self.interfaces, self.ifaces, timeout, cache, self._arrived)
+        finally:
+            with self.lock:
+                self.done.set()
+                self.arrived.notify_all()
+
+    def _arrived(self, result):
+        with self.lock:
+            self.results[result.dev] = result
+            self.arrived.notify_all()
+            if not self.stream:
+                return
+            self.out.write(self._row(self.interfaces.index(result.dev) + 1, result.dev) + '\n')
+            self.out.flush()
+
+    def _row(self, num, dev):
+        link = self.links.get(dev)
+        speed = _link_label(link) if link is not None else ''
+        result = self.results.get(dev)
+        ip = devname_to_ip(dev, self.ifaces)
+        if result is None:
+            return '{}: {} {} {} probing...'.format(num, dev, ip, speed)
+        if result.reachable:
+            return '{}: {} {} {} {:.2f} ms'.format(num, dev, ip, speed, result.latency)
+        return bcolors.WARNING + '{}: {} {} {} unreachable ({})'.format(
+            num, dev, ip, speed, result.error) + bcolors.ENDC
+
+    def render(self):
+        with self.lock:
+            for num, dev in enumerate(self.interfaces, 1):
+                self.out.write(self._row(num, dev) + '\n')
+            self.out.flush()
+
+    def ask(self, prompt):
+        return input(prompt)
+
+    def result(self, dev, timeout=None):
+        """ Blocks until dev's row is probed; its ProbeResult, or None when
+        the probe ended (or timeout passed) without one """
+        with self.lock:
+            self.arrived.wait_for(lambda: dev in self.results or self.done.is_set(), timeout)
+            return self.results.get(dev)
+
+    def wait(self, timeout=None):
+        """ Blocks until the probe is over; returns {dev: ProbeResult} """
+        self.done.wait(timeout)
+        return dict(self.results)
+
+
+def devname_to_ip(dev_name, ifaces=None):
+    if ifaces is None:
+        ifaces = inventory()
+    iface = ifaces.get(dev_name)
+    return iface.ip if iface is not None else ''
+
+def probe_all(targets, timeout=1.0, on_result=None):
+    """ probe_interfaces.probe_all(), importing asyncio only once something is pinged """
+    from . import probe_interfaces
+    return probe_interfaces.probe_all(targets, timeout, on_result=on_result)
+
+
+def cached_probe(interfaces, ifaces, timeout=1.0, cache=None, on_result=None):
+    """ {dev: ProbeResult}, pinging only the interfaces without a fresh cache entry.
+    on_result is called with each result as soon as it is known. """
+    results = {}
+    stale = []
+    for dev in interfaces:
+        cached = cache.get(ifaces[dev], 'reachable', 'latency', 'error') \
+            if cache is not None and dev in ifaces else None
+        if cached is not None:
+            from .probe_interfaces import ProbeResult
+            results[dev] = ProbeResult(dev, devname_to_ip(dev, ifaces), **cached)
+            if on_result is not None:
+                on_result(results[dev])
+        else:
+            stale.append(dev)
+    if stale:
+        with run_trace.phase('probing', step='ping', count=len(stale), cached=len(results)) as span:
+            probed = probe_all([(dev, devname_to_ip(dev, ifaces)) for dev in stale], timeout,
+                               on_result=on_result)
+            span.set(reachable=sum(1 for r in probed.values() if r.reachable))
+        for dev, result in probed.items():
+            # failures are probed again next time, the link may be back
+            if cache is not None and dev in ifaces and result.reachable:
+                cache.put(ifaces[dev], reachable=True, latency=result.latency, error=None)
+        results.update(probed)
+    return results
+
+
+def display_options(interfaces, ifaces=None, timeout=1.0, cache=None):
+    """ Shows the interface menu and returns its ProbeMenu at once; the probe
+    keeps filling the rows in behind the prompt """
+    if ifaces is None:
+        ifaces = inventory()
+    menu = ProbeMenu(interfaces, ifaces, timeout, cache)
+    menu.render()
+    return menu
+
+def rank_interfaces(interfaces, ifaces=None, cache=None):
+    """ Returns (metadata, data) device lists ordered by negotiated link
+
+    Data goes fastest first and metadata slowest first, so large frame I/O
+    lands on the 10/40/100G adapter and small IO stays on the house network.
+    Interfaces without carrier are dropped; half duplex ranks below full.
+    """
+    with run_trace.phase('probing', step='link', count=len(interfaces)):
+        return rank_links([cached_link_info(dev, ifaces, cache) for dev in interfaces])
+
+
+LINK_FIELDS = ('speed', 'duplex', 'mtu', 'carrier', 'ib', 'hca')
+
+
+def cached_link_info(dev, ifaces=None, cache=None):
+    iface = ifaces.get(dev) if ifaces else None
+    if cache is None or iface is None:
+        return link_info(dev)
+    cached = cache.get(iface, *LINK_FIELDS)
+    if cached is not None:
+        return LinkInfo(dev, **cached)
+    link = link_info(dev)
+    cache.put(iface, **dict((field, getattr(link, field)) for field in LINK_FIELDS))
+    return link
+
+
+def rank_links(links):
+    """ rank_interfaces() for LinkInfo records gathered elsewhere """
+    links = [link for link in links if link.carrier] or links
+    # InfiniBand leads the data list and trails the metadata one
+    data = sorted(links, key=lambda l: (l.ib, l.duplex == 'full', l.speed, l.mtu), reverse=True)
+    # unknown speeds (virtual devices, some drivers) go last for metadata too
+    meta = sorted(links, key=lambda l: (l.ib, l.speed == 0, l.speed, l.duplex != 'full'))
+    return [l.name for l in meta], [l.name for l in data]
+
+
+def display_ranking(meta, data):
+    for label, devs in (('Metadata', meta), ('Data', data)):
+        print(label + ':', ', '.join('{} ({})'.format(dev, _speed_label(dev)) for dev in devs))
+
+
+def _speed_label(dev):
+    return _link_label(link_info(dev))
+
+
+def _link_label(link):
+    if not link.speed:
+        return 'unknown speed'
+    label = '{:g}G {}'.format(link.speed / 1000.0, link.duplex) if link.speed >= 1000 \
+        else '{}M {}'.format(link.speed, link.duplex)
+    return label + ' InfiniBand' if link.ib else label
+
+
+def get_host():
+    # Obtaining Info for sw_framestore_map
+    hostname = socket.gethostname()
+    if hostname == None:
+        print('Unable to obtain hostname')
+        exit(EXIT_CONFIG)
+    return hostname
+
+    
+def interface_addresses(devs, ip_of, ib_devs=()):
+    """ [(prot, IADDR)] for devs in order, skipping devices without an IP and repeats
+
+    Devices in ib_devs are emitted as IB_SDP ahead of every TCP address.
+    """
+    iaddrs = []
+    seen = set()
+    for dev in sorted(devs, key=lambda dev: dev not in ib_devs):
+        ip = ip_of(dev)
+        if ip and ip not in seen:
+            seen.add(ip)
+            iaddrs.append(('IB_SDP' if dev in ib_devs else 'TCP', ip))
+    return iaddrs
+
+
+def bench_order(order, ifaces, bench_peer, cache=None):
+    """ The Data= candidates in order re-ranked by measured throughput to bench_peer
+
+    bench_peer is 'host[:port]' of a benchmark receiver on a remote host.
+    order is the link-speed ranking; it breaks ties and holds for devices
+    the benchmark could not measure.  Scores cached for the same peer are
+    reused.
+    """
+    from . import benchmark
+
+    cached = []
+    targets = []
+    for dev in order:
+        found = cache.get(ifaces[dev], 'bench') if cache is not None and dev in ifaces else None
+        if found is not None and found['bench'].get('peer') == bench_peer:
+            score = found['bench']
+            cached.append(benchmark.BenchResult(dev, devname_to_ip(dev, ifaces), score['mbps'],
+                                                score['latency'], score['error']))
+        else:
+            targets.append((dev, devname_to_ip(dev, ifaces)))
+    results = []
+    if targets:
+        peer, port = benchmark.parse_peer(bench_peer)
+        print(bcolors.OKBLUE + 'Benchmarking interfaces, this takes a few seconds per interface')
+        print(bcolors.ENDC)
+        results = benchmark.benchmark_interfaces(targets, peer, port)
+        if cache is not None:
+            for r in results:
+                if r.dev in ifaces:
+                    cache.put(ifaces[r.dev], bench={'peer': bench_peer, 'mbps': r.mbps,
+                                                    'latency': r.latency, 'error': r.error})
+    results += cached
+    benchmark.print_results(results)
+    if not any(r.error is None for r in results):
+        print(bcolors.WARNING + 'No interface reached {}, keeping the link-speed order'.format(bench_peer))
+        print(bcolors.ENDC)
+        return list(order)
+    return benchmark.rank_by_throughput(results, order)
+
+
+def rtt_order(sw_path, uuid, ifaces, meta_list, data_list, json_path=None):
+    """ (meta_list, data_list) with the interfaces that reach the fewest of the
+    framestores already in sw_path moved back; the order is otherwise kept """
+    from . import latency_matrix
+
+    peers = latency_matrix.map_peers(sw_path, uuid)
+    if not peers:
+        print(bcolors.WARNING + 'No other framestores in {}, keeping the interface order'.format(sw_path))
+        print(bcolors.ENDC)
+        return meta_list, data_list
+    devs = list(dict.fromkeys(meta_list + data_list))
+    matrix = latency_matrix.measure_matrix(dict((dev, devname_to_ip(dev, ifaces)) for dev in devs), peers)
+    latency_matrix.print_matrix(matrix)
+    if json_path:
+        latency_matrix.append_json(json_path, matrix)
+    return latency_matrix.order_by_rtt(meta_list, matrix), latency_matrix.order_by_rtt(data_list, matrix)
+
+
+def tune_check(dev, apply_masks=False, sys_root=None, proc_root=None):
+    """ Reports NUMA/IRQ misalignment of the data interface, fixing it on request;
+    sys_root and proc_root default to the real /sys and /proc """
+    from . import tuning
+
+    report = tuning.check(dev, sys_root or tuning.SYS_ROOT, proc_root or tuning.PROC_ROOT)
+    print(bcolors.OKBLUE + 'Checking NUMA and IRQ affinity of {}'.format(dev) + bcolors.ENDC)
+    tuning.print_report(report)
+    if apply_masks and report.findings:
+        record_path = tuning.rollback_path(dev, backup_time)
+        try:
+            record = tuning.apply(report, record_path)
+        except (IOError, OSError) as e:
+            print(bcolors.WARNING + 'Unable to write the rollback record, masks left as they are: '
+                  '{}'.format(e) + bcolors.ENDC)
+            print('')
+            return report
+        for change in record['changes']:
+            if 'error' in change:
+                print(bcolors.WARNING + 'Unable to write {}: {}'.format(change['path'], change['error'])
+                      + bcolors.ENDC)
+        print('Rollback with: {} tune-check --rollback {}'.format(sys.argv[0], record_path))
+    print('')
+    return report
+
+
+def readiness_check(dev, sysctl_dropin=None, proc_root=None):
+    """ Scores the kernel buffers and NIC settings of the data interface """
+    from . import net_readiness
+
+    report = net_readiness.check(dev, link_info(dev).speed, proc_root or net_readiness.PROC_ROOT)
+    print(bcolors.OKBLUE + 'Checking kernel and NIC readiness of {}'.format(dev) + bcolors.ENDC)
+    net_readiness.print_readiness(report)
+    text = net_readiness.dropin(report)
+    if text and sysctl_dropin:
+        if sw_config.write_if_changed(sysctl_dropin, text):
+            print('Wrote {}; load it with sysctl --system'.format(sysctl_dropin))
+    elif text:
+        print('Use --sysctl-dropin to make the recommended sysctls persistent')
+    print('')
+    return report
+
+
+def mtu_check(data_list, ifaces, peers, block=False):
+    """ Path-MTU discovery from every Data= device to peers; warns, or exits
+    with block, when the first Data= device would fragment """
+    from . import path_mtu
+
+    targets = [(dev, devname_to_ip(dev, ifaces), ifaces[dev].mtu, peer)
+               for dev in data_list if devname_to_ip(dev, ifaces) for peer in peers]
+    print(bcolors.OKBLUE + 'Checking the path MTU of the data interfaces' + bcolors.ENDC)
+    results = path_mtu.discover(targets)
+    path_mtu.print_results(results)
+    short = [r for r in results if r.fragments and r.dev == data_list[0]]
+    if short:
+        print(bcolors.WARNING + '{} is at MTU {} but the path to {} only carries {}'.format(
+            data_list[0], short[0].local_mtu, ', '.join(r.target for r in short),
+            min(r.path_mtu for r in short)))
+        if any(r.blackhole for r in short):
+            print('Larger frames are dropped without an ICMP, so the path cannot tell the sender')
+        print('Frames will fragment; fix the switch ports or lower the interface MTU')
+        print(bcolors.ENDC)
+        if block:
+            exit(EXIT_FRAGMENTS)
+    print('')
+    return results
+
+
+def main(auto=False, bench_peer=None, root=None, keep_backups=backups.DEFAULT_KEEP,
+         backup_max_age=None, plan=False, by_rtt=False, rtt_json=None, tune_apply=False,
+         sysctl_dropin=None, mtu_peers=None, mtu_block=False, cache=None):
+    with run_trace.phase('discovery') as span:
+        hostname = get_host()
+        tree = get_tree(root)
+        sw_path = get_fs(tree)
+        uuid = get_uuid(tree).strip()
+        fsid = get_fsid(tree)
+        netcfg_path = get_netcfg(tree)
+        span.set(root=tree.root)
+    with run_trace.phase('enumeration') as span:
+        ifaces = inventory()
+        interfaces = active_int_list(ifaces)
+        span.set(count=len(ifaces), active=len(interfaces))
+    if auto:
+        meta_list, data_list = rank_interfaces(interfaces, ifaces, cache)
+        display_ranking(meta_list, data_list)
+        meta, data = meta_list[0], data_list[0]
+        if by_rtt:
+            with run_trace.phase('probing', step='rtt'):
+                meta_list, data_list = rtt_order(sw_path, uuid, ifaces, meta_list, data_list, rtt_json)
+            meta, data = meta_list[0], data_list[0]
+    else:
+        if by_rtt:
+            # the picks are single interfaces, so order the menu instead
+            with run_trace.phase('probing', step='rtt'):
+                interfaces = rtt_order(sw_path, uuid, ifaces, [], interfaces, rtt_json)[1]
+        meta, data = user_input(display_options(interfaces, ifaces, cache=cache))
+        meta_list, data_list = [meta], [data]
+    if bench_peer:
+        if auto:
+            order = data_list
+        else:
+            order = [data] + [dev for dev in rank_interfaces(interfaces, ifaces, cache)[1] if dev != data]
+        with run_trace.phase('probing', step='bench', count=len(order)):
+            ranked = bench_order(order, ifaces, bench_peer, cache)
+        if auto:
+            data_list = ranked
+        else:
+            # the interface picked by hand stays first
+            data_list = [data] + [dev for dev in ranked if dev != data]
+        data = data_list[0]
+    with run_trace.phase('probing', step='tune', dev=data):
+        tune_check(data, tune_apply and not plan)
+    with run_trace.phase('probing', step='readiness', dev=data):
+        readiness_check(data, None if plan else sysctl_dropin)
+    if mtu_peers is not None:
+        from .latency_matrix import map_peers
+        peers = mtu_peers or [addr for addrs in map_peers(sw_path, uuid).values() for addr in addrs]
+        if peers:
+            with run_trace.phase('probing', step='mtu', count=len(peers)):
+                mtu_check(data_list, ifaces, peers, mtu_block)
+        else:
+            print(bcolors.WARNING + 'No peers to check the path MTU against, pass --mtu-check HOST,...'
+                  + bcolors.ENDC)
+    meta_ip = devname_to_ip(meta, ifaces)
+    ib_devs = [dev for dev in data_list if is_infiniband(dev)]
+    iaddrs = interface_addresses(data_list + [meta], lambda dev: devname_to_ip(dev, ifaces), ib_devs)
+
+    # Data Injected into sw_framestore_map 
+    status = 0
+
+    if plan:
+        with run_trace.phase('rendering', count=2):
+            map_text = render_map(sw_config.read(sw_path), hostname, meta_ip, iaddrs, uuid, fsid)
+            net_text = render_netcfg(sw_config.read(netcfg_path), uuid, meta_list, data_list)
+        if plan_change(sw_path, map_text):
+            status |= RESTART_SW
+        if plan_change(netcfg_path, net_text):
+            status |= RESTART_WIRETAP
+        return restart_notice(status)
+
+    # Creating new framestore_map, backups only for files that change
+    if map_gen(sw_path, hostname, meta_ip, iaddrs, uuid, fsid,
+               lambda: backup(sw_path, keep_backups, backup_max_age)):
+        status |= RESTART_SW
+    if net_gen(netcfg_path, uuid, meta_list, data_list,
+               lambda: backup(netcfg_path, keep_backups, backup_max_age)):
+        status |= RESTART_WIRETAP
+    return restart_notice(status)
+
+def manual_setup(root=None, keep_backups=backups.DEFAULT_KEEP, backup_max_age=None, plan=False,
+                 sysctl_dropin=None):
+    with run_trace.phase('discovery') as span:
+        hostname = get_host()
+        tree = get_tree(root)
+        sw_path = get_fs(tree)
+        uuid = get_uuid(tree).strip()
+        fsid = get_fsid(tree)
+        span.set(root=tree.root)
+
+    meta_ip = input('Type in your ip address of your house-network <usually your 1gig connection>: ')
+    print('')
+    print(bcolors.OKGREEN + "If you don't have a high-speed network - enter your house-network ip address again below")
+    print(bcolors.ENDC)
+    data_ip = input('Type in your ip address of your high-speed network <usually your 10/40/100 gig connection>: ')
+    iaddrs = [data_ip] if meta_ip == data_ip else [data_ip, meta_ip]
+    data_dev = [iface.name for iface in inventory().values() if data_ip in iface.ipv4]
+    if data_dev:
+        readiness_check(data_dev[0], None if plan else sysctl_dropin)
+    if plan:
+        changed = plan_change(sw_path, render_map(sw_config.read(sw_path), hostname, meta_ip, iaddrs, uuid, fsid))
+    else:
+        changed = map_gen(sw_path, hostname, meta_ip, iaddrs, uuid, fsid,
+                          lambda: backup(sw_path, keep_backups, backup_max_age))
+    return restart_notice(RESTART_SW if changed else 0)
+    
+
+    
+
+def add_arguments(parser):
+    from .net_readiness import SYSCTL_DROPIN
+
+    parser.add_argument('--manual', action='store_true',
+                        help='type the IP addresses in instead of picking interfaces')
+    parser.add_argument('--auto', action='store_true',
+                        help='pick metadata/data interfaces by negotiated link speed')
+    parser.add_argument('--bench-peer', metavar='HOST[:PORT]', type=_bench_peer,
+                        help='order Data= by measured throughput to the benchmark receiver on '
+                             'this remote host; link speed breaks near-ties')
+    parser.add_argument('--rtt-order', action='store_true',
+                        help='move interfaces that cannot reach the framestores in sw_framestore_map '
+                             'to the back of the lists (of the menu when picking by hand)')
+    parser.add_argument('--rtt-json', metavar='FILE',
+                        help='with --rtt-order, append the latency matrix to this JSON-lines file')
+    parser.add_argument('--tune-apply', action='store_true',
+                        help="align the data interface's IRQ affinity and RPS/XPS masks with its NUMA node")
+    parser.add_argument('--sysctl-dropin', nargs='?', const=SYSCTL_DROPIN, metavar='FILE',
+                        help='write the sysctls the data path is missing to a sysctl.d file '
+                             '(default {})'.format(SYSCTL_DROPIN))
+    parser.add_argument('--mtu-check', nargs='?', const='', metavar='HOST,...',
+                        help='check the path MTU of the Data= interfaces to these hosts '
+                             '(default: the framestores in sw_framestore_map)')
+    parser.add_argument('--mtu-block', action='store_true',
+                        help='with --mtu-check, stop when the Data= interface would fragment')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='probe every interface again instead of reusing recent results')
+    parser.add_argument('--plan', action='store_true',
+                        help='show the changes as a diff without writing anything')
+
+
+def _bench_peer(value):
+    if value.partition(':')[0] in ('local', 'localhost') or value.startswith('127.'):
+        raise argparse.ArgumentTypeError(
+            'a local receiver only measures loopback; run the benchmark subcommand for a self-test')
+    return value
+
+
+def _max_age(args):
+    return args.backup_max_age * 86400 if args.backup_max_age is not None else None
+
+
+def run(args):
+    if args.manual:
+        return run_manual(args)
+    cache = probe_cache.ProbeCache() if args.cache else None
+    try:
+        return main(auto=args.auto, bench_peer=args.bench_peer, root=args.root,
+                    keep_backups=args.keep_backups, backup_max_age=_max_age(args), plan=args.plan,
+                    by_rtt=args.rtt_order, rtt_json=args.rtt_json, tune_apply=args.tune_apply,
+                    sysctl_dropin=args.sysctl_dropin, mtu_block=args.mtu_block,
+                    mtu_peers=None if args.mtu_check is None else
+                    [p for p in args.mtu_check.split(',') if p], cache=cache)
+    finally:
+        if cache is not None:
+            cache.save()
+
+
+def add_manual_arguments(parser):
+    from .net_readiness import SYSCTL_DROPIN
+
+    parser.add_argument('--sysctl-dropin', nargs='?', const=SYSCTL_DROPIN, metavar='FILE',
+                        help='write the sysctls the data path is missing to a sysctl.d file '
+                             '(default {})'.format(SYSCTL_DROPIN))
+    parser.add_argument('--plan', action='store_true',
+                        help='show the changes as a diff without writing anything')
+
+
+def run_manual(args):
+    return manual_setup(args.root, args.keep_backups, _max_age(args), args.plan, args.sysctl_dropin)
+
+
+def add_probe_arguments(parser):
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds per ping')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='probe every interface again instead of reusing recent results')
+    parser.add_argument('interfaces', nargs='*', help='interfaces to probe (default: the active ones)')
+
+
+def run_probe(args):
+    """ The wizard's interface table without the selection """
+    ifaces = inventory()
+    interfaces = args.interfaces or active_int_list(ifaces)
+    unknown = [dev for dev in interfaces if dev not in ifaces]
+    if unknown:
+        print(bcolors.FAIL + 'No such interface: {}'.format(', '.join(unknown)) + bcolors.ENDC)
+        return 2
+    cache = probe_cache.ProbeCache() if args.cache else None
+    try:
+        menu = ProbeMenu(interfaces, ifaces, args.timeout, cache, stream=False)
+        results = menu.wait()
+        menu.render()
+    finally:
+        if cache is not None:
+            cache.save()
+    return 0 if any(r.reachable for r in results.values()) else 1
@@ -0,0 +1,70 @@
+# backups.backup(): de-duplication, same-second names and pruning.
+
+import os
+from calendar import timegm
+from time import gmtime, strftime
+
+import pytest
+
+from configwizard import backups
+
+T0 = timegm((2024, 3, 1, 12, 0, 0, 0, 0, 0))
+
+
+def _stamp(when):
+    return strftime(backups.BACKUP_TIME_FORMAT, gmtime(when))
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    path = tmp_path / 'network.cfg'
+    path.write_text('Data=eth0\n')
+    return str(path)
+
+
+def _change(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_unchanged_file_is_not_copied_again(cfg):
+    first = backups.backup(cfg, _stamp(T0))
+    assert first == cfg + '.orig.' + _stamp(T0)
+    assert backups.backup(cfg, _stamp(T0 + 60)) is None
+    assert [name for _, name in backups.list_backups(cfg)] == [first]
+
+
+def test_same_second_copies_sort_by_sequence(cfg):
+    names = []
+    for num in range(12):
+        _change(cfg, 'Data=eth{}\n'.format(num))
+        names.append(backups.backup(cfg, _stamp(T0), keep=None))
+    assert names[1] == names[0] + '.1' and names[10] == names[0] + '.10'
+    assert [name for _, name in backups.list_backups(cfg)] == names[::-1]
+    # the newest (.11) is what an unchanged file is compared with
+    assert backups.backup(cfg, _stamp(T0), keep=None) is None
+
+
+def test_keep_prunes_the_oldest(cfg):
+    for num in range(5):
+        _change(cfg, 'Data=eth{}\n'.format(num))
+        backups.backup(cfg, _stamp(T0 + num), keep=3)
+    assert [when for when, _ in backups.list_backups(cfg)] == [T0 + 4, T0 + 3, T0 + 2]
+
+
+def test_max_age_prunes_old_copies_but_keeps_the_newest(cfg):
+    for num in range(3):
+        _change(cfg, 'Data=eth{}\n'.format(num))
+        backups.backup(cfg, _stamp(T0 + num * 86400), keep=None)
+    removed = backups.prune(cfg, keep=None, max_age=86400 + 1, now=T0 + 2 * 86400)
+    assert removed == [cfg + '.orig.' + _stamp(T0)]
+    assert backups.prune(cfg, keep=None, max_age=1, now=T0 + 10 * 86400) == \
+        [cfg + '.orig.' + _stamp(T0 + 86400)]
+    assert [when for when, _ in backups.list_backups(cfg)] == [T0 + 2 * 86400]
+
+
+def test_foreign_files_are_left_alone(cfg):
+    other = cfg + '.orig.manual'
+    open(other, 'w').close()
+    backups.backup(cfg, _stamp(T0), keep=1)
+    assert os.path.exists(other)
@@ -0,0 +1,26 @@
+# The bench suite runs the wizard against its synthetic host only.
+
+from configwizard import bench_suite, net_readiness, tuning, wizard
+
+
+def test_run_size_stays_off_the_real_host(tmp_path, monkeypatch):
+    roots = []
+    check, read_sysctl = tuning.check, net_readiness.read_sysctl
+
+    def spy_check(dev, sys_root=tuning.SYS_ROOT, proc_root=tuning.PROC_ROOT):
+        roots.extend([sys_root, proc_root])
+        return check(dev, sys_root, proc_root)
+
+    def spy_sysctl(name, proc_root=net_readiness.PROC_ROOT):
+        roots.append(proc_root)
+        return read_sysctl(name, proc_root)
+
+    monkeypatch.setattr(tuning, 'check', spy_check)
+    monkeypatch.setattr(net_readiness, 'read_sysctl', spy_sysctl)
+    saved = wizard.tune_check, wizard.is_infiniband
+    results = bench_suite.run_size(2, 1, str(tmp_path))
+    assert sorted(results) == ['active_int_list', 'get_fsid', 'get_uuid', 'load_map', 'main_auto',
+                               'map_gen', 'net_gen', 'probe_menu']
+    assert roots and all(root.startswith(str(tmp_path)) for root in roots)
+    # the stubs are put back
+    assert (wizard.tune_check, wizard.is_infiniband) == saved
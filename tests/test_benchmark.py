@@ -0,0 +1,27 @@
+# Data= re-ranking by measured throughput, with link speed as the tie-break.
+
+from configwizard.benchmark import BenchResult, rank_by_throughput
+
+
+def _result(dev, mbps, error=None):
+    return BenchResult(dev, '10.0.0.1', mbps, error=error)
+
+
+def test_clearly_faster_device_moves_ahead():
+    results = [_result('eth0', 9000), _result('eth1', 20000)]
+    assert rank_by_throughput(results, ['eth0', 'eth1']) == ['eth1', 'eth0']
+
+
+def test_near_tie_keeps_link_speed_order():
+    results = [_result('eth0', 9000), _result('eth1', 9500)]
+    assert rank_by_throughput(results, ['eth0', 'eth1']) == ['eth0', 'eth1']
+
+
+def test_failed_devices_go_last():
+    results = [_result('eth0', 0, error='timed out'), _result('eth1', 100), _result('eth2', 90)]
+    assert rank_by_throughput(results, ['eth0', 'eth1', 'eth2']) == ['eth1', 'eth2', 'eth0']
+
+
+def test_unmeasured_devices_keep_their_place():
+    results = [_result('eth1', 100000)]
+    assert rank_by_throughput(results, ['eth0', 'eth1']) == ['eth0', 'eth1']
@@ -0,0 +1,87 @@
+# Self-discovery over 127.0.0.1 and merging what was heard into a map.
+
+import argparse
+import asyncio
+import socket
+
+import pytest
+
+from configwizard import discovery, sw_config
+from configwizard.discovery import Announcement
+
+MAP = (
+    'Version=2.0\n'
+    '\n'
+    '[FRAMESTORES]\n'
+    '# the render farm is only up at night\n'
+    'FRAMESTORE=render  HADDR=10.0.0.9   HOSTUUID=uuid-9    ID=9\n'
+    'FRAMESTORE=flame1  HADDR=10.0.0.1   HOSTUUID=uuid-1    ID=1\n'
+    '\n'
+    '[INTERFACES]\n'
+    'FRAMESTORE=render\n'
+    'PROT=TCP     IADDR=10.0.0.9    DEV=1\n'
+    'FRAMESTORE=flame1\n'
+    'PROT=TCP     IADDR=10.0.0.1    DEV=1\n'
+)
+
+
+def _free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_announce_and_listen_over_loopback():
+    port = _free_port()
+    flame = Announcement('flame1', '10.0.0.5', 'uuid-1', '1', [('IB_SDP', '10.10.0.5'), ('TCP', '10.0.0.5')])
+    renamed = Announcement('flame1-new', '10.0.0.5', 'uuid-1', '1')
+    other = Announcement('flame2', '10.0.0.6', 'uuid-2')
+
+    async def exchange():
+        ready = asyncio.Event()
+        listener = asyncio.ensure_future(discovery.listen(0.5, '127.0.0.1', port, ready=ready))
+        await ready.wait()
+        await discovery.announce(flame, '127.0.0.1', port, count=1)
+        await discovery.announce(other, '127.0.0.1', port, count=2, interval=0.01)
+        await discovery.announce(renamed, '127.0.0.1', port, count=1)
+        return await listener
+
+    index = asyncio.run(exchange())
+    assert sorted(index) == ['uuid-1', 'uuid-2']
+    # the latest announcement per HOSTUUID wins
+    assert index['uuid-1'].name == 'flame1-new'
+    assert index['uuid-2'].source == '127.0.0.1'
+
+
+def test_merge_keeps_quiet_framestores_and_comments():
+    index = {'uuid-1': Announcement('flame1', '10.0.0.5', 'uuid-1', '1', [('TCP', '10.0.1.5')]),
+             'uuid-3': Announcement('flame3', '10.0.0.7', 'uuid-3')}
+    text = discovery.merge_map(MAP, index)
+    cfg = sw_config.parse(text)
+    assert [fs['FRAMESTORE'] for fs in cfg.framestores()] == ['render', 'flame1', 'flame3']
+    assert '# the render farm is only up at night\n' in text
+    assert cfg.interfaces()['flame1'] == [{'PROT': 'TCP', 'IADDR': '10.0.1.5', 'DEV': '1'}]
+    assert cfg.interfaces()['flame3'] == [{'PROT': 'TCP', 'IADDR': '10.0.0.7', 'DEV': '1'}]
+    assert discovery.merge_map(text, index) == text
+
+
+def test_merge_prune_removes_quiet_framestores():
+    index = {'uuid-1': Announcement('flame1', '10.0.0.1', 'uuid-1', '1', [('TCP', '10.0.0.1')])}
+    cfg = sw_config.parse(discovery.merge_map(MAP, index, prune=True))
+    assert [fs['FRAMESTORE'] for fs in cfg.framestores()] == ['flame1']
+    assert list(cfg.interfaces()) == ['flame1']
+
+
+def test_merge_without_a_map_renders_one():
+    index = {'uuid-1': Announcement('flame1', '10.0.0.1', 'uuid-1')}
+    assert discovery.merge_map(None, index) == discovery.render_map(index)
+
+
+def test_scope_must_be_an_address():
+    parser = argparse.ArgumentParser()
+    discovery.add_arguments(parser)
+    assert parser.parse_args(['--scope', '239.1.2.3']).scope == '239.1.2.3'
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--scope', 'framestores.example.com'])
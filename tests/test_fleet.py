@@ -0,0 +1,57 @@
+# fleet.configure_host over a LocalDirTransport host directory.
+
+import json
+import os
+
+import pytest
+
+from configwizard import fleet
+from configwizard.enumerate_interfaces import ARPHRD_INFINIBAND
+
+
+def _fact(name, index, ip, speed, multicast=True, loopback=False, type=1):
+    return {'name': name, 'index': index, 'type': type, 'ipv4': [ip], 'ipv6': [], 'mac': '',
+            'mtu': 1500, 'up': True, 'running': True, 'multicast': multicast, 'loopback': loopback,
+            'speed': speed, 'duplex': 'full', 'carrier': True, 'ib': type == ARPHRD_INFINIBAND}
+
+
+@pytest.fixture
+def host(tmp_path):
+    base = tmp_path / 'ws1'
+    (base / 'opt/Autodesk/cfg').mkdir(parents=True)
+    (base / 'opt/Autodesk/sw/cfg').mkdir(parents=True)
+    (base / 'opt/Autodesk/cfg/network.cfg').write_text('[Interfaces]\nData=\n[Local]\nUUID=uuid-ws1\n')
+    (base / 'opt/Autodesk/sw/cfg/sw_storage.cfg').write_text('[Partition1]\nID=7\n')
+    facts = [_fact('lo', 1, '127.0.0.1', 0, multicast=False, loopback=True, type=772),
+             _fact('eno1', 2, '10.0.0.5', 1000),
+             _fact('ens1f0', 3, '10.1.0.5', 10000),
+             _fact('docker0', 4, '172.17.0.1', 10000),
+             _fact('wg0', 5, '10.9.0.5', 0, multicast=False, type=65534),
+             _fact('ib0', 6, '10.10.0.5', 100000, type=ARPHRD_INFINIBAND)]
+    (base / 'interfaces.json').write_text(json.dumps(facts))
+    return fleet.LocalDirTransport(str(tmp_path))
+
+
+def test_auto_uses_the_wizard_selection(host):
+    record = fleet.configure_host(host, {'host': 'ws1'})
+    assert record['status'] == 'ok', record['error']
+    assert record['data'] == ['ib0', 'ens1f0', 'eno1']
+    assert record['metadata'] == ['eno1', 'ens1f0', 'ib0']
+    fs_map = host.read('ws1', '/opt/Autodesk/sw/cfg/sw_framestore_map')
+    assert 'PROT=IB_SDP  IADDR=10.10.0.5' in fs_map
+    for ip in ('172.17.0.1', '10.9.0.5', '127.0.0.1'):
+        assert ip not in fs_map
+    netcfg = host.read('ws1', '/opt/Autodesk/cfg/network.cfg')
+    assert 'Data=ib0,ens1f0,eno1\n' in netcfg
+
+
+def test_inactive_interface_cannot_be_picked(host):
+    record = fleet.configure_host(host, {'host': 'ws1', 'data': 'docker0'})
+    assert record['status'] == 'error'
+    assert 'docker0' in record['error']
+
+
+def test_pick_by_ip(host):
+    record = fleet.configure_host(host, {'host': 'ws1', 'metadata': '10.0.0.5', 'data': 'ens1f0'})
+    assert (record['metadata'], record['data']) == (['eno1'], ['ens1f0'])
+    assert not os.path.exists(os.path.join(host.base, 'ws1', 'opt/Autodesk/cfg/network.cfg.orig'))
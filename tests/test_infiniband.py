@@ -0,0 +1,116 @@
+# InfiniBand detection against a fake sysfs tree:
+#   <tmp>/net/<dev>/{type,mtu,carrier,dev_port,device/infiniband/<hca>}
+#   <tmp>/infiniband/<hca>/ports/<n>/{rate,state}
+
+import os
+
+import pytest
+
+from configwizard.enumerate_interfaces import link_info, _ib_port, is_infiniband, ARPHRD_INFINIBAND
+from configwizard.wizard import interface_addresses
+
+
+def _write(path, text):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text + '\n')
+
+
+def add_netdev(sysfs, dev, type=1, mtu=1500, carrier='1', speed=None, duplex=None, dev_port=None, hca=None):
+    base = os.path.join(sysfs, 'net', dev)
+    _write(os.path.join(base, 'type'), str(type))
+    _write(os.path.join(base, 'mtu'), str(mtu))
+    if carrier is not None:
+        _write(os.path.join(base, 'carrier'), carrier)
+    if speed is not None:
+        _write(os.path.join(base, 'speed'), str(speed))
+    if duplex is not None:
+        _write(os.path.join(base, 'duplex'), duplex)
+    if dev_port is not None:
+        _write(os.path.join(base, 'dev_port'), str(dev_port))
+    if hca is not None:
+        os.makedirs(os.path.join(base, 'device', 'infiniband', hca))
+
+
+def add_ib_port(sysfs, hca, port, rate='100 Gb/sec (4X EDR)', state='4: ACTIVE'):
+    base = os.path.join(sysfs, 'infiniband', hca, 'ports', str(port))
+    _write(os.path.join(base, 'rate'), rate)
+    _write(os.path.join(base, 'state'), state)
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    root = str(tmp_path)
+    add_netdev(root, 'eth0', speed=1000, duplex='full')
+    add_netdev(root, 'ib0', type=ARPHRD_INFINIBAND, mtu=2044, carrier='0', dev_port=0, hca='mlx5_0')
+    add_ib_port(root, 'mlx5_0', 1)
+    return root
+
+
+def _link(sysfs, dev):
+    return link_info(dev, os.path.join(sysfs, 'net'), os.path.join(sysfs, 'infiniband'))
+
+
+def test_ethernet_link(sysfs):
+    link = _link(sysfs, 'eth0')
+    assert (link.speed, link.duplex, link.mtu, link.carrier, link.ib, link.hca) == \
+        (1000, 'full', 1500, True, False, None)
+
+
+def test_type_32_is_infiniband(sysfs):
+    assert is_infiniband('ib0', os.path.join(sysfs, 'net'))
+    assert not is_infiniband('eth0', os.path.join(sysfs, 'net'))
+
+
+def test_ib_rate_and_port_state(sysfs):
+    link = _link(sysfs, 'ib0')
+    assert link.ib
+    assert link.hca == 'mlx5_0/1'
+    assert link.speed == 100000
+    assert link.duplex == 'full'
+    # the netdev reports no carrier, the ACTIVE port does
+    assert link.carrier
+
+
+def test_ib_port_down(sysfs):
+    add_ib_port(sysfs, 'mlx5_0', 1, rate='10 Gb/sec (4X SDR)', state='1: DOWN')
+    link = _link(sysfs, 'ib0')
+    assert link.speed == 10000
+    assert not link.carrier
+
+
+def test_ib_unreadable_rate_keeps_netdev_speed(sysfs):
+    add_netdev(sysfs, 'ib1', type=ARPHRD_INFINIBAND, speed=40000, dev_port=0, hca='mlx4_0')
+    add_ib_port(sysfs, 'mlx4_0', 1, rate='unknown')
+    assert _link(sysfs, 'ib1').speed == 40000
+
+
+def test_ib_port_follows_dev_port(sysfs):
+    add_netdev(sysfs, 'ib1', type=ARPHRD_INFINIBAND, dev_port=1, hca='mlx5_0')
+    add_ib_port(sysfs, 'mlx5_0', 2)
+    net, ib = os.path.join(sysfs, 'net'), os.path.join(sysfs, 'infiniband')
+    assert _ib_port('ib0', net, ib) == ('mlx5_0', 1)
+    assert _ib_port('ib1', net, ib) == ('mlx5_0', 2)
+
+
+def test_ib_port_missing(sysfs):
+    net, ib = os.path.join(sysfs, 'net'), os.path.join(sysfs, 'infiniband')
+    # no RDMA device under the netdev
+    assert _ib_port('eth0', net, ib) is None
+    # dev_port points at a port the HCA does not have
+    add_netdev(sysfs, 'ib2', type=ARPHRD_INFINIBAND, dev_port=3, hca='mlx5_0')
+    assert _ib_port('ib2', net, ib) is None
+    link = _link(sysfs, 'ib2')
+    assert link.ib and link.hca is None and link.speed == 0
+
+
+def test_interface_addresses_puts_ib_sdp_first():
+    ips = {'eth0': '10.0.0.1', 'eth1': '10.0.1.1', 'ib0': '10.10.0.1', 'lo0': ''}
+    iaddrs = interface_addresses(['eth0', 'ib0', 'eth1', 'lo0', 'eth0'], ips.get, ['ib0'])
+    assert iaddrs == [('IB_SDP', '10.10.0.1'), ('TCP', '10.0.0.1'), ('TCP', '10.0.1.1')]
+
+
+def test_interface_addresses_skips_repeated_ip():
+    ips = {'ib0': '10.10.0.1', 'eth0': '10.10.0.1'}
+    assert interface_addresses(['eth0', 'ib0'], ips.get, ['ib0']) == [('IB_SDP', '10.10.0.1')]
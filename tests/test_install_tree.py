@@ -0,0 +1,67 @@
+# Install tree lookup against fake trees under tmp_path; the root level glob
+# and /opt/Autodesk are pointed into it.
+
+import os
+
+import pytest
+
+from configwizard import install_tree
+from configwizard.install_tree import find_root, AmbiguousInstallTree, InstallTree, ROOT_ENV
+
+
+def add_tree(base, name, files=('sw/cfg/sw_framestore_map', 'cfg/network.cfg')):
+    root = os.path.join(base, name)
+    for f in files:
+        path = os.path.join(root, f)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+    return root
+
+
+@pytest.fixture
+def fs(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    monkeypatch.delenv(ROOT_ENV, raising=False)
+    monkeypatch.setattr(install_tree, 'DEFAULT_ROOT', os.path.join(base, 'opt', 'Autodesk'))
+    monkeypatch.setattr(install_tree, 'SEARCH_GLOB', os.path.join(base, '*', '*', 'sw', 'cfg'))
+    return base
+
+
+def test_explicit_root_wins(fs):
+    add_tree(fs, 'opt/Autodesk')
+    add_tree(fs, 'usr/discreet')
+    assert find_root('/somewhere') == '/somewhere'
+
+
+def test_env_root(fs, monkeypatch):
+    monkeypatch.setenv(ROOT_ENV, '/from/env')
+    assert find_root() == '/from/env'
+
+
+def test_default_tree(fs):
+    default = add_tree(fs, 'opt/Autodesk')
+    assert find_root() == default
+
+
+def test_single_other_tree(fs):
+    other = add_tree(fs, 'usr/discreet')
+    assert find_root() == other
+
+
+def test_nothing_installed_falls_back_to_default(fs):
+    assert find_root() == install_tree.DEFAULT_ROOT
+
+
+def test_second_tree_next_to_default_is_ambiguous(fs):
+    default = add_tree(fs, 'opt/Autodesk')
+    other = add_tree(fs, 'usr/discreet')
+    with pytest.raises(AmbiguousInstallTree) as e:
+        find_root()
+    assert e.value.candidates == sorted([default, other])
+
+
+def test_tree_paths(fs):
+    tree = InstallTree(add_tree(fs, 'opt/Autodesk', ('sw/cfg/sw_framestore_map',)))
+    assert tree.framestore_map.endswith(os.path.join('sw', 'cfg', 'sw_framestore_map'))
+    assert tree.network_cfg is None and tree.storage_cfg is None
@@ -0,0 +1,25 @@
+# Peers from sw_framestore_map and the reachability ordering.
+
+from configwizard import latency_matrix
+
+MAP = (
+    '[FRAMESTORES]\n'
+    'FRAMESTORE=local   HADDR=10.0.0.1   HOSTUUID=uuid-1\n'
+    'FRAMESTORE=flame2  HADDR=10.0.0.2   HOSTUUID=uuid-2\n'
+    '[INTERFACES]\n'
+    'FRAMESTORE=flame2\n'
+    'PROT=IB_SDP  IADDR=10.10.0.2    DEV=1\n'
+    'PROT=TCP     IADDR=10.0.0.2    DEV=1\n'
+)
+
+
+def test_map_peers_leaves_out_this_host(tmp_path):
+    path = tmp_path / 'sw_framestore_map'
+    path.write_text(MAP)
+    assert latency_matrix.map_peers(str(path), 'uuid-1') == {'flame2': ['10.0.0.2', '10.10.0.2']}
+    assert sorted(latency_matrix.map_peers(str(path))) == ['flame2', 'local']
+
+
+def test_order_by_rtt_only_demotes_unreachable():
+    matrix = {'eth0': {'10.0.0.2': 0.3}, 'eth1': {'10.0.0.2': None}, 'ib0': {'10.0.0.2': 0.9}}
+    assert latency_matrix.order_by_rtt(['eth1', 'ib0', 'eth0', 'eth2'], matrix) == ['ib0', 'eth0', 'eth1', 'eth2']
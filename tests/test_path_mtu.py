@@ -0,0 +1,63 @@
+# Path-MTU search over a stubbed probe: no packets leave the host.
+
+import pytest
+
+from configwizard import path_mtu
+
+
+def _path(monkeypatch, mtu, icmp=True, reachable=True):
+    """ Stubs _fits with a path carrying mtu; larger probes get a
+    fragmentation-needed when icmp, else they vanish """
+    async def fits(src, dev, target, size, timeout, tries=path_mtu.DEFAULT_TRIES):
+        if not reachable:
+            return None, None
+        if size <= mtu:
+            return True, None
+        return (False, mtu) if icmp else (None, None)
+    monkeypatch.setattr(path_mtu, '_fits', fits)
+
+
+def _discover(local_mtu=9000):
+    return path_mtu.discover([('eth2', '10.0.0.5', local_mtu, '10.0.0.9')])[0]
+
+
+def test_path_carries_local_mtu(monkeypatch):
+    _path(monkeypatch, 9000)
+    result = _discover()
+    assert (result.path_mtu, result.fragments, result.blackhole, result.error) == (9000, False, False, None)
+
+
+def test_fragmentation_needed(monkeypatch):
+    _path(monkeypatch, 1500)
+    result = _discover()
+    assert (result.path_mtu, result.fragments, result.blackhole) == (1500, True, False)
+
+
+def test_black_hole_fragments(monkeypatch):
+    _path(monkeypatch, 1500, icmp=False)
+    result = _discover()
+    assert (result.path_mtu, result.fragments, result.blackhole, result.error) == (1500, True, True, None)
+
+
+def test_unreachable_target_is_unknown(monkeypatch):
+    _path(monkeypatch, 1500, reachable=False)
+    result = _discover()
+    assert result.path_mtu is None and not result.fragments
+    assert 'no answer' in result.error
+
+
+@pytest.mark.parametrize('block', [False, True])
+def test_wizard_warns_or_blocks_on_a_black_hole(monkeypatch, capsys, block):
+    from configwizard import wizard
+    from configwizard.enumerate_interfaces import Interface
+
+    _path(monkeypatch, 1500, icmp=False)
+    iface = Interface(2, 'eth2', mtu=9000)
+    iface.ipv4 = ['10.0.0.5']
+    if block:
+        with pytest.raises(SystemExit) as e:
+            wizard.mtu_check(['eth2'], {'eth2': iface}, ['10.0.0.9'], block=True)
+        assert e.value.code == wizard.EXIT_FRAGMENTS
+    else:
+        wizard.mtu_check(['eth2'], {'eth2': iface}, ['10.0.0.9'])
+    assert 'only carries 1500' in capsys.readouterr().out
@@ -0,0 +1,75 @@
+# The interactive menu prompts while the probe is still running.
+
+import threading
+
+import pytest
+
+from configwizard import wizard
+from configwizard.enumerate_interfaces import Interface, LinkInfo
+from configwizard.probe_interfaces import ProbeResult
+
+
+@pytest.fixture
+def host(monkeypatch, capsys):
+    ifaces = {}
+    for index, (name, ip) in enumerate((('eth0', '10.0.0.5'), ('eth1', '10.1.0.5')), 2):
+        ifaces[name] = Interface(index, name)
+        ifaces[name].ipv4 = [ip]
+    release = threading.Event()
+    answers = {'eth0': True, 'eth1': True}
+
+    def probe_all(targets, timeout=1.0, on_result=None):
+        results = {}
+        for dev, ip in targets:
+            if dev == 'eth1':
+                release.wait(5)
+            result = ProbeResult(dev, ip, answers[dev], 0.1, None if answers[dev] else 'timed out')
+            results[dev] = result
+            on_result(result)
+        return results
+
+    monkeypatch.setattr(wizard, 'probe_all', probe_all)
+    monkeypatch.setattr(wizard, 'cached_link_info', lambda dev, ifaces=None, cache=None: LinkInfo(dev, 1000))
+    return ifaces, release, answers
+
+
+def _inputs(monkeypatch, *answers, on_first=None):
+    answers = list(answers)
+
+    def fake_input(prompt):
+        if on_first is not None and len(answers) == 2:
+            on_first()
+        return answers.pop(0)
+    monkeypatch.setattr('builtins.input', fake_input)
+
+
+def test_prompts_before_the_probe_finishes(host, monkeypatch):
+    ifaces, release, _ = host
+    menu = wizard.display_options(['eth0', 'eth1'], ifaces)
+    seen = []
+    _inputs(monkeypatch, '1', '2', on_first=lambda: seen.append(menu.done.is_set()))
+    # the data row is only released once the first prompt has been asked
+    monkeypatch.setattr(menu, 'render', lambda: release.set())
+    assert wizard.user_input(menu) == ('eth0', 'eth1')
+    assert seen == [False]
+
+
+def test_exits_once_nothing_answers(host, monkeypatch):
+    ifaces, release, answers = host
+    answers.update(eth0=False, eth1=False)
+    release.set()
+    menu = wizard.display_options(['eth0', 'eth1'], ifaces)
+    _inputs(monkeypatch, '1', '2')
+    with pytest.raises(SystemExit) as e:
+        wizard.user_input(menu)
+    assert e.value.code == wizard.EXIT_UNREACHABLE
+
+
+def test_unreachable_pick_is_accepted_when_another_answers(host, monkeypatch, capsys):
+    ifaces, release, answers = host
+    answers.update(eth1=False)
+    release.set()
+    menu = wizard.display_options(['eth0', 'eth1'], ifaces)
+    _inputs(monkeypatch, '1', '2')
+    assert wizard.user_input(menu) == ('eth0', 'eth1')
+    assert 'eth1 did not answer a ping' in capsys.readouterr().out
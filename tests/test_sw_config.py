@@ -0,0 +1,129 @@
+# The line-preserving config model and the sw_framestore_map upsert.
+
+import io
+
+from configwizard import sw_config
+
+MAP = (
+    '# Stone+Wire framestore map\n'
+    '[FRAMESTORES]\n'
+    'FRAMESTORE=flame1  HADDR=10.0.0.1   HOSTUUID=uuid-1    ID=1\n'
+    '# render node, do not remove\n'
+    'FRAMESTORE=render  HADDR=10.0.0.9   HOSTUUID=uuid-9    ID=9\n'
+    '\n'
+    '[INTERFACES]\n'
+    'FRAMESTORE=flame1\n'
+    'PROT=TCP     IADDR=10.0.0.1    DEV=1\n'
+    'FRAMESTORE=render\n'
+    'PROT=TCP     IADDR=10.0.0.9    DEV=1\n'
+    'EXTRA_KEY=kept\n'
+)
+
+
+def _upsert(text, name='flame1', haddr='10.0.0.5', uuid='uuid-1', fsid='1',
+            iaddrs=(('TCP', '10.0.1.5'),)):
+    return sw_config.upsert_text(text, name, haddr, uuid, fsid, list(iaddrs))
+
+
+def test_parse_render_round_trip():
+    for text in (MAP, MAP.replace('\n', '\r\n'), MAP.rstrip('\n'), 'odd \x00 line\n[x]\nk = v  \n'):
+        assert sw_config.parse(text).render() == text
+
+
+def test_parse_model():
+    config = sw_config.parse(MAP)
+    assert [fs['FRAMESTORE'] for fs in config.framestores()] == ['flame1', 'render']
+    assert config.interfaces()['render'][0]['IADDR'] == '10.0.0.9'
+
+
+def test_set_rewrites_only_the_value():
+    config = sw_config.parse('[Net]\n  Data = eth0   \n')
+    config.set('Net', 'Data', 'eth1')
+    assert config.render() == '[Net]\n  Data = eth1   \n'
+
+
+def test_set_fills_an_empty_value():
+    for newline in ('\n', '\r\n'):
+        config = sw_config.parse('[Net]' + newline + 'Data=' + newline + 'Metadata=eth0' + newline)
+        config.set('Net', 'Data', 'eth1,eth2')
+        assert config.render() == '[Net]{0}Data=eth1,eth2{0}Metadata=eth0{0}'.format(newline)
+
+
+def test_set_adds_crlf_lines_to_a_crlf_file():
+    config = sw_config.parse('[Net]\r\nData=eth0\r\n')
+    config.set('Net', 'Metadata', 'eth1')
+    config.set('Other', 'Key', 'value')
+    assert config.render() == '[Net]\r\nData=eth0\r\nMetadata=eth1\r\n[Other]\r\nKey=value\r\n'
+
+
+def test_set_after_missing_final_newline():
+    config = sw_config.parse('[Net]\nData=eth0')
+    config.set('Net', 'Metadata', 'eth1')
+    assert config.render() == '[Net]\nData=eth0\nMetadata=eth1\n'
+
+
+def test_upsert_keeps_remote_entries_and_comments():
+    out = _upsert(MAP)
+    assert out.count('FRAMESTORE=flame1') == 2
+    assert 'HADDR=10.0.0.5' in out and 'IADDR=10.0.1.5' in out
+    assert 'IADDR=10.0.0.1' not in out
+    for kept in ('# Stone+Wire framestore map\n', '# render node, do not remove\n',
+                 'FRAMESTORE=render  HADDR=10.0.0.9   HOSTUUID=uuid-9    ID=9\n',
+                 'PROT=TCP     IADDR=10.0.0.9    DEV=1\n', 'EXTRA_KEY=kept\n'):
+        assert kept in out
+
+
+def test_upsert_matches_a_renamed_host_by_hostuuid():
+    out = _upsert(MAP, name='flame1-new')
+    assert 'FRAMESTORE=flame1 ' not in out and 'FRAMESTORE=flame1\n' not in out
+    assert 'FRAMESTORE=flame1-new  HADDR=10.0.0.5   HOSTUUID=uuid-1' in out
+    assert 'FRAMESTORE=flame1-new\nPROT=TCP     IADDR=10.0.1.5' in out
+    assert 'FRAMESTORE=render' in out
+
+
+def test_upsert_crlf_map_stays_crlf():
+    out = _upsert(MAP.replace('\n', '\r\n'), name='new', uuid='uuid-new')
+    assert '\n' not in out.replace('\r\n', '')
+    assert 'FRAMESTORE=new  HADDR=10.0.0.5' in out
+
+
+def test_upsert_missing_final_newline():
+    out = _upsert(MAP.rstrip('\n'), name='new', uuid='uuid-new')
+    assert 'EXTRA_KEY=kept\nFRAMESTORE=new\n' in out
+    assert out.endswith('\n')
+
+
+def test_upsert_is_idempotent():
+    once = _upsert(MAP)
+    assert _upsert(once) == once
+
+
+def test_upsert_framestore_file(tmp_path):
+    path = tmp_path / 'sw_framestore_map'
+    path.write_bytes(MAP.encode())
+    calls = []
+    assert sw_config.upsert_framestore(str(path), 'flame1', '10.0.0.5', 'uuid-1', '1',
+                                       [('TCP', '10.0.1.5')], lambda: calls.append(1))
+    assert calls == [1]
+    assert path.read_bytes().decode() == _upsert(MAP)
+    assert not sw_config.upsert_framestore(str(path), 'flame1', '10.0.0.5', 'uuid-1', '1',
+                                           [('TCP', '10.0.1.5')], lambda: calls.append(2))
+    assert calls == [1]
+
+
+def test_upsert_framestore_ignores_a_missing_final_newline(tmp_path):
+    path = tmp_path / 'sw_framestore_map'
+    text = _upsert(MAP).rstrip('\n')
+    path.write_bytes(text.encode())
+    assert not sw_config.upsert_framestore(str(path), 'flame1', '10.0.0.5', 'uuid-1', '1',
+                                           [('TCP', '10.0.1.5')])
+    assert path.read_bytes().decode() == text
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_write_if_changed(tmp_path):
+    path = str(tmp_path / 'network.cfg')
+    assert sw_config.write_if_changed(path, 'a\n')
+    assert not sw_config.write_if_changed(path, 'a\n')
+    with io.open(path) as f:
+        assert f.read() == 'a\n'
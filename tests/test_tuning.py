@@ -0,0 +1,83 @@
+# NUMA/IRQ tune-check against a fake tree:
+#   <tmp>/sys/class/net/<dev>/device/{numa_node,msi_irqs/<irq>}
+#   <tmp>/sys/class/net/<dev>/queues/{rx,tx}-<n>/{rps,xps}_cpus
+#   <tmp>/sys/devices/system/node/node<n>/cpulist
+#   <tmp>/proc/irq/<irq>/smp_affinity, <tmp>/proc/<pid>/{comm,status}
+
+import json
+import os
+
+import pytest
+
+from configwizard import tuning
+
+
+def _write(path, text):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text + '\n')
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+@pytest.fixture
+def roots(tmp_path):
+    sys_root, proc_root = str(tmp_path / 'sys'), str(tmp_path / 'proc')
+    dev = os.path.join(sys_root, 'class', 'net', 'eth2')
+    _write(os.path.join(dev, 'device', 'numa_node'), '1')
+    for irq in (40, 41):
+        _write(os.path.join(dev, 'device', 'msi_irqs', str(irq)), 'msix')
+    _write(os.path.join(sys_root, 'devices', 'system', 'node', 'node0', 'cpulist'), '0-3')
+    _write(os.path.join(sys_root, 'devices', 'system', 'node', 'node1', 'cpulist'), '4-7')
+    _write(os.path.join(proc_root, 'irq', '40', 'smp_affinity'), '000000f0')
+    _write(os.path.join(proc_root, 'irq', '41', 'smp_affinity'), '0000000f')
+    _write(os.path.join(dev, 'queues', 'rx-0', 'rps_cpus'), '00000000')
+    _write(os.path.join(dev, 'queues', 'tx-0', 'xps_cpus'), '00000003')
+    _write(os.path.join(proc_root, '812', 'comm'), 'sw_serverd')
+    _write(os.path.join(proc_root, '812', 'status'), 'Name:\tsw_serverd\nCpus_allowed_list:\t0-1')
+    return sys_root, proc_root
+
+
+def test_findings(roots):
+    report = tuning.check('eth2', *roots)
+    assert (report.node, report.node_cpus, report.irqs) == (1, set(range(4, 8)), [40, 41])
+    found = dict((f.what, (f.current, f.expected)) for f in report.findings)
+    assert found == {'IRQ 41': ('0000000f', '000000f0'),
+                     'XPS tx-0': ('00000003', '000000f0'),
+                     'sw_serverd (812)': ('0-1', '4-7')}
+
+
+def test_no_numa_node(roots):
+    _write(os.path.join(roots[0], 'class', 'net', 'eth2', 'device', 'numa_node'), '-1')
+    report = tuning.check('eth2', *roots)
+    assert report.node is None and report.aligned
+
+
+def test_apply_and_rollback(roots, tmp_path):
+    sys_root, proc_root = roots
+    irq41 = os.path.join(proc_root, 'irq', '41', 'smp_affinity')
+    xps = os.path.join(sys_root, 'class', 'net', 'eth2', 'queues', 'tx-0', 'xps_cpus')
+    record_path = str(tmp_path / 'rollback.json')
+
+    record = tuning.apply(tuning.check('eth2', *roots), record_path)
+    assert (_read(irq41), _read(xps)) == ('000000f0', '000000f0')
+    with open(record_path) as f:
+        saved = json.load(f)
+    assert saved == record
+    assert sorted((c['path'], c['old']) for c in saved['changes']) == \
+        sorted([(irq41, '0000000f'), (xps, '00000003')])
+    assert tuning.check('eth2', *roots).findings[0].what == 'sw_serverd (812)'
+
+    assert sorted(tuning.rollback(record_path)) == sorted([irq41, xps])
+    assert (_read(irq41), _read(xps)) == ('0000000f', '00000003')
+
+
+def test_apply_changes_nothing_without_a_record(roots, tmp_path):
+    irq41 = os.path.join(roots[1], 'irq', '41', 'smp_affinity')
+    with pytest.raises((IOError, OSError)):
+        tuning.apply(tuning.check('eth2', *roots), str(tmp_path / 'missing' / 'rollback.json'))
+    assert _read(irq41) == '0000000f'
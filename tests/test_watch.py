@@ -0,0 +1,50 @@
+# Watcher.refresh against a fake install tree and inventory.
+
+import os
+import time
+from time import gmtime, strftime
+
+import pytest
+
+from configwizard import backups, watch
+from configwizard.enumerate_interfaces import Interface
+from configwizard.install_tree import InstallTree
+
+
+def _iface(index, name, ip):
+    iface = Interface(index, name)
+    iface.ipv4 = [ip]
+    return iface
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    (tmp_path / 'cfg').mkdir()
+    (tmp_path / 'sw' / 'cfg').mkdir(parents=True)
+    (tmp_path / 'cfg' / 'network.cfg').write_text('[Interfaces]\nMetadata=eth0\nData=eth1\n[Local]\nUUID=uuid-1\n')
+    (tmp_path / 'sw' / 'cfg' / 'sw_storage.cfg').write_text('[Partition1]\nID=3\n')
+    (tmp_path / 'sw' / 'cfg' / 'sw_framestore_map').write_text('[FRAMESTORES]\n[INTERFACES]\n')
+    ifaces = {'eth0': _iface(2, 'eth0', '10.0.0.5'), 'eth1': _iface(3, 'eth1', '10.1.0.5')}
+    monkeypatch.setattr(watch, 'inventory', lambda: ifaces)
+    monkeypatch.setattr(watch, 'is_infiniband', lambda dev: False)
+    return InstallTree(str(tmp_path))
+
+
+def test_refresh_rewrites_the_map(tree):
+    watcher = watch.Watcher(tree, 'flame1')
+    assert watcher.refresh({3})
+    text = open(tree.framestore_map).read()
+    assert 'HADDR=10.0.0.5' in text and 'IADDR=10.1.0.5' in text
+    # nothing changed, nothing written
+    assert not watcher.refresh({3})
+    # a device the config does not use is skipped
+    assert not watcher.refresh({7}) and watcher.skipped == 1
+
+
+def test_refresh_prunes_backups_by_age(tree):
+    old = tree.framestore_map + '.orig.' + strftime(backups.BACKUP_TIME_FORMAT, gmtime(time.time() - 30 * 86400))
+    with open(old, 'w') as f:
+        f.write('older\n')
+    watch.Watcher(tree, 'flame1', backup_max_age=7 * 86400).refresh({3})
+    assert not os.path.exists(old)
+    assert len(backups.list_backups(tree.framestore_map)) == 1